@@ -1,19 +1,31 @@
-from .lib.sm import Scores
 import json
 from .lib.qb import QuestionBank
 from app.lib.qb import ClientQuestion
 from .lib.struct import ADMIN
 from .lib.sockets import ClientSocket, ServerSocket, EventEmitter
+from .lib.spectator import SpectatorServer
+from .lib.beacon import BeaconSender
+from .lib.capture import CaptureWriter
+from .lib.relay import RelayHub
+from .lib.metrics import registry
+from .lib.log import getLogger, setup as setupLogging
 from .ui.admin.main import App
-from .settings import addr, getHOTSPOT, port
-from .lib.util import Participant, createPayload
-from .lib.rounds import Round1, Round2, Round3, Round4
+from .settings import addr, getHOTSPOT, port, spectator_port, beacon_port, relay_port, record_session, cluster, all_play
+from .lib.util import PayloadReader
+from .lib.rounds import Round1, Round2, Round2AllPlay, Round3, Round4
+import atexit
 import os
-from .ui.admin.frames.live import PlayFrame, LiveFrame
+import queue
+import socket
+import sys
+import threading
+import time
 from ._globals import _GLOBALs
 import tkinter as tk
 from tkinter import messagebox
 
+log = getLogger("admin")
+
 def show_and_exit():
   """
   Displays an alert dialog and exits the application.
@@ -24,13 +36,15 @@ def show_and_exit():
   root.destroy()  # Destroy the hidden window to exit the app
 
 class Admin(ADMIN):
-    curr_round_i=0
-    min_participants=1
-    currentRound = None
-    rounds=tuple()
+    """Tk admin, the quiz itself runs in `ADMIN` and the rounds.
+    The engine runs on the Tk thread only, its events update the widgets
+    directly. The socket loop and the timers post their work to `inbox`"""
+    pollInterval = 10 # ms between two looks at the inbox
     
     def __init__(self, ) -> None:
         super().__init__()
+        self.readers = dict() # clientID -> PayloadReader
+        self.inbox = queue.SimpleQueue() # (method, args) for the Tk thread
         _GLOBALs["admin"] = self
         ADMIN.me = self
         self.ui=App()
@@ -39,17 +53,23 @@ class Admin(ADMIN):
         # self.server = ServerSocket(addr=addr)
         
         try:
-            self.server = ServerSocket(addr=(getHOTSPOT(), port))
-
-            self.server.on("new-connection", self.addParticipant)
-            self.server.on("data", self.handleDataEvents)
-            self.server.on("disconnected", self.onDisconnect)
+            host = getHOTSPOT()
+            self.server = ServerSocket(addr=(host, port))
+            if cluster or "--cluster" in sys.argv:
+                # relays reach the primary over the venue LAN, not the hotspot
+                self.server = RelayHub(self.server, ("0.0.0.0", relay_port), clock=self.clock)
+
+            self.server.on("new-connection", lambda args : self.post(self.addParticipant, args))
+            self.server.on("data", self.onData)
+            self.server.on("disconnected", self.onDisconnected)
+            self.spectators = SpectatorServer(addr=(host, spectator_port))
+            self.beacon = BeaconSender(socket.gethostname(), port, beacon_port, count=self.participants.count)
         except:
             show_and_exit()
             pass
         self.rounds =(
             Round1(self), 
-            Round2(self), 
+            Round2AllPlay(self) if all_play or "--all-play" in sys.argv else Round2(self),
             Round3(self), 
             Round4(self)
         )
@@ -63,96 +83,100 @@ class Admin(ADMIN):
     def onDisconnect(self, args):
         clientID=args[0]
         # print("DISCONNECTED : ", args)
-        if self.participants.get(clientID).isPlaying:
-            return
-        self.participants.remove(clientID)
-        pass
-
-    def handleDataEvents(self, args):
+        self.disconnectParticipant(clientID)
+
+    def post(self, method, *args):
+        "runs `method(*args)` on the Tk thread, from any thread"
+        self.inbox.put((method, args))
+
+    def drain(self):
+        while True:
+            try:
+                method, args = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                with self.batch(): method(*args)
+            except Exception:
+                log.exception("error handling %s", getattr(method, "__name__", method))
+        self.ui.after(self.pollInterval, self.drain)
+
+    def schedule(self, at:float, method, *args):
+        timer = threading.Timer(max(0.0, at - self.clock()), self.post, (method, *args))
+        timer.daemon = True
+        timer.start()
+
+    def onDisconnected(self, args):
+        self.readers.pop(args[0], None)
+        self.post(self.onDisconnect, args)
+
+    def onData(self, args):
+        """parsed on the socket thread, an invalid payload counts against the
+        client there. Stamped on arrival, waiting in the inbox does not make an answer late"""
         payload = args[0]
         clientID = payload["clientID"]
-        data = json.loads(payload["data"])
-        action = data["action"]
-        data = data["data"]
+        at = payload.get("at")
+        if at is None: at = self.clock()
+        reader = self.readers.setdefault(clientID, PayloadReader())
+        for data in reader.feed(payload["data"]):
+            self.post(self.handleData, clientID, data, at)
+        reader.check()
 
-        if action == "setdata":
-            self.setUserData(clientID, data)
-        
-        if action == "checkanswer":
-            qid=data["qid"]
-            answer=data["answer"]
-            self.currentRound.check_answer(qid, answer)
-            self.ui.f_main.f_live.f_play.curr_round.stop_timer()
-
-        if action == "buzzer-pressed" and self.curr_round_i == 3:
-            self.currentRound.buzzer_pressed(clientID)
-            self.ui.f_main.f_live.f_play.curr_round.stop_timer()
-
-    def askQ(self, clientID, question: ClientQuestion):
-        # return super().askQ(clientID, question)()
-        self.ui.f_main.f_live.f_play.curr_round.setQ(question)
-        self.server.sendTo(createPayload("setquestion", question.jsons()), clientID)
-
-    def setUserData(self,clientID, name, id=None):
-        # check if user already exists 
-        participant:Participant =  self.participants.get(clientID)
-        participant.name = name
+    def handleData(self, clientID, data:dict, at):
+        self.handlePayload(clientID, data["action"], data["data"], at)
 
     def addParticipant(self, args):
         clientID = args[0]
-        client = self.server.clients[clientID]
-        participant = Participant(client=client, clientID=clientID)
-        self.participants.add(participant)
+        super().addParticipant(clientID, self.server.clients.get(clientID)) # gone when it disconnected meanwhile
     
     def start(self):
         self.server.start()
+        self.spectators.start()
+        self.beacon.start()
+        if record_session or "--record" in sys.argv:
+            self.record_session(os.path.join(os.getcwd(), "data", "captures", time.strftime("session-%Y%m%d-%H%M%S.qcap")))
+        registry.startDump(os.path.join(os.getcwd(), "data", "metrics", time.strftime("metrics-%Y%m%d-%H%M%S.jsonl")))
+        self.ui.after(self.pollInterval, self.drain)
         self.ui.show()
 
-    def askAll(self, question:ClientQuestion):
-        pass
-        # return super().askAll(question)()
+    def record_session(self, path):
+        """capture the traffic and the operator actions, replay with `python -m app.cli.replay`"""
+        self.capture = CaptureWriter(path)
+        self.server.capture = self.capture
+        atexit.register(self.capture.close)
+        log.info("recording the session to %s", path)
 
     def start_quiz(self):
-        if self.participants.count() < self.min_participants:
+        if not super().start_quiz():
             return
-        print(f"Participants : {self.participants.count()}")
-        self.quiz_started=True
-        self.num_participants = self.participants.count()
-        self.scores = Scores(self.participants.getClientIDs())
+        self.scores.on("score-changed", self.publish_scores)
+        self.publish_scores()
 
-        
-        lf:LiveFrame = LiveFrame.me
+        lf = self.ui.f_main.f_live
         lf.setActiveFrame(lf.f_play)
-        self.start_curr_round()
-        # self.currentRound.start()
-        # self.scores = Scores(self.participants.getClientIDs())
-    
-        # pf:PlayFrame = PlayFrame.me
-        # pf.setCurrRound(pf.roundUIs[0])
-        pass
-
-    def start_curr_round(self):
-        """udpate Frame and send signal"""
-        pf:PlayFrame = PlayFrame.me
-        pf.setCurrRound(pf.roundUIs[self.curr_round_i])
-        self.currentRound.start()
-        pass
-
-    def start_next_round(self):
-        self.curr_round_i+=1
-        self.currentRound = self.rounds[self.curr_round_i]
-        # self.currentRound.start()
-        self.start_curr_round()
-        pass
-        # self.roundUIs = (Round1(self.ui.f_main.f_live.f_play.))
-
-    def show_right_answer(self, qid, rightAns, answer):
-        pf:PlayFrame = PlayFrame.me
-        if pf.curr_round.hasOptions: pf.curr_round.show_answer(rightAns, answer)
-        # show_answer(self, correct_i, selected_i):
-        pass
+
+    def publish_state(self, **state):
+        """stream `state` to the spectator displays"""
+        self.spectators.publish(**state)
+
+    def publish_scores(self, *args):
+        names = dict(zip(self.participants.getClientIDs(), self.participants.getNames()))
+        self.publish_state(scoreboard=[[names.get(id), score] for id,score in self.scores.ranking()])
+
+    def export_results(self):
+        """write the score ledger of the event to `data/results`"""
+        names = dict(zip(self.participants.getClientIDs(), self.participants.getNames()))
+        path = os.path.join(os.getcwd(), "data", "results", time.strftime("results-%Y%m%d-%H%M%S.csv"))
+        try:
+            self.ledger.exportCSV(path, names)
+            log.info("results exported to %s", path)
+        except Exception as e:
+            log.error("error exporting results : %s", e)
+        for i,(clientID, total) in enumerate(self.ledger.ranking(names.keys())):
+            log.info("%d. %s : %s (%.1fs)", i+1, names[clientID], total, self.ledger.responseTime(clientID))
 
 def main():
+    setupLogging("admin")
     admin = Admin()
     admin.start()
     pass
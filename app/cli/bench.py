@@ -0,0 +1,232 @@
+"""
+Benchmark suite for the socket layer and message dispatch (headless)
+
+Measures :-
+1.) handshake rate of `ServerSocket`
+2.) messages/second received and dispatched by `ServerSocket`
+3.) broadcast fan-out latency at 10/50/200 clients
+4.) CPU usage of the server event loop while idle
+5.) `EventEmitter.emit` overhead
+6.) questions/second of the headless quiz engine
+
+usage :-
+    python -m app.cli.bench                       # writes bench_results/<rev>-<time>.json
+    python -m app.cli.bench --quick
+    python -m app.cli.bench --compare old.json new.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import threading
+import time
+import timeit
+from selectors import DefaultSelector, EVENT_READ
+from socket import socket, create_connection
+from ..lib.sockets import ServerSocket, EventEmitter, magicKey
+from ..lib.util import PayloadReader, createPayload
+from ..lib.engine import HeadlessAdmin, generateBank, simulate
+
+def startServer()->ServerSocket:
+    server = ServerSocket(("127.0.0.1", 0))
+    server.start()
+    server.addr = server.ssock.getsockname()
+    return server
+
+def stopServer(server:ServerSocket):
+    server.stop() # closes the clients and the listening socket
+
+def connectClient(addr)->socket:
+    "plain blocking socket doing the participant side of the handshake"
+    sock = create_connection(addr)
+    sock.sendall(magicKey)
+    recv = b""
+    while len(recv) < len(magicKey):
+        recv += sock.recv(len(magicKey)-len(recv))
+    if recv != magicKey:
+        raise Exception(f"handshake failed : {recv}")
+    return sock
+
+def waitFor(predicate, timeout=10):
+    deadline = time.monotonic()+timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError("benchmark timed out")
+        time.sleep(0.001)
+
+def stats(values:list)->dict:
+    values = sorted(values)
+    return {
+        "mean": sum(values)/len(values),
+        "p50": values[len(values)//2],
+        "p99": values[min(len(values)-1, int(len(values)*0.99))],
+        "max": values[-1],
+    }
+
+def bench_handshake(n:int)->dict:
+    server = startServer()
+    socks = list()
+    start = time.perf_counter()
+    for _ in range(n):
+        socks.append(connectClient(server.addr))
+    elapsed = time.perf_counter()-start
+    for sock in socks: sock.close()
+    stopServer(server)
+    return {"clients": n, "seconds": elapsed, "handshakes_per_s": n/elapsed}
+
+def bench_messages(n:int)->dict:
+    server = startServer()
+    received = [0]
+    reader = PayloadReader()
+    server.on("data", lambda args : received.__setitem__(0, received[0]+len(reader.feed(args[0]["data"]))))
+    sock = connectClient(server.addr)
+    waitFor(lambda : len(server.clients) == 1) # clients are added once their handshake is done
+    payload = createPayload("checkanswer", {"qid":1, "answer":2})
+
+    start = time.perf_counter()
+    sender = threading.Thread(target=lambda : sock.sendall(payload*n))
+    sender.start()
+    waitFor(lambda : received[0] >= n, timeout=60)
+    elapsed = time.perf_counter()-start
+    sender.join()
+    sock.close()
+    stopServer(server)
+    return {"messages": n, "seconds": elapsed, "messages_per_s": n/elapsed}
+
+def bench_broadcast(clients:int, rounds:int)->dict:
+    server = startServer()
+    socks = [connectClient(server.addr) for _ in range(clients)]
+    waitFor(lambda : len(server.clients) == clients)
+    sel = DefaultSelector()
+    for sock in socks:
+        sock.setblocking(False)
+        sel.register(sock, EVENT_READ)
+    payload = createPayload("setquestion", json.dumps({"qid":1, "text":"x"*200, "options":"a,b,c,d", "imgPath":""}))
+
+    latencies = list()
+    for _ in range(rounds):
+        pending = {sock: 0 for sock in socks}
+        start = time.perf_counter()
+        server.broadcast(payload)
+        while pending:
+            for key,_ in sel.select(timeout=5):
+                sock = key.fileobj
+                pending[sock] += len(sock.recv(65536))
+                if pending[sock] >= len(payload): pending.pop(sock)
+        latencies.append(time.perf_counter()-start)
+    for sock in socks: sock.close()
+    stopServer(server)
+    result = {k: v*1000 for k,v in stats(latencies).items()}
+    return {"clients": clients, "rounds": rounds, "latency_ms": result}
+
+def bench_idle_cpu(clients:int, seconds:float)->dict:
+    server = startServer()
+    socks = [connectClient(server.addr) for _ in range(clients)]
+    waitFor(lambda : len(server.clients) == clients)
+    time.sleep(0.1)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    before = usage.ru_utime + usage.ru_stime
+    time.sleep(seconds)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = usage.ru_utime + usage.ru_stime - before
+    for sock in socks: sock.close()
+    stopServer(server)
+    return {"clients": clients, "seconds": seconds, "cpu_percent": cpu/seconds*100}
+
+def bench_emit(number:int)->dict:
+    result = dict()
+    for listeners in (0, 1, 5):
+        emitter = EventEmitter()
+        for _ in range(listeners):
+            emitter.on("data", lambda args : None)
+        seconds = min(timeit.repeat(lambda : emitter.emit("data", 1), number=number, repeat=5))
+        result[f"listeners_{listeners}_ns"] = seconds/number*1e9
+    return result
+
+def bench_engine(participants:int, quizzes:int)->dict:
+    questions, seconds = 0, 0.0
+    for i in range(quizzes):
+        admin = HeadlessAdmin(generateBank(15*participants))
+        for clientID in range(participants):
+            admin.addParticipant(clientID)
+        # the rounds print every step, keep the benchmark output readable
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            report = simulate(admin, seed=i)
+        questions += report["questions"]
+        seconds += report["seconds"]
+    return {"participants": participants, "questions": questions, "seconds": seconds, "questions_per_s": questions/seconds}
+
+def gitRevision()->str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+def run(quick=False)->dict:
+    scale = 0.1 if quick else 1
+    results = dict()
+    print("handshake rate ...")
+    results["handshake"] = bench_handshake(int(500*scale) or 1)
+    print("messages/second ...")
+    results["messages"] = bench_messages(int(50000*scale))
+    for clients in (10, 50, 200):
+        print(f"broadcast fan-out ({clients} clients) ...")
+        results[f"broadcast_{clients}"] = bench_broadcast(clients, int(50*scale) or 1)
+    for clients in (0, 10):
+        print(f"idle event loop ({clients} clients) ...")
+        results[f"idle_cpu_{clients}"] = bench_idle_cpu(clients, 2*scale if quick else 2)
+    print("EventEmitter.emit ...")
+    results["emit"] = bench_emit(int(100000*scale))
+    print("headless quiz engine ...")
+    results["engine"] = bench_engine(20, int(50*scale) or 1)
+    return {
+        "meta": {
+            "revision": gitRevision(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+def flatten(d:dict, prefix="")->dict:
+    flat = dict()
+    for k,v in d.items():
+        if isinstance(v, dict): flat.update(flatten(v, f"{prefix}{k}."))
+        else: flat[f"{prefix}{k}"] = v
+    return flat
+
+def compare(oldPath, newPath):
+    with open(oldPath) as f: old = flatten(json.load(f)["results"])
+    with open(newPath) as f: new = flatten(json.load(f)["results"])
+    print(f"{'metric':45} {'old':>14} {'new':>14} {'change':>9}")
+    for key in old:
+        if key not in new or not isinstance(old[key], (int, float)): continue
+        change = f"{(new[key]-old[key])/old[key]*100:+.1f}%" if old[key] else ""
+        print(f"{key:45} {old[key]:14.3f} {new[key]:14.3f} {change:>9}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmark the socket layer")
+    parser.add_argument("--quick", action="store_true", help="smaller iteration counts")
+    parser.add_argument("--out", help="result file, default bench_results/<revision>-<time>.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run(args.quick)
+    out = args.out or os.path.join("bench_results", f"{report['meta']['revision']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["results"], indent=2))
+    print("results written to", out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Headless participant load generator
+Spins up virtual participants (one `ClientSocket` each) which do the magicKey
+handshake, send `setdata`, answer `setquestion` and press the buzzer in round 4
+with configurable latency distributions, then reports message throughput and
+answer-to-ack latency percentiles.
+
+usage :-
+    python -m app.cli.loadgen --participants 200 --duration 30
+    python -m app.cli.loadgen --serve --interval 0.5    # against a headless stub admin
+    python -m app.cli.loadgen --per-connection 4        # 4 participants share each connection (team terminals)
+
+distributions (--answer-delay / --buzzer-delay / --ramp) :-
+    const:0.5 | uniform:0.5,3 | normal:1.5,0.5 | exp:1.0 | lognormal:0,0.5
+"""
+import argparse
+import heapq
+import json
+import random
+import threading
+import time
+from ..lib.sockets import ClientSocket, ServerSocket, MuxClientSocket
+from ..lib.util import PayloadReader, createPayload
+
+def parseDist(spec:str):
+    "returns a function sampling seconds from the distribution `spec`"
+    name, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    samplers = {
+        "const": lambda : values[0],
+        "uniform": lambda : random.uniform(values[0], values[1]),
+        "normal": lambda : random.gauss(values[0], values[1]),
+        "exp": lambda : random.expovariate(1/values[0]),
+        "lognormal": lambda : random.lognormvariate(values[0], values[1]),
+    }
+    if name not in samplers:
+        raise ValueError(f"unknown distribution '{spec}'")
+    sampler = samplers[name]
+    return lambda : max(0.0, sampler())
+
+def percentiles(values:list, ps=(50, 90, 99))->dict:
+    if not values:
+        return dict()
+    values = sorted(values)
+    result = {f"p{p}": values[min(len(values)-1, int(len(values)*p/100))] for p in ps}
+    result["max"] = values[-1]
+    result["count"] = len(values)
+    return result
+
+class Scheduler():
+    """single thread running callbacks at a given monotonic time,
+    so hundreds of participants do not need a timer thread each"""
+
+    def __init__(self) -> None:
+        self.heap = list()
+        self.cond = threading.Condition()
+        self.stopped = False
+        self.seq = 0
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def call_later(self, delay, callback, *args):
+        with self.cond:
+            self.seq += 1
+            heapq.heappush(self.heap, (time.monotonic()+delay, self.seq, callback, args))
+            self.cond.notify()
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                while not self.stopped and (not self.heap or self.heap[0][0] > time.monotonic()):
+                    self.cond.wait(self.heap[0][0]-time.monotonic() if self.heap else None)
+                if self.stopped: return
+                _, _, callback, args = heapq.heappop(self.heap)
+            try:
+                callback(*args)
+            except Exception as e:
+                print("Error in scheduled call : ", e)
+
+class Stats():
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.counters = dict()
+        self.latencies = dict() # name -> [seconds]
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def latency(self, name, seconds):
+        with self.lock:
+            self.latencies.setdefault(name, list()).append(seconds)
+
+    def report(self, elapsed:float)->dict:
+        with self.lock:
+            report = {"elapsed": elapsed, "counters": dict(self.counters)}
+            report["throughput"] = {
+                "messages_out_per_s": self.counters.get("messages_out", 0)/elapsed,
+                "messages_in_per_s": self.counters.get("messages_in", 0)/elapsed,
+            }
+            report["latency_ms"] = {
+                name: {k: (v*1000 if k != "count" else v) for k,v in percentiles(values).items()}
+                for name,values in self.latencies.items()
+            }
+        return report
+
+class VirtualParticipant():
+    client:ClientSocket=None
+    currRound=1
+
+    def __init__(self, i, addr, stats:Stats, scheduler:Scheduler, answerDelay, buzzerDelay, mux:MuxClientSocket=None) -> None:
+        self.name = f"bot-{i:04d}"
+        self.addr = addr
+        self.mux = mux # shared connection, None for a connection of its own
+        self.stats = stats
+        self.scheduler = scheduler
+        self.answerDelay = answerDelay
+        self.buzzerDelay = buzzerDelay
+        self.pending = dict() # qid -> monotonic send time
+        self.reader = PayloadReader()
+        self.buzzedAt = None
+
+    def start(self):
+        self.connectedAt = time.monotonic()
+        self.client = self.mux.open() if self.mux else ClientSocket(self.addr)
+        self.client.on("handshake-done", self.onHandshakeDone)
+        self.client.on("handshake-error", lambda args : self.stats.count("handshake_errors"))
+        self.client.on("disconnected", lambda args : self.stats.count("disconnects"))
+        self.client.on("data", self.onData)
+        self.client.connect()
+
+    def stop(self):
+        self.client.off_all()
+        self.client.disconnect()
+
+    def send(self, payload:bytes):
+        self.stats.count("messages_out")
+        self.stats.count("bytes_out", len(payload))
+        self.client.send(payload)
+
+    def onHandshakeDone(self, args):
+        self.stats.count("handshakes")
+        self.stats.latency("handshake", time.monotonic()-self.connectedAt)
+        self.send(createPayload("setdata", self.name))
+
+    def onData(self, args):
+        data = args[0]
+        self.stats.count("bytes_in", len(data))
+        for payload in self.reader.feed(data):
+            self.stats.count("messages_in")
+            self.handlePayload(payload["action"], payload["data"])
+
+    def handlePayload(self, action, data):
+        if action == "setround":
+            self.currRound = int(data)
+        elif action == "setquestion":
+            qid = json.loads(data)["qid"]
+            if self.currRound == 4:
+                self.scheduler.call_later(self.buzzerDelay(), self.pressBuzzer, qid)
+            else:
+                self.scheduler.call_later(self.answerDelay(), self.answer, qid)
+        elif action == "answer-ack":
+            sentAt = self.pending.pop(str(data["qid"]), None)
+            if sentAt is not None: self.stats.latency("answer_ack", time.monotonic()-sentAt)
+        elif action == "buzzer-ack":
+            if self.buzzedAt is not None: self.stats.latency("buzzer_ack", time.monotonic()-self.buzzedAt)
+            self.buzzedAt = None
+        elif action == "clock-ping":
+            self.send(createPayload("clock-pong", {"t0":data["t0"], "t1":time.monotonic()}))
+        elif action == "answer-rejected":
+            self.pending.pop(str(data["qid"]), None)
+            self.stats.count("answers_rejected")
+
+    def answer(self, qid):
+        self.pending[str(qid)] = time.monotonic()
+        self.send(createPayload("checkanswer", {"qid":qid, "answer":random.randint(1, 4)}))
+
+    def pressBuzzer(self, qid):
+        self.buzzedAt = time.monotonic()
+        self.send(createPayload("buzzer-pressed", {"qid":qid}))
+
+class StubAdmin():
+    """headless admin speaking the participant protocol,
+    acknowledges answers/buzzers and broadcasts a question every `interval`"""
+
+    def __init__(self, addr, interval:float, round:int) -> None:
+        self.server = ServerSocket(addr)
+        self.server.on("data", self.onData)
+        self.interval = interval
+        self.round = round
+        self.named = set() # clients which sent `setdata`
+        self.readers = dict() # clientID -> PayloadReader
+        self.qid = 0
+        self.stopped = False
+
+    def start(self):
+        self.server.start()
+        threading.Thread(target=self._ask_loop, daemon=True).start()
+
+    def stop(self):
+        self.stopped = True
+
+    def onData(self, args):
+        clientID = args[0]["clientID"]
+        reader = self.readers.setdefault(clientID, PayloadReader())
+        for payload in reader.feed(args[0]["data"]):
+            action = payload["action"]
+            if action == "setdata":
+                self.named.add(clientID)
+                self.server.sendTo(createPayload("setround", self.round), clientID)
+            elif action == "checkanswer":
+                self.server.sendTo(createPayload("answer-ack", {"qid":payload["data"]["qid"]}), clientID)
+            elif action == "buzzer-pressed":
+                self.server.sendTo(createPayload("buzzer-ack"), clientID)
+
+    def _ask_loop(self):
+        while not self.stopped:
+            time.sleep(self.interval)
+            self.qid += 1
+            question = json.dumps({"qid":self.qid, "text":f"Question {self.qid}", "options":"a,b,c,d", "imgPath":""})
+            payload = createPayload("setquestion", question)
+            for clientID in tuple(self.named):
+                if clientID in self.server.clients:
+                    self.server.sendTo(payload, clientID)
+
+def run(args)->dict:
+    addr = (args.host, args.port)
+    stub = None
+    if args.serve:
+        stub = StubAdmin(addr, args.interval, args.round)
+        stub.start()
+        time.sleep(0.2)
+
+    stats = Stats()
+    scheduler = Scheduler()
+    answerDelay = parseDist(args.answer_delay)
+    buzzerDelay = parseDist(args.buzzer_delay)
+    muxes = [MuxClientSocket(addr) for _ in range(0, args.participants, args.per_connection)] if args.per_connection > 1 else None
+    participants = [
+        VirtualParticipant(i, addr, stats, scheduler, answerDelay, buzzerDelay, muxes and muxes[i//args.per_connection])
+        for i in range(args.participants)
+    ]
+    start = time.monotonic()
+    # spread the connects over `ramp` seconds
+    for i,p in enumerate(participants):
+        scheduler.call_later(args.ramp*i/max(1, len(participants)), p.start)
+
+    time.sleep(args.duration)
+    elapsed = time.monotonic()-start
+    scheduler.stop()
+    for p in participants:
+        if p.client: p.stop()
+    for mux in muxes or ():
+        mux.off_all()
+        mux.disconnect()
+    if stub: stub.stop()
+
+    report = stats.report(elapsed)
+    report["participants"] = args.participants
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="simulate participants against the admin server")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=4040)
+    parser.add_argument("-n", "--participants", type=int, default=100)
+    parser.add_argument("-d", "--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--ramp", type=float, default=2, help="seconds over which participants connect")
+    parser.add_argument("--answer-delay", default="uniform:0.5,3", help="think time before answering")
+    parser.add_argument("--buzzer-delay", default="exp:0.3", help="reaction time before pressing the buzzer")
+    parser.add_argument("--per-connection", type=int, default=1, help="participants multiplexed on one connection")
+    parser.add_argument("--serve", action="store_true", help="also start a headless stub admin")
+    parser.add_argument("--interval", type=float, default=1, help="stub admin: seconds between questions")
+    parser.add_argument("--round", type=int, default=1, help="stub admin: round sent to participants")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
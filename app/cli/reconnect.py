@@ -0,0 +1,83 @@
+"""
+Reconnect check (headless)
+Plays a turn based round and an all-play round on a `HeadlessAdmin` while
+participants drop and come back with a new client ID, as a participant whose
+Wi-Fi dropped does. The `sync` carrying its old view must give it back its
+place, score and ledger rows, and the rounds must end without errors.
+
+usage :-
+    python -m app.cli.reconnect
+"""
+from ..lib.engine import HeadlessAdmin, NullServer, generateBank
+from ..lib.util import PayloadReader
+
+class ViewServer(NullServer):
+    "keeps the view token of the last `setstate` sent to every client"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.views = dict() # clientID -> sync data
+
+    def sendTo(self, payload:bytes, clientID=None):
+        super().sendTo(payload, clientID)
+        for p in PayloadReader().feed(payload):
+            if p["action"] == "setstate":
+                self.views[clientID] = {"epoch":p["data"]["epoch"], "version":p["data"]["version"], "view":p["data"]["view"]}
+
+def reconnect(admin:HeadlessAdmin, oldID, newID):
+    "`oldID` drops and joins again as `newID`"
+    name = admin.participants.get(oldID).name
+    admin.disconnectParticipant(oldID)
+    assert admin.participants.get(oldID), "a participant of the quiz was dropped on disconnect"
+    admin.addParticipant(newID, name=name)
+    admin.handlePayload(newID, "sync", admin.server.views[oldID])
+    assert admin.participants.get(oldID) is None and admin.participants.get(newID).name == name, "not rebound"
+
+def checkTotals(admin:HeadlessAdmin):
+    for clientID in admin.participants.getClientIDs():
+        assert admin.scores.get(clientID) == admin.ledger.total(clientID), f"score of {clientID} differs from the ledger"
+    assert set(admin.ledger.participant) <= set(admin.participants.getClientIDs()), "ledger rows of a dropped client ID"
+
+def run():
+    admin = HeadlessAdmin(generateBank(60), server=ViewServer(), allPlay=True)
+    for clientID in (1, 2, 3):
+        admin.addParticipant(clientID)
+        admin.handlePayload(clientID, "sync", {})
+    admin.start_quiz()
+
+    # turn based, 2 answers, drops and comes back before its next turn
+    round = admin.currentRound
+    while not round.roundEnded:
+        clientID = round.currentParticipantID()
+        question = round.questions__[round.curr_question_i]
+        admin.handlePayload(clientID, "checkanswer", {"qid":question.qid, "answer":question.answer})
+        if clientID == 2:
+            reconnect(admin, 2, 7)
+            assert admin.participants.getClientIDs() == (1, 7, 3), "the turn order changed"
+        round.askNextQ()
+    checkTotals(admin)
+
+    # all-play, answers then drops every question, its new client ID may not answer again
+    admin.start_next_round()
+    round = admin.currentRound
+    dropping, other = 3, 9
+    while not round.roundEnded:
+        question = round.questions__[round.curr_question_i]
+        assert round.answer(dropping, question.qid, question.answer), f"answer of {dropping} refused"
+        reconnect(admin, dropping, other)
+        assert not round.answer(other, question.qid, question.answer), "answered twice"
+        assert not round.graded, "graded before everyone answered"
+        dropping, other = other, dropping
+        for clientID in admin.participants.getClientIDs():
+            round.answer(clientID, question.qid, question.answer)
+        assert round.graded, "not graded once everyone answered"
+        round.askNextQ()
+    checkTotals(admin)
+    return admin
+
+def main(argv=None):
+    admin = run()
+    print("reconnect check passed, scores", admin.scores.toString())
+
+if __name__ == "__main__":
+    main()
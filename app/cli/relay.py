@@ -0,0 +1,39 @@
+"""
+Relay node of a quiz cluster
+Runs on a second laptop with its own hotspot. Participants of that room connect
+to it like to an admin (it also sends the discovery beacons), their traffic is
+forwarded to the primary admin started with `python admin.py --cluster`.
+
+usage :-
+    python -m app.cli.relay --primary 192.168.1.10
+    python -m app.cli.relay --primary 192.168.1.10 --name hall-b --bind-all
+"""
+import argparse
+import socket
+import time
+from ..lib.relay import RelayNode
+from ..lib.beacon import BeaconSender
+from ..lib.log import setup as setupLogging
+from ..settings import getHOTSPOT, port, beacon_port, relay_port
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="forward the participants of this room to the primary admin")
+    parser.add_argument("--primary", required=True, help="address of the primary admin")
+    parser.add_argument("--primary-port", type=int, default=relay_port)
+    parser.add_argument("--name", default=socket.gethostname(), help="relay name, participants keep their id when it reconnects")
+    parser.add_argument("--bind-all", action="store_true", help="accept participants on every interface")
+    args = parser.parse_args(argv)
+
+    setupLogging("relay")
+    host = "0.0.0.0" if args.bind_all else getHOTSPOT()
+    node = RelayNode(args.name, (args.primary, args.primary_port), (host, port))
+    node.start()
+    BeaconSender(args.name, port, beacon_port, count=lambda : len(node.server.clients)).start()
+    print(f"relay '{args.name}' : participants at {(host, port)}, primary {(args.primary, args.primary_port)}")
+    try:
+        while True: time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Replay a session capture through the headless quiz engine
+Feeds the recorded connections, payloads and operator actions of a capture
+(`python admin.py --record`) to a `HeadlessAdmin` in their original order,
+at the recorded pace or as fast as possible. The questions of every round are
+the recorded ones, so the replay asks the same questions and scores the same
+answers as the event did; the payloads sent by the replay are compared with
+the captured ones to find where the engine behaves differently.
+
+usage :-
+    python -m app.cli.replay data/captures/session-<time>.qcap              # as fast as possible
+    python -m app.cli.replay session.qcap --speed 1                         # real time
+    python -m app.cli.replay session.qcap --dump                            # list the records
+"""
+import argparse
+import json
+import os
+import time
+import traceback
+from ..lib.capture import CaptureReader, IN, OUT, CONNECT, DISCONNECT, CONTROL, kindNames
+from ..lib.engine import HeadlessAdmin
+from ..lib.qb import QuestionBank
+from ..lib.selector import UsageHistory
+from ..lib.util import PayloadReader
+
+class RecordingServer():
+    """stands in for `ServerSocket`, keeps the bytes sent to every client"""
+
+    def __init__(self, admin) -> None:
+        self.admin = admin
+        self.sent = dict() # clientID -> bytes
+        self.messages = 0
+
+    def sendTo(self, payload:bytes, clientID=None):
+        if type(payload) is str:
+            payload = bytes(payload, encoding="utf-8")
+        self.messages += 1
+        self.sent[clientID] = self.sent.get(clientID, b"") + payload
+
+    def broadcast(self, payload:bytes):
+        for clientID in self.admin.participants.getClientIDs():
+            self.sendTo(payload, clientID)
+
+def readOrder(path:str)->dict:
+    "round id -> qids picked during the session"
+    order = dict()
+    for kind, _, _, data in CaptureReader(path):
+        if kind == CONTROL and data[0] == "questions":
+            order[data[1]] = data[2]
+    return order
+
+def readAllPlay(path:str)->bool:
+    "whether the session played `Round2AllPlay` instead of `Round2`"
+    return any(kind == CONTROL and data[0] == "all_play" for kind, _, _, data in CaptureReader(path))
+
+# carry clock readings or the session epoch, which differ between the event and the replay
+timingActions = ("clock-ping", "setdeadline", "setstate")
+
+def comparable(sent:bytes)->list:
+    return [p for p in PayloadReader().feed(sent) if p["action"] not in timingActions]
+
+def control(admin:HeadlessAdmin, name:str, args:list):
+    "repeats an operator action, `questions` was applied before the replay"
+    round = admin.currentRound
+    if name == "start_quiz": admin.start_quiz()
+    elif name == "start_next_round": admin.start_next_round()
+    elif name == "roll": round.roll(*args)
+    elif name == "rebind": admin.rebind(*args)
+    elif name in ("ask", "askNextQ", "mark_right", "mark_wrong", "grade"):
+        getattr(round, name)(*args)
+
+def replay(path:str, qBank:QuestionBank, speed:float=0, strict=False)->dict:
+    """
+    `speed` 1 replays at the recorded pace, 2 twice as fast, 0 without waiting.
+    Returns the counts, the time spent in the engine and where the payloads
+    sent by the replay differ from the capture
+    """
+    admin = HeadlessAdmin(qBank, allPlay=readAllPlay(path))
+    admin.min_participants = 0
+    admin.questionOrder = readOrder(path)
+    server = RecordingServer(admin)
+    admin.server = server
+    now = [0.0] # captured time of the record being replayed
+    admin.clock = lambda : now[0]
+    asked = [0]
+    for round in admin.rounds:
+        round.on("question-asked", lambda args : asked.__setitem__(0, asked[0]+1))
+
+    readers = dict() # clientID -> PayloadReader
+    captured = dict() # clientID -> bytes
+    counts = {name:0 for name in kindNames.values()}
+    payloads = 0
+    errors = list()
+    engineTime = 0.0
+    startedAt = time.monotonic()
+
+    for kind, seconds, clientID, data in CaptureReader(path):
+        counts[kindNames[kind]] += 1
+        now[0] = seconds
+        if kind == OUT:
+            captured[clientID] = captured.get(clientID, b"") + data
+            continue
+        if speed:
+            delay = startedAt + seconds/speed - time.monotonic()
+            if delay > 0: time.sleep(delay)
+
+        start = time.perf_counter()
+        try:
+            if kind == CONNECT:
+                admin.addParticipant(clientID)
+            elif kind == DISCONNECT:
+                readers.pop(clientID, None)
+                admin.disconnectParticipant(clientID)
+            elif kind == IN:
+                reader = readers.setdefault(clientID, PayloadReader())
+                for payload in reader.feed(data):
+                    payloads += 1
+                    admin.handlePayload(clientID, payload["action"], payload["data"])
+            elif kind == CONTROL:
+                control(admin, data[0], data[1:])
+        except Exception as e:
+            if strict: raise
+            errors.append({"at":seconds, "record":kindNames[kind], "clientID":clientID, "error":repr(e), "traceback":traceback.format_exc()})
+        engineTime += time.perf_counter()-start
+    elapsed = time.monotonic()-startedAt
+
+    diverged = dict()
+    for clientID in set(captured) | set(server.sent):
+        expected, got = comparable(captured.get(clientID, b"")), comparable(server.sent.get(clientID, b""))
+        if expected == got: continue
+        i = next((i for i,(a,b) in enumerate(zip(expected, got)) if a != b), min(len(expected), len(got)))
+        diverged[clientID] = {"payload":i, "captured":expected[i] if i < len(expected) else None, "replay":got[i] if i < len(got) else None}
+
+    names = dict(zip(admin.participants.getClientIDs(), admin.participants.getNames()))
+    return {
+        "records": counts,
+        "payloads_in": payloads,
+        "payloads_out": server.messages,
+        "questions": asked[0],
+        "seconds": elapsed,
+        "engine_seconds": engineTime,
+        "payloads_per_s": payloads/engineTime if engineTime else 0.0,
+        "questions_per_s": asked[0]/engineTime if engineTime else 0.0,
+        "ranking": [[names.get(id, id), score] for id,score in admin.scores.ranking()] if admin.scores else [],
+        "errors": errors,
+        "diverged": diverged,
+    }
+
+def dump(path:str):
+    for kind, seconds, clientID, data in CaptureReader(path):
+        if kind == CONTROL: text = json.dumps(data)
+        else: text = data.decode("utf-8", "replace")
+        print(f"{seconds:10.3f} {kindNames[kind]:10} {clientID:>6} {text}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="replay a session capture through the headless engine")
+    parser.add_argument("capture", help="capture file written by `admin.py --record`")
+    parser.add_argument("--speed", type=float, default=0, help="1 for the recorded pace, 0 (default) as fast as possible")
+    parser.add_argument("--questions", default=os.path.join("data", "questions"), help="question bank of the session")
+    parser.add_argument("--strict", action="store_true", help="stop at the first exception of the engine")
+    parser.add_argument("--dump", action="store_true", help="print the records instead of replaying them")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    if args.dump:
+        dump(args.capture)
+        return
+
+    qBank = QuestionBank(qdir=args.questions)
+    qBank.history = UsageHistory(None) # a replay must not touch the usage history of the event
+    report = replay(args.capture, qBank, args.speed, args.strict)
+
+    print(f"records    : {', '.join(f'{k} {v}' for k,v in report['records'].items())}")
+    print(f"payloads   : {report['payloads_in']} in, {report['payloads_out']} out, {report['questions']} questions")
+    print(f"time       : {report['seconds']:.3f} s, {report['engine_seconds']*1000:.1f} ms in the engine")
+    print(f"throughput : {report['payloads_per_s']:.0f} payloads/s, {report['questions_per_s']:.0f} questions/s")
+    for i,(name, score) in enumerate(report["ranking"]):
+        print(f"{i+1:>3}. {name} : {score}")
+    for error in report["errors"]:
+        print(f"error at {error['at']:.3f}s ({error['record']} {error['clientID']}) :\n{error['traceback']}")
+    for clientID, diff in report["diverged"].items():
+        print(f"client {clientID} diverged at payload {diff['payload']} :\n  captured : {diff['captured']}\n  replay   : {diff['replay']}")
+    if not report["diverged"]:
+        print("outbound payloads match the capture")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Round Analytics
+End of round statistics from the score ledger, computed in one pass over its
+column arrays with NumPy :-
+
+    difficulty     -> percent of the answers to a question which were right
+    discrimination -> right share of the best teams minus the worst ones
+                      (top / bottom `groupShare` of the round), only when every
+                      team of both groups answered (all-play rounds), else None
+    response_time  -> average seconds from asking to answering
+    rank_delta     -> positions a team moved in the overall ranking, + is up
+
+NumPy is optional (listed in requirements.txt), without it there is no analysis.
+"""
+from .metrics import registry
+
+analysisTime = registry.histogram("round.analysis")
+
+def analyseRound(ledger, roundID:int, before:list, after:list, groupShare:float=0.27)->dict:
+    """
+    `before` and `after` are the overall rankings [(id, score)] around the
+    round. Returns {"round", "questions", "teams"}, None without NumPy
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    with analysisTime.time():
+        mask = np.asarray(ledger.round) == roundID
+        participant = np.asarray(ledger.participant)[mask]
+        qid = np.asarray(ledger.qid)[mask]
+        delta = np.asarray(ledger.delta)[mask]
+        responseTime = np.asarray(ledger.response_time)[mask]
+        right = delta > 0
+
+        qids, qi = np.unique(qid, return_inverse=True)
+        n = len(qids)
+        answers = np.bincount(qi, minlength=n)
+        rightCount = np.bincount(qi, weights=right, minlength=n)
+        timeSum = np.bincount(qi, weights=responseTime, minlength=n)
+
+        teams, ti = np.unique(participant, return_inverse=True)
+        teamScore = np.bincount(ti, weights=delta, minlength=len(teams))
+        order = np.argsort(-teamScore, kind="stable")
+        k = max(1, int(len(teams)*groupShare + 0.5))
+        upper = np.zeros(len(teams), dtype=bool)
+        lower = np.zeros(len(teams), dtype=bool)
+        if len(teams) >= 2:
+            upper[order[:k]] = True
+            lower[order[-k:]] = True
+        inUpper, inLower = upper[ti], lower[ti]
+        answersUpper = np.bincount(qi, weights=inUpper, minlength=n)
+        answersLower = np.bincount(qi, weights=inLower, minlength=n)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            difficulty = rightCount / answers * 100
+            averageTime = timeSum / answers
+            discrimination = np.bincount(qi, weights=right & inUpper, minlength=n) / answersUpper \
+                - np.bincount(qi, weights=right & inLower, minlength=n) / answersLower
+        # a turn based question says nothing about the groups
+        discrimination[(answersUpper < upper.sum()) | (answersLower < lower.sum()) | (len(teams) < 2)] = np.nan
+
+        beforeRank = {id:rank for rank,(id, _) in enumerate(before)}
+        previous = np.array([beforeRank.get(id, len(before)) for id,_ in after], dtype=np.int64)
+        rankDelta = previous - np.arange(len(after))
+
+        return {
+            "round": roundID,
+            "questions": [
+                {
+                    "qid": ledger.qids[q],
+                    "answers": a,
+                    "difficulty": d,
+                    "discrimination": None if D != D else D, # NaN
+                    "response_time": t,
+                }
+                for q, a, d, D, t in zip(qids.tolist(), answers.tolist(), difficulty.tolist(), discrimination.tolist(), averageTime.tolist())
+            ],
+            "teams": [
+                {"id": id, "score": score, "rank": rank, "rank_delta": moved}
+                for rank, ((id, score), moved) in enumerate(zip(after, rankDelta.tolist()))
+            ],
+        }
+
+def summarize(analysis:dict, names:dict=None)->str:
+    "one line for the scoreboard, `names` client ID -> team name"
+    if not analysis: return ""
+    names = names or dict()
+    parts = list()
+    questions = analysis["questions"]
+    if questions:
+        hardest = min(questions, key=lambda q : q["difficulty"])
+        parts.append(f"Hardest : {hardest['qid']} ({hardest['difficulty']:.0f}% right)")
+        rated = [q for q in questions if q["discrimination"] is not None]
+        if rated:
+            best = max(rated, key=lambda q : q["discrimination"])
+            parts.append(f"Best separator : {best['qid']} (D {best['discrimination']:.2f})")
+        answers = sum(q["answers"] for q in questions)
+        average = sum(q["response_time"]*q["answers"] for q in questions) / answers
+        parts.append(f"Avg. response : {average:.1f}s")
+    climbers = [team for team in analysis["teams"] if team["rank_delta"] > 0]
+    if climbers:
+        top = max(climbers, key=lambda team : team["rank_delta"])
+        parts.append(f"Biggest climb : {names.get(top['id'], top['id'])} ▲{top['rank_delta']}")
+    return "     ".join(parts)
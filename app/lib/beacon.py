@@ -0,0 +1,141 @@
+"""
+Server Discovery Beacons
+The admin broadcasts a small UDP datagram every `interval` seconds
+    {"app": "quiz_app", "name": ..., "port": ..., "version": ..., "participants": ...}
+participants listen on `beacon_port` and list the servers they heard from,
+the server address is the source address of the datagram.
+"""
+import json
+import time
+from socket import socket, AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_BROADCAST, SO_REUSEADDR, inet_aton, inet_ntoa
+from threading import Thread, Event, Lock
+from .sockets import EventEmitter, protocolVersion
+from . import netinfo
+
+appName = "quiz_app"
+
+def broadcastAddresses()->list:
+    "directed broadcast address of every interface, plus the limited broadcast"
+    addresses = ["255.255.255.255"]
+    for i in netinfo.interfaces():
+        if not i.netmask: continue
+        address = int.from_bytes(inet_aton(i.address), "big")
+        netmask = int.from_bytes(inet_aton(i.netmask), "big")
+        addresses.append(inet_ntoa(((address | ~netmask) & 0xffffffff).to_bytes(4, "big")))
+    return addresses
+
+class BeaconSender():
+    """announces the admin server, `count` returns the current participant count"""
+
+    def __init__(self, name:str, port:int, beaconPort:int, count=None, interval:float=0.5) -> None:
+        self.name = name
+        self.port = port
+        self.beaconPort = beaconPort
+        self.count = count or (lambda : 0)
+        self.interval = interval
+        self.stopped = Event()
+        self.thread = None
+
+    def payload(self)->bytes:
+        return bytes(json.dumps({
+            "app":appName,
+            "name":self.name,
+            "port":self.port,
+            "version":protocolVersion,
+            "participants":self.count(),
+        }), encoding="utf-8")
+
+    def start(self):
+        if self.thread: return
+        self.stopped.clear()
+        self.thread = Thread(target=self._beacon_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _beacon_loop(self):
+        with socket(AF_INET, SOCK_DGRAM) as sock:
+            sock.setsockopt(SOL_SOCKET, SO_BROADCAST, 1)
+            targets = broadcastAddresses()
+            while not self.stopped.is_set():
+                payload = self.payload()
+                for address in targets:
+                    try:
+                        sock.sendto(payload, (address, self.beaconPort))
+                    except OSError:
+                        pass # interface went down, the next beacon retries
+                self.stopped.wait(self.interval)
+        self.thread = None
+
+class BeaconListener(EventEmitter):
+    """
+    Collects the beacons of the servers on the network.
+    Events :-
+    server-found -> (server) first beacon of a server
+    """
+    ttl = 3 # seconds after which a silent server is dropped
+
+    def __init__(self, beaconPort:int) -> None:
+        super().__init__()
+        self.beaconPort = beaconPort
+        self.servers = dict() # (host, port) -> server dict
+        self.lock = Lock()
+        self.sock = None
+        self.thread = None
+
+    def start(self):
+        if self.thread: return
+        self.sock = socket(AF_INET, SOCK_DGRAM)
+        self.sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        try:
+            from socket import SO_REUSEPORT
+            self.sock.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1) # several participants on one machine
+        except (ImportError, OSError):
+            pass
+        self.sock.bind(("", self.beaconPort))
+        self.thread = Thread(target=self._listen_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+
+    def list(self)->list:
+        "servers heard in the last `ttl` seconds, most participants first"
+        now = time.monotonic()
+        with self.lock:
+            for key in [k for k,s in self.servers.items() if now - s["seenAt"] > self.ttl]:
+                self.servers.pop(key)
+            servers = list(self.servers.values())
+        servers.sort(key=lambda s : (-s["participants"], s["name"]))
+        return servers
+
+    def _listen_loop(self):
+        while True:
+            try:
+                data, (host, _) = self.sock.recvfrom(2048)
+            except OSError:
+                break # closed by `stop`
+            try:
+                beacon = json.loads(data)
+                if beacon.get("app") != appName: continue
+                server = {
+                    "name":str(beacon["name"]),
+                    "host":host,
+                    "port":int(beacon["port"]),
+                    "version":int(beacon["version"]),
+                    "participants":int(beacon.get("participants", 0)),
+                    "compatible":int(beacon["version"]) == protocolVersion,
+                    "seenAt":time.monotonic(),
+                }
+            except (ValueError, KeyError, TypeError):
+                continue # not one of ours
+            key = (host, server["port"])
+            with self.lock:
+                isNew = key not in self.servers
+                self.servers[key] = server
+            if isNew: self.emit("server-found", server)
+        self.thread = None
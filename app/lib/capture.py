@@ -0,0 +1,88 @@
+"""
+Session Capture
+Records the traffic of the admin `ServerSocket` and the operator actions into
+a compact binary file, so an event can be replayed through a headless admin
+(`python -m app.cli.replay`).
+
+file :-
+    b"QCAP" | version (uint16) | wall clock start time (float64)
+    records :- kind (uint8) | seconds since start (float64) | clientID (int32) | length (uint32) | data
+
+kinds :-
+    IN / OUT -> raw bytes received from / sent to `clientID`
+    CONNECT / DISCONNECT -> no data
+    CONTROL -> json [name, *args], an operator action or a decision of the engine
+               (`start_quiz`, `mark_right`, `roll`, the questions picked for a round ...)
+"""
+import json
+import os
+import struct # the stdlib module, not app/lib/struct.py
+import time
+from threading import Lock
+
+magic = b"QCAP"
+version = 1
+_fileHeader = struct.Struct("<Hd")
+_record = struct.Struct("<BdiI")
+
+IN, OUT, CONNECT, DISCONNECT, CONTROL = 1, 2, 3, 4, 5
+kindNames = {IN:"in", OUT:"out", CONNECT:"connect", DISCONNECT:"disconnect", CONTROL:"control"}
+
+class CaptureWriter():
+    """thread safe, the socket loop and the Tk thread both write to it.
+    Buffered, flushed at most every `flushInterval` seconds"""
+    flushInterval = 1.0
+
+    def __init__(self, path:str) -> None:
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "wb")
+        self.lock = Lock()
+        self.startedAt = time.monotonic()
+        self.flushedAt = self.startedAt
+        self.records = 0
+        self.file.write(magic + _fileHeader.pack(version, time.time()))
+
+    def write(self, kind:int, clientID=-1, data:bytes=b""):
+        with self.lock:
+            if self.file.closed: return
+            now = time.monotonic()
+            self.file.write(_record.pack(kind, now-self.startedAt, clientID, len(data)))
+            if data: self.file.write(data)
+            self.records += 1
+            if now - self.flushedAt > self.flushInterval:
+                self.file.flush()
+                self.flushedAt = now
+
+    def control(self, name:str, *args):
+        self.write(CONTROL, -1, bytes(json.dumps([name, *args]), encoding="utf-8"))
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed: self.file.close()
+
+class CaptureReader():
+    """iterates the records of a capture as (kind, seconds, clientID, data),
+    CONTROL data is decoded to the [name, *args] list"""
+
+    def __init__(self, path:str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            head = f.read(len(magic) + _fileHeader.size)
+        if head[:len(magic)] != magic:
+            raise ValueError(f"'{path}' is not a capture file")
+        self.version, self.startedAt = _fileHeader.unpack(head[len(magic):])
+        if self.version > version:
+            raise ValueError(f"capture version {self.version} is newer than {version}")
+
+    def __iter__(self):
+        with open(self.path, "rb") as f:
+            f.seek(len(magic) + _fileHeader.size)
+            while True:
+                head = f.read(_record.size)
+                if len(head) < _record.size: return # end, or cut short by a crash
+                kind, seconds, clientID, length = _record.unpack(head)
+                data = f.read(length)
+                if len(data) < length: return
+                if kind == CONTROL: data = json.loads(data)
+                yield kind, seconds, clientID, data
@@ -0,0 +1,40 @@
+"""
+Clock Offsets
+The admin owns the question deadlines (its `time.monotonic`), every participant
+renders them in its own monotonic clock. The offset between the two is
+estimated over the quiz socket, like NTP :-
+
+    admin       -> clock-ping {"t0": admin time}
+    participant -> clock-pong {"t0": t0, "t1": participant time}     (sent at once)
+    admin receives the pong at t2, rtt = t2-t0, offset = t1 - (t0+t2)/2
+
+of the last `samples` pings the one with the smallest rtt is used, it was the
+least delayed by the network.
+"""
+from collections import deque
+
+class ClockOffsets():
+    samples = 8
+
+    def __init__(self) -> None:
+        self.clients = dict() # clientID -> deque of (rtt, offset)
+
+    def pong(self, clientID, data:dict, now:float):
+        t0, t1 = float(data["t0"]), float(data["t1"])
+        rtt = now - t0
+        if rtt < 0: return # not one of our pings
+        samples = self.clients.setdefault(clientID, deque(maxlen=self.samples))
+        samples.append((rtt, t1 - (t0+now)/2))
+
+    def best(self, clientID):
+        "(rtt, offset) of the least delayed ping, None before the first pong"
+        samples = self.clients.get(clientID)
+        return min(samples) if samples else None
+
+    def toClient(self, clientID, t:float):
+        "admin time `t` in the clock of `clientID`, None while the offset is unknown"
+        best = self.best(clientID)
+        return t + best[1] if best else None
+
+    def forget(self, clientID):
+        self.clients.pop(clientID, None)
@@ -0,0 +1,112 @@
+"""
+Headless Quiz Engine
+Runs the same `ADMIN` and round classes as the Tk admin without a display
+or sockets, so the quiz logic can be driven by tests, load tests and benchmarks.
+
+usage :-
+    admin = HeadlessAdmin(qBank)
+    admin.addParticipant(1, name="team-1")
+    ...
+    report = simulate(admin)
+"""
+import random
+import time
+from .struct import ADMIN
+from .qb import QuestionBank, Question
+from .rounds import Round1, Round2, Round2AllPlay, Round3, Round4, AllPlayRound
+
+class NullServer():
+    """stands in for `ServerSocket`, counts the payloads instead of sending them"""
+
+    def __init__(self) -> None:
+        self.sent = 0
+        self.bytes = 0
+
+    def sendTo(self, payload:bytes, clientID=None):
+        self.sent += 1
+        self.bytes += len(payload)
+
+    def broadcast(self, payload:bytes):
+        self.sent += 1
+        self.bytes += len(payload)
+
+class HeadlessAdmin(ADMIN):
+
+    def __init__(self, qBank:QuestionBank, server=None, allPlay=False) -> None:
+        super().__init__()
+        self.qBank = qBank
+        self.server = server or NullServer()
+        self.rounds = (
+            Round1(self),
+            Round2AllPlay(self) if allPlay else Round2(self),
+            Round3(self),
+            Round4(self),
+        )
+        self.currentRound = self.rounds[self.curr_round_i]
+
+    def schedule(self, at:float, method, *args):
+        "no timers, the driver grades `AllPlayRound` questions itself"
+        pass
+
+    def addParticipant(self, clientID, client=None, name=None):
+        super().addParticipant(clientID, client)
+        self.setUserData(clientID, name or f"participant-{clientID}")
+
+def generateBank(num_q:int, levels=(1, 2, 3))->QuestionBank:
+    "in-memory question bank with `num_q` generated questions per round"
+    qBank = QuestionBank(None)
+    for r in range(1, 5):
+        questions = tuple(
+            Question(f"{r}-{i}", f"Question {i}", "a,b,c,d", random.randint(1, 4), "", levels[i % len(levels)])
+            for i in range(num_q)
+        )
+        setattr(qBank, f"round{r}", questions)
+    return qBank
+
+def simulate(admin:ADMIN, accuracy:float=0.5, seed=None)->dict:
+    """
+    Plays every round of `admin` to the end, participants answer right with
+    probability `accuracy`. Returns the number of questions and the elapsed time.
+    """
+    rng = random.Random(seed)
+    asked = [0]
+    for round in admin.rounds:
+        round.on("question-asked", lambda args : asked.__setitem__(0, asked[0]+1))
+
+    start = time.perf_counter()
+    admin.start_quiz()
+    while True:
+        round = admin.currentRound
+        while not round.roundEnded:
+            question:Question = round.questions__[round.curr_question_i]
+            isRight = rng.random() < accuracy
+            if isinstance(round, Round4):
+                clientID = rng.choice(admin.participants.getClientIDs())
+                round.buzzer_pressed(clientID)
+                round.mark_right() if isRight else round.mark_wrong()
+            elif isinstance(round, AllPlayRound):
+                # everyone answers, the last answer grades the question
+                for clientID in admin.participants.getClientIDs():
+                    right = rng.random() < accuracy
+                    round.answer(clientID, question.qid, question.answer if right else int(question.answer)%4+1)
+            else:
+                answer = question.answer if isRight else int(question.answer)%4+1
+                round.check_answer(question.qid, answer)
+                if isinstance(round, Round3) and round.rolling_i is not None and round.target_i is None:
+                    # wrong answer, the dice picks who answers next
+                    round.roll()
+                    round.ask()
+                    question = round.questions__[round.curr_question_i]
+                    round.check_answer(question.qid, question.answer if rng.random() < accuracy else int(question.answer)%4+1)
+            round.askNextQ()
+        if admin.curr_round_i+1 >= len(admin.rounds):
+            break
+        admin.start_next_round()
+    elapsed = time.perf_counter()-start
+
+    return {
+        "questions": asked[0],
+        "seconds": elapsed,
+        "questions_per_s": asked[0]/elapsed if elapsed else 0.0,
+        "ranking": admin.scores.ranking(),
+    }
@@ -0,0 +1,148 @@
+"""
+Score Ledger
+Every mark given during the quiz is appended as a row
+    (participant, round, qid, delta, timestamp, response time)
+into compact column arrays. Totals, per round subtotals and the cumulative
+response time (tie-breaker) are updated as rows are recorded.
+"""
+from array import array
+import csv
+import os
+import time
+
+class Ledger():
+    columns = ("participant", "round", "qid", "delta", "timestamp", "response_time")
+
+    def __init__(self) -> None:
+        self.participant = array("q")
+        self.round = array("b")
+        self.qid = array("l") # index into `qids`
+        self.delta = array("l")
+        self.timestamp = array("d")
+        self.response_time = array("d")
+
+        self.qids = list() # interned question IDs
+        self.qidIndex = dict()
+        self.totals = dict() # participant -> total
+        self.subtotals = dict() # (participant, round) -> subtotal
+        self.responseTotals = dict() # participant -> cumulative response time
+
+    def __len__(self):
+        return len(self.delta)
+
+    def record(self, participant:int, round:int, qid, delta:int, response_time:float=0.0, timestamp:float=None):
+        qid = str(qid)
+        if qid not in self.qidIndex:
+            self.qidIndex[qid] = len(self.qids)
+            self.qids.append(qid)
+
+        self.participant.append(participant)
+        self.round.append(round)
+        self.qid.append(self.qidIndex[qid])
+        self.delta.append(delta)
+        self.timestamp.append(time.time() if timestamp is None else timestamp)
+        self.response_time.append(response_time)
+
+        self.totals[participant] = self.totals.get(participant, 0) + delta
+        self.subtotals[(participant, round)] = self.subtotals.get((participant, round), 0) + delta
+        self.responseTotals[participant] = self.responseTotals.get(participant, 0.0) + response_time
+
+    def recordMany(self, participants:list, round:int, qid, deltas:list, response_times:list, timestamp:float=None):
+        "rows of one question graded at once, the columns are extended in one go"
+        if not participants: return
+        qid = str(qid)
+        if qid not in self.qidIndex:
+            self.qidIndex[qid] = len(self.qids)
+            self.qids.append(qid)
+        count = len(participants)
+        self.participant.extend(participants)
+        self.round.extend([round]*count)
+        self.qid.extend([self.qidIndex[qid]]*count)
+        self.delta.extend(deltas)
+        self.timestamp.extend([time.time() if timestamp is None else timestamp]*count)
+        self.response_time.extend(response_times)
+
+        for participant, delta, response_time in zip(participants, deltas, response_times):
+            self.totals[participant] = self.totals.get(participant, 0) + delta
+            self.subtotals[(participant, round)] = self.subtotals.get((participant, round), 0) + delta
+            self.responseTotals[participant] = self.responseTotals.get(participant, 0.0) + response_time
+
+    def rename(self, old:int, new:int):
+        "the rows and totals of `old` belong to `new`, a participant who reconnected"
+        for i in range(len(self)):
+            if self.participant[i] == old: self.participant[i] = new
+        for totals in (self.totals, self.responseTotals):
+            if old in totals: totals[new] = totals.get(new, 0) + totals.pop(old)
+        for (participant, round) in [key for key in self.subtotals if key[0] == old]:
+            self.subtotals[(new, round)] = self.subtotals.get((new, round), 0) + self.subtotals.pop((old, round))
+
+    def total(self, participant)->int:
+        return self.totals.get(participant, 0)
+
+    def subtotal(self, participant, round)->int:
+        return self.subtotals.get((participant, round), 0)
+
+    def responseTime(self, participant)->float:
+        return self.responseTotals.get(participant, 0.0)
+
+    def ranking(self, participants=None)->list:
+        """[(participant, total)] best first,
+        equal totals are broken by the fastest cumulative response time"""
+        if participants is None:
+            participants = self.totals.keys()
+        return sorted(
+            ((p, self.total(p)) for p in participants),
+            key=lambda item : (-item[1], self.responseTime(item[0]))
+        )
+
+    def row(self, i)->dict:
+        return {
+            "participant":self.participant[i],
+            "round":self.round[i],
+            "qid":self.qids[self.qid[i]],
+            "delta":self.delta[i],
+            "timestamp":self.timestamp[i],
+            "response_time":self.response_time[i],
+        }
+
+    def entries(self, participant=None, round=None, qid=None)->list:
+        "audit query, rows matching every given filter"
+        qidI = None
+        if qid is not None:
+            qidI = self.qidIndex.get(str(qid))
+            if qidI is None: return list()
+        rows = list()
+        for i in range(len(self)):
+            if participant is not None and self.participant[i] != participant: continue
+            if round is not None and self.round[i] != round: continue
+            if qidI is not None and self.qid[i] != qidI: continue
+            rows.append(self.row(i))
+        return rows
+
+    def exportCSV(self, path:str, names:dict=None):
+        "writes every row, `names` (participant -> name) adds a name column"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.columns + (("name",) if names else tuple()))
+            for i in range(len(self)):
+                row = list(self.row(i).values())
+                if names: row.append(names.get(self.participant[i], ""))
+                writer.writerow(row)
+
+    def exportParquet(self, path:str):
+        "needs `pyarrow` (optional dependency)"
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("install `pyarrow` to export the ledger as parquet")
+        table = pa.table({
+            "participant":self.participant.tolist(),
+            "round":self.round.tolist(),
+            "qid":[self.qids[i] for i in self.qid],
+            "delta":self.delta.tolist(),
+            "timestamp":self.timestamp.tolist(),
+            "response_time":self.response_time.tolist(),
+        })
+        pq.write_table(table, path)
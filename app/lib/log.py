@@ -0,0 +1,95 @@
+"""
+Structured Logging
+Per-subsystem loggers (`getLogger("sockets")`, "rounds", "ui", ...) built on the
+stdlib `logging` module. A record below the level is dropped by the level check
+before anything is formatted; records above it are only queued. A background
+thread formats them into rotating JSON-lines files (and the console), so a slow
+console never stalls the socket loop.
+
+    log = getLogger("sockets")
+    log.debug("recv %d bytes", len(recv), extra={"clientID": clientID})
+
+each line of the file :-
+    {"time": ..., "level": "DEBUG", "logger": "quiz.sockets", "msg": "recv 12 bytes", "thread": ..., "clientID": 4242}
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from .metrics import registry
+
+rootName = "quiz"
+# attributes every LogRecord has, anything else came from `extra`
+_standard = set(logging.LogRecord("", 0, "", 0, "", None, None).__dict__) | {"message", "asctime"}
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record:logging.LogRecord)->str:
+        line = {
+            "time":record.created,
+            "level":record.levelname,
+            "logger":record.name,
+            "msg":record.getMessage(),
+            "thread":record.threadName,
+        }
+        for key,value in record.__dict__.items():
+            if key not in _standard: line[key] = value
+        if record.exc_info:
+            line["exc"] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str)
+
+dropped = registry.counter("log.dropped")
+
+class _BufferedHandler(QueueHandler):
+    """queues the record as it is, the message is formatted by the writer thread.
+    When the writer falls behind records are dropped instead of blocking"""
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped.inc()
+
+_listener:QueueListener=None
+
+def getLogger(subsystem:str)->logging.Logger:
+    return logging.getLogger(f"{rootName}.{subsystem}")
+
+def setup(name:str, level=None, logDir=None, consoleLevel=logging.INFO, maxBytes=5*1024*1024, backupCount=3, maxPending=10000):
+    """
+    Start the writer thread, records go to `<logDir>/<name>.jsonl` (rotated at
+    `maxBytes`) and, from `consoleLevel` up, to the console.
+    `QUIZ_LOG_LEVEL` overrides `level` (default INFO).
+    """
+    global _listener
+    if _listener: return
+    level = os.environ.get("QUIZ_LOG_LEVEL", level or "INFO")
+    logDir = logDir or os.path.join(os.getcwd(), "logs")
+    os.makedirs(logDir, exist_ok=True)
+
+    fileHandler = RotatingFileHandler(os.path.join(logDir, f"{name}.jsonl"), maxBytes=maxBytes, backupCount=backupCount, encoding="utf-8")
+    fileHandler.setFormatter(JSONFormatter())
+    console = logging.StreamHandler()
+    console.setLevel(consoleLevel)
+    console.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(name)s : %(message)s", "%H:%M:%S"))
+
+    records = queue.Queue(maxPending)
+    root = logging.getLogger(rootName)
+    root.setLevel(level)
+    root.addHandler(_BufferedHandler(records))
+    root.propagate = False
+
+    _listener = QueueListener(records, fileHandler, console, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+
+def shutdown():
+    "writes the pending records and stops the writer thread"
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
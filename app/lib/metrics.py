@@ -0,0 +1,167 @@
+"""
+Metrics Registry
+Counters, gauges and fixed bucket histograms cheap enough for the socket loop.
+Updates are plain attribute writes without locks, a value may miss an update
+when two threads race on it, which is fine for diagnostics.
+
+usage :-
+    from .metrics import registry
+    registry.counter("socket.bytes_in").inc(len(recv))
+    with registry.histogram("round.answer_latency").time(): ...
+    registry.startDump("data/metrics/metrics.jsonl", interval=10)
+"""
+import json
+import os
+import time
+from bisect import bisect_left
+from threading import Thread, Event
+
+# seconds, from sub-millisecond socket work to answers taking the whole timer
+defaultBuckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class Counter():
+    kind = "counter"
+
+    def __init__(self, name) -> None:
+        self.name = name
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def snapshot(self):
+        return self.value
+
+class Gauge():
+    kind = "gauge"
+
+    def __init__(self, name) -> None:
+        self.name = name
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, n=1):
+        self.value += n
+
+    def dec(self, n=1):
+        self.value -= n
+
+    def snapshot(self):
+        return self.value
+
+class _Timer():
+    def __init__(self, histogram) -> None:
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter()-self.start)
+
+class Histogram():
+    """`counts[i]` holds the observations <= `buckets[i]`,
+    the last slot the ones above every bucket"""
+    kind = "histogram"
+
+    def __init__(self, name, buckets=defaultBuckets) -> None:
+        self.name = name
+        self.buckets = tuple(buckets)
+        self.counts = [0]*(len(self.buckets)+1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value:float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def time(self)->_Timer:
+        return _Timer(self)
+
+    def quantile(self, q:float)->float:
+        "upper bound of the bucket holding the `q` quantile"
+        if not self.count: return 0.0
+        target = q*self.count
+        seen = 0
+        for i,count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def snapshot(self):
+        return {
+            "count":self.count,
+            "sum":self.sum,
+            "mean":self.sum/self.count if self.count else 0.0,
+            "p50":self.quantile(0.5),
+            "p90":self.quantile(0.9),
+            "p99":self.quantile(0.99),
+            "buckets":dict(zip([str(b) for b in self.buckets]+["+inf"], self.counts)),
+        }
+
+class Registry():
+
+    def __init__(self) -> None:
+        self.metrics = dict() # name -> metric
+        self.dumpThread = None
+        self.stopped = Event()
+
+    def __get(self, cls, name, *args):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics.setdefault(name, cls(name, *args))
+        if not isinstance(metric, cls):
+            raise TypeError(f"metric '{name}' is a {metric.kind}")
+        return metric
+
+    def counter(self, name)->Counter:
+        return self.__get(Counter, name)
+
+    def gauge(self, name)->Gauge:
+        return self.__get(Gauge, name)
+
+    def histogram(self, name, buckets=defaultBuckets)->Histogram:
+        return self.__get(Histogram, name, buckets)
+
+    def snapshot(self)->dict:
+        return {name: metric.snapshot() for name,metric in sorted(tuple(self.metrics.items()))}
+
+    def dump(self, path:str):
+        "appends one json line {time, metrics} to `path`"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a") as f:
+            f.write(json.dumps({"time":time.time(), "metrics":self.snapshot()}) + "\n")
+
+    def startDump(self, path:str, interval:float=10):
+        if self.dumpThread: return
+        self.stopped.clear()
+        def loop():
+            while not self.stopped.wait(interval):
+                try:
+                    self.dump(path)
+                except OSError as e:
+                    from .log import getLogger # log imports this module
+                    getLogger("metrics").error("error dumping metrics : %s", e)
+            self.dumpThread = None
+        self.dumpThread = Thread(target=loop, daemon=True)
+        self.dumpThread.start()
+
+    def stopDump(self):
+        self.stopped.set()
+
+registry = Registry()
+
+def watchTk(window, name="ui", interval=100):
+    """schedules a tick every `interval` ms on the Tk event loop of `window`,
+    `<name>.tick_lag` records how late each tick ran (time the loop was busy)"""
+    lag = registry.histogram(f"{name}.tick_lag")
+    def tick(expected):
+        now = time.perf_counter()
+        lag.observe(max(0.0, now-expected))
+        window.after(interval, tick, time.perf_counter()+interval/1000)
+    window.after(interval, tick, time.perf_counter()+interval/1000)
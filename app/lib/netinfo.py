@@ -0,0 +1,200 @@
+"""
+Network Interface Discovery
+Enumerates the IPv4 interfaces of this machine without spawning processes
+where possible :-
+1.) Linux : `socket.if_nameindex` + `ioctl` for addresses, `/proc/net/route` for gateways
+2.) Windows : a single `netsh interface ipv4 show config` call
+3.) anything else : the address of the default route (UDP connect, nothing is sent)
+
+The last good result is kept in memory for `cacheTTL` seconds and in
+`data/network.json`, it is used when discovery fails (e.g. the hotspot is
+toggled while the app starts).
+"""
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+from .log import getLogger
+
+log = getLogger("net")
+
+SIOCGIFFLAGS = 0x8913
+SIOCGIFADDR = 0x8915
+SIOCGIFNETMASK = 0x891b
+IFF_UP = 0x1
+IFF_LOOPBACK = 0x8
+
+cachePath = os.path.join(os.getcwd(), "data", "network.json")
+cacheTTL = 5.0 # seconds, a hotspot turned on meanwhile is found by the next call
+# container, VM and VPN adapters, never the hotspot
+virtualPrefixes = ("docker", "br-", "virbr", "veth", "vmnet", "vboxnet", "lxcbr", "lxdbr",
+    "tun", "tap", "wg", "tailscale", "zt", "vEthernet", "VirtualBox", "VMware")
+
+class Interface():
+    name:str=None
+    address:str=None
+    netmask:str=None
+    gateway:str=None # default gateway reached through this interface
+    wireless=False
+    virtual=False # software bridge / adapter without a wireless port
+
+    def __init__(self, name, address, netmask=None, gateway=None, wireless=False, virtual=False) -> None:
+        self.name = name
+        self.address = address
+        self.netmask = netmask
+        self.gateway = gateway
+        self.wireless = wireless
+        self.virtual = virtual or (not wireless and name.startswith(virtualPrefixes))
+
+    def toDict(self):
+        return {
+            "name":self.name,
+            "address":self.address,
+            "netmask":self.netmask,
+            "gateway":self.gateway,
+            "wireless":self.wireless,
+            "virtual":self.virtual,
+        }
+
+    def __repr__(self) -> str:
+        return f"Interface({self.name!r}, {self.address!r}, gateway={self.gateway!r})"
+
+def _ioctl(sock, request, name:str)->bytes:
+    import fcntl
+    return fcntl.ioctl(sock.fileno(), request, struct.pack("256s", name[:15].encode()))
+
+def _linuxGateways()->dict:
+    "interface name -> default gateway, from `/proc/net/route`"
+    gateways = dict()
+    with open("/proc/net/route") as f:
+        for line in f.readlines()[1:]:
+            fields = line.split()
+            if len(fields) < 3 or fields[1] != "00000000": continue
+            gateways.setdefault(fields[0], socket.inet_ntoa(struct.pack("<L", int(fields[2], 16))))
+    return gateways
+
+def _linuxInterfaces()->list:
+    gateways = _linuxGateways()
+    interfaces = list()
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for _, name in socket.if_nameindex():
+            try:
+                flags = struct.unpack("H", _ioctl(sock, SIOCGIFFLAGS, name)[16:18])[0]
+                if not flags & IFF_UP or flags & IFF_LOOPBACK: continue
+                address = socket.inet_ntoa(_ioctl(sock, SIOCGIFADDR, name)[20:24])
+                netmask = socket.inet_ntoa(_ioctl(sock, SIOCGIFNETMASK, name)[20:24])
+            except OSError:
+                continue # no IPv4 address
+            # a hostapd bridge is wireless when one of its ports is
+            ports = os.listdir(f"/sys/class/net/{name}/brif") if os.path.isdir(f"/sys/class/net/{name}/brif") else list()
+            wireless = any(os.path.exists(f"/sys/class/net/{n}/wireless") for n in [name, *ports])
+            virtual = os.path.exists(f"/sys/devices/virtual/net/{name}") and not wireless
+            interfaces.append(Interface(name, address, netmask, gateways.get(name), wireless, virtual))
+    return interfaces
+
+def _netshInterfaces()->list:
+    output = subprocess.check_output("netsh interface ipv4 show config", shell=True, universal_newlines=True)
+    interfaces = list()
+    current = None
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith("Configuration for interface"):
+            name = line.split('"')[1] if '"' in line else line[len("Configuration for interface"):].strip()
+            current = Interface(name, None, wireless=name.startswith(("Wi-Fi", "Local Area Connection*")))
+            interfaces.append(current)
+        elif current is None or ":" not in line:
+            continue
+        elif line.startswith("IP Address"):
+            current.address = line.split(":", 1)[1].strip()
+        elif line.startswith("Default Gateway"):
+            current.gateway = line.split(":", 1)[1].strip() or None
+        elif line.startswith("Subnet Prefix"):
+            # "192.168.137.0/24 (mask 255.255.255.0)"
+            if "mask" in line: current.netmask = line.rsplit("mask", 1)[1].strip(" )")
+    return [i for i in interfaces if i.address and not i.address.startswith("127.")]
+
+def _routeInterfaces()->list:
+    "address used for the default route, `connect` on UDP does not send anything"
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.connect(("10.255.255.255", 1))
+        address = sock.getsockname()[0]
+    if address.startswith("127."): return list()
+    return [Interface("default", address)]
+
+_cache:list=None
+_cachedAt = float("-inf")
+
+def _discover()->list:
+    if sys.platform.startswith("linux"):
+        try:
+            return _linuxInterfaces()
+        except Exception as e:
+            log.warning("error enumerating interfaces : %s", e)
+    elif sys.platform == "win32":
+        try:
+            return _netshInterfaces()
+        except Exception as e:
+            log.warning("error running netsh : %s", e)
+    return _routeInterfaces()
+
+def _loadCache()->list:
+    try:
+        with open(cachePath) as f:
+            return [Interface(**i) for i in json.load(f)]
+    except Exception:
+        return list()
+
+def _saveCache(interfaces:list):
+    try:
+        os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+        with open(cachePath, "w") as f:
+            json.dump([i.toDict() for i in interfaces], f)
+    except OSError as e:
+        log.warning("error saving network cache : %s", e)
+
+def interfaces(refresh=False)->list:
+    """up, non loopback IPv4 interfaces, cached for `cacheTTL` seconds.
+    Falls back to the last good result when nothing is found"""
+    global _cache, _cachedAt
+    if _cache and not refresh and time.monotonic() - _cachedAt < cacheTTL:
+        return _cache
+    try:
+        found = _discover()
+    except OSError as e:
+        log.warning("error discovering interfaces : %s", e)
+        found = list()
+    if found:
+        _saveCache(found)
+    else:
+        found = _cache or _loadCache()
+    _cache, _cachedAt = found, time.monotonic()
+    return found
+
+def hotspotAddress(refresh=False)->str:
+    """address participants connect to, the hotspot interface is the one
+    serving clients (no default gateway of its own), preferring wireless ones.
+    Container and VM bridges are left out"""
+    candidates = [i for i in interfaces(refresh) if not i.virtual]
+    if not candidates:
+        raise OSError("TURN ON HOTSPOT FIRST")
+    hotspots = [i for i in candidates if i.name.startswith("Local Area Connection")]
+    if not hotspots:
+        hotspots = sorted(
+            candidates,
+            key=lambda i : (i.gateway is not None, not i.wireless)
+        )
+    return hotspots[0].address
+
+def gatewayAddress(refresh=False)->str:
+    "default gateway, the admin's hotspot when a participant joins it over Wi-Fi"
+    candidates = [i for i in interfaces(refresh) if i.gateway]
+    if not candidates:
+        raise OSError("no default gateway found, connect to the quiz Wi-Fi first")
+    candidates.sort(key=lambda i : not i.wireless)
+    return candidates[0].gateway
+
+if __name__ == "__main__":
+    for i in interfaces(): print(i.toDict())
@@ -2,21 +2,32 @@ import csv
 import json
 import random
 import os
+from .selector import UsageHistory
+from .log import getLogger
+
+log = getLogger("questions")
 
 class QuestionBank():
     qdir=None
+    history:UsageHistory=None
     round1:tuple=tuple()
     round2:tuple=tuple()
     round3:tuple=tuple()
     round4:tuple=tuple()
 
-    def __init__(self, qdir:str) -> None:
+    def __init__(self, qdir:str=None) -> None:
+        """`qdir=None` gives an empty bank without usage history,
+        rounds are then filled directly (headless engine)"""
         self.qdir = qdir
+        if qdir is None:
+            self.history = UsageHistory(None)
+            return
         if not os.path.exists(self.qdir):
             os.makedirs(self.qdir, exist_ok=True)
             os.makedirs(os.path.join(self.qdir, "imgs"), exist_ok=True)
             
         self.load()
+        self.history = UsageHistory(os.path.join(self.qdir, "history.json"))
         pass
 
     def loadQfromCSV(self, csvPath):
@@ -48,10 +59,8 @@ class QuestionBank():
         if os.path.exists(files[3]):
             self.round4 = self.loadQfromCSV(files[3])
 
-        print("round1:",len(self.round1))
-        print("round2:",len(self.round2))
-        print("round3:",len(self.round3))
-        print("round4:",len(self.round4))
+        log.info("questions loaded, round1:%d round2:%d round3:%d round4:%d",
+            len(self.round1), len(self.round2), len(self.round3), len(self.round4))
 
 class Question():
     """Data class for Question"""
@@ -60,13 +69,16 @@ class Question():
     text:str=None
     options:str = None
     answer:int=None
+    difficulty:int=None
 
-    def __init__(self, qid, text, options, answer, imgPath, *args) -> None:
+    def __init__(self, qid, text, options, answer, imgPath, difficulty=None, *args) -> None:
         self.qid = qid
         self.text = text
         self.options = options
         self.answer = answer
         self.imgPath = imgPath
+        # optional 6th csv column
+        self.difficulty = int(difficulty) if str(difficulty or "").strip() else None
     
     def forParticipant(self):
         return ClientQuestion(self.qid, self.text, self.options, self.imgPath)
@@ -78,13 +90,16 @@ class ClientQuestion():
         self.options = options
         self.imgPath = imgPath
 
-    def jsons(self):
-        return json.dumps({
+    def toDict(self):
+        return {
             "qid":self.qid,
             "text":self.text,
             "options":self.options,
             "imgPath":self.imgPath
-        })
+        }
+
+    def jsons(self):
+        return json.dumps(self.toDict())
     
     def loads(self, s):
         data = json.loads(s)
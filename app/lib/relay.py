@@ -0,0 +1,348 @@
+"""
+Relay Cluster
+For venues larger than one hotspot. Relay nodes (`python -m app.cli.relay`)
+accept the participants of their room on the usual port and forward their
+traffic to the primary admin over one connection on `relay_port`. The primary
+sees every relayed participant as a normal client, its `RelayHub` stands in
+for the `ServerSocket` of the admin.
+
+frames, both directions one `relay` payload per flush :-
+    relay -> primary {"name": relay name, "m": [["connect", cid], ["data", cid, text, t], ["disconnect", cid], ...]}
+                     t is the relay's monotonic time the bytes were received
+    primary -> relay {"m": [[cid | "*", text], ...]} "*" goes to every participant of the relay
+
+A broadcast of the primary is one entry per relay, not one per participant.
+The primary pings the relays (`clock-ping`) like participants, so the receive
+times of answers and buzzers are converted to the admin clock.
+"""
+import codecs
+import time
+from collections import ChainMap
+from threading import Thread, Event, Lock, Timer
+from types import SimpleNamespace
+from .sockets import ServerSocket, ClientSocket, EventEmitter
+from .clock import ClockOffsets
+from .util import PayloadReader, createPayload
+from .capture import IN, OUT, CONNECT, DISCONNECT
+from .metrics import registry
+from .log import getLogger
+
+log = getLogger("relay")
+
+relayFrames = registry.counter("relay.frames")
+relayed = registry.gauge("relay.participants")
+
+class _Batcher():
+    """collects the entries of every destination and sends them as one frame
+    every `interval` seconds, from its own thread. With `keep` the entries of
+    a failed send wait for the next flush, beyond `maxBacklog` only the ones
+    `keep(entry)` is True for"""
+    maxBacklog = 10000
+
+    def __init__(self, send, interval:float, keep=None) -> None:
+        self.send = send # (destination, entries)
+        self.keep = keep
+        self.interval = interval
+        self.pending = dict() # destination -> list of entries
+        self.lock = Lock()
+        self.stopped = Event()
+        self.thread = None
+
+    def add(self, destination, entry):
+        with self.lock:
+            self.pending.setdefault(destination, list()).append(entry)
+
+    def drop(self, destination):
+        with self.lock:
+            self.pending.pop(destination, None)
+
+    def start(self):
+        if self.thread: return
+        self.stopped.clear()
+        self.thread = Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, dict()
+        for destination, entries in pending.items():
+            try:
+                self.send(destination, entries)
+                relayFrames.inc()
+            except Exception as e:
+                if self.keep is None:
+                    log.warning("error sending %d relay entries : %s", len(entries), e)
+                    continue
+                self.requeue(destination, entries)
+
+    def requeue(self, destination, entries):
+        "back in front of the entries added meanwhile"
+        with self.lock:
+            entries = entries + self.pending.get(destination, list())
+            if len(entries) > self.maxBacklog:
+                kept = [entry for entry in entries if self.keep(entry)]
+                log.warning("backlog full, %d relay entries dropped", len(entries) - len(kept))
+                entries = kept
+            self.pending[destination] = entries
+
+    def _flush_loop(self):
+        while not self.stopped.wait(self.interval):
+            self.flush()
+        self.thread = None
+
+class RelayHub(EventEmitter):
+    """
+    Primary side, same interface as `ServerSocket` (events, `clients`,
+    `sendTo`, `broadcast`) for the local participants plus the relayed ones.
+    Events :-
+    new-connection -> (clientID)
+    data -> ({"clientID", "data", "at"}) at is the receive time in admin clock, None when local
+    disconnected -> (clientID)
+    """
+    flushInterval = 0.005
+    pingInterval = 2.0
+    firstID = 100000 # relayed clientIDs, above every port number
+    detachGrace = 60.0 # seconds the participants of a lost relay wait for it to reconnect
+
+    def __init__(self, server:ServerSocket, addr:tuple, clock=time.monotonic) -> None:
+        super().__init__()
+        self.server = server
+        self.relayServer = ServerSocket(addr)
+        self.clock = clock
+        self.relays = dict() # relay connection -> SimpleNamespace(name, reader, pingedAt)
+        self.virtual = dict() # clientID -> SimpleNamespace(relay=connection | None while lost, localID, lostAt)
+        self.lock = Lock() # the relay loop and the `detachGrace` timers
+        self.ids = dict() # (relay name, local clientID) -> clientID, kept over reconnects of the relay
+        self.nextID = self.firstID
+        self.offsets = ClockOffsets()
+        self.clients = ChainMap(server.clients, self.virtual)
+        self.batcher = _Batcher(self._send_frame, self.flushInterval)
+        self._capture = None
+
+        server.on("new-connection", lambda args : self.emit("new-connection", *args))
+        server.on("data", lambda args : self.emit("data", args[0]))
+        server.on("disconnected", lambda args : self.emit("disconnected", *args))
+        self.relayServer.on("new-connection", self.onRelayConnected)
+        self.relayServer.on("data", self.onRelayData)
+        self.relayServer.on("disconnected", self.onRelayDisconnected)
+
+    @property
+    def capture(self):
+        return self._capture
+
+    @capture.setter
+    def capture(self, capture):
+        self._capture = capture
+        self.server.capture = capture
+
+    def start(self):
+        self.server.start()
+        self.relayServer.start()
+        self.batcher.start()
+        log.info("accepting relays at %s", self.relayServer.addr)
+
+    def stop(self):
+        self.batcher.stop()
+        self.server.stop()
+        self.relayServer.stop()
+
+    def sendTo(self, message:bytes|str, clientID=None):
+        client = self.virtual.get(clientID)
+        if client is None:
+            return self.server.sendTo(message, clientID)
+        if client.relay is None: return # its relay is away, a `sync` catches it up on return
+        if type(message) is bytes:
+            message = message.decode("utf-8")
+        if self._capture: self._capture.write(OUT, clientID, bytes(message, encoding="utf-8"))
+        self.batcher.add(client.relay, [client.localID, message])
+        self._ping(client.relay)
+
+    def broadcast(self, message:bytes):
+        self.server.broadcast(message)
+        text = message.decode("utf-8") if type(message) is bytes else message
+        for relay in list(self.relays):
+            self.batcher.add(relay, ["*", text])
+        if self._capture:
+            for clientID in list(self.virtual):
+                self._capture.write(OUT, clientID, bytes(text, encoding="utf-8"))
+
+    def _send_frame(self, relay, entries):
+        if relay in self.relays:
+            self.relayServer.sendTo(createPayload("relay", {"m":entries}), relay)
+
+    def _ping(self, relay):
+        state = self.relays.get(relay)
+        now = self.clock()
+        if state and now - state.pingedAt > self.pingInterval:
+            state.pingedAt = now
+            self.relayServer.sendTo(createPayload("clock-ping", {"t0":now}), relay)
+
+    def onRelayConnected(self, args):
+        relay = args[0]
+        self.relays[relay] = SimpleNamespace(name=None, reader=PayloadReader(), pingedAt=float("-inf"))
+
+    def onRelayData(self, args):
+        relay = args[0]["clientID"]
+        state = self.relays.get(relay)
+        if state is None: return
+        for payload in state.reader.feed(args[0]["data"]):
+            if payload["action"] == "clock-pong":
+                self.offsets.pong(relay, payload["data"], self.clock())
+            elif payload["action"] == "relay":
+                if state.name is None:
+                    state.name = str(payload["data"].get("name") or relay)
+                    log.info("relay '%s' connected", state.name)
+                    self._ping(relay)
+                for entry in payload["data"]["m"]:
+                    self.onEntry(relay, state, entry)
+        state.reader.check()
+
+    def onEntry(self, relay, state, entry):
+        kind, localID = entry[0], entry[1]
+        key = (state.name, localID)
+        if kind == "connect":
+            with self.lock:
+                clientID = self.ids.get(key)
+                if clientID is None:
+                    clientID = self.ids[key] = self.nextID
+                    self.nextID += 1
+                known = self.virtual.get(clientID) # announced again after the relay reconnected
+                self.virtual[clientID] = SimpleNamespace(relay=relay, localID=localID, lostAt=None)
+            if known is None:
+                relayed.inc()
+                if self._capture: self._capture.write(CONNECT, clientID)
+                self.emit("new-connection", clientID)
+            elif known.relay is None:
+                # back within `detachGrace`, the payloads sent meanwhile were dropped
+                data = createPayload("sync", {})
+                if self._capture: self._capture.write(IN, clientID, data)
+                self.emit("data", {"clientID":clientID, "data":data, "at":None})
+        elif kind == "data":
+            clientID = self.ids.get(key)
+            if clientID not in self.virtual: return
+            data = bytes(entry[2], encoding="utf-8")
+            offset = self.offsets.best(relay)
+            at = entry[3] - offset[1] if offset else None
+            if self._capture: self._capture.write(IN, clientID, data)
+            self.emit("data", {"clientID":clientID, "data":data, "at":at})
+        elif kind == "disconnect":
+            self._disconnect(self.ids.get(key))
+
+    def _disconnect(self, clientID):
+        if self.virtual.pop(clientID, None) is None: return
+        relayed.dec()
+        if self._capture: self._capture.write(DISCONNECT, clientID)
+        self.emit("disconnected", clientID)
+
+    def onRelayDisconnected(self, args):
+        relay = args[0]
+        state = self.relays.pop(relay, None)
+        self.batcher.drop(relay)
+        self.offsets.forget(relay)
+        now = self.clock()
+        with self.lock:
+            lost = [id for id,c in self.virtual.items() if c.relay == relay]
+            for clientID in lost:
+                self.virtual[clientID].relay, self.virtual[clientID].lostAt = None, now
+        log.warning("relay '%s' disconnected, its %d participants wait %s s for it", state and state.name, len(lost), self.detachGrace)
+        timer = Timer(self.detachGrace, self._expire, (lost,))
+        timer.daemon = True
+        timer.start()
+
+    def _expire(self, clientIDs):
+        "disconnects the participants whose relay did not come back in `detachGrace`"
+        with self.lock:
+            for clientID in clientIDs:
+                client = self.virtual.get(clientID)
+                if client and client.relay is None and self.clock() - client.lostAt >= self.detachGrace:
+                    self._disconnect(clientID)
+
+class RelayNode():
+    """
+    Secondary admin node, participants connect to `listen`, everything is
+    forwarded to the primary at `primary` (its `relay_port`)
+    """
+    flushInterval = 0.005
+    reconnectDelay = 3
+
+    def __init__(self, name:str, primary:tuple, listen:tuple) -> None:
+        self.name = name
+        self.primary = primary
+        self.server = ServerSocket(listen)
+        self.client:ClientSocket = None
+        self.reader = None
+        self.connected = Event()
+        self.decoders = dict() # clientID -> utf-8 decoder, a character may span two reads
+        # kept while the primary is away, the connects and disconnects above all
+        self.batcher = _Batcher(lambda _, entries : self._send(entries), self.flushInterval, keep=lambda entry : entry[0] != "data")
+
+        self.server.on("new-connection", lambda args : self.batcher.add(None, ["connect", args[0]]))
+        self.server.on("data", self.onData)
+        self.server.on("disconnected", self.onDisconnected)
+
+    def start(self):
+        self.server.start()
+        self.batcher.start()
+        self.connect()
+
+    def onData(self, args):
+        payload = args[0]
+        decoder = self.decoders.get(payload["clientID"])
+        if decoder is None:
+            decoder = self.decoders[payload["clientID"]] = codecs.getincrementaldecoder("utf-8")("replace")
+        text = decoder.decode(payload["data"])
+        if text: self.batcher.add(None, ["data", payload["clientID"], text, time.monotonic()])
+
+    def onDisconnected(self, args):
+        self.decoders.pop(args[0], None)
+        self.batcher.add(None, ["disconnect", args[0]])
+
+    def _send(self, entries):
+        if not self.connected.is_set():
+            raise ConnectionError("primary not connected")
+        self.client.send(createPayload("relay", {"name":self.name, "m":entries}))
+
+    def connect(self):
+        log.info("connecting to the primary at %s", self.primary)
+        self.reader = PayloadReader()
+        self.client = ClientSocket(self.primary)
+        self.client.on("handshake-done", self.onConnected)
+        self.client.on("data", self.onPrimaryData)
+        self.client.on("disconnected", self.onPrimaryLost)
+        self.client.on("handshake-error", self.onPrimaryLost)
+        self.client.connect()
+
+    def onConnected(self, args):
+        log.info("connected to the primary")
+        self.connected.set()
+        # announce the participants already here, the primary keeps their clientIDs
+        for clientID in list(self.server.clients):
+            self.batcher.add(None, ["connect", clientID])
+
+    def onPrimaryLost(self, args):
+        if self.client is None: return # already reconnecting
+        log.warning("lost the primary, reconnecting in %s s", self.reconnectDelay)
+        self.connected.clear()
+        self.client.off_all()
+        self.client.disconnect()
+        self.client = None
+        timer = Thread(target=lambda : (time.sleep(self.reconnectDelay), self.connect()), daemon=True)
+        timer.start()
+
+    def onPrimaryData(self, args):
+        for payload in self.reader.feed(args[0]):
+            action, data = payload["action"], payload["data"]
+            if action == "clock-ping":
+                self.client.send(createPayload("clock-pong", {"t0":data["t0"], "t1":time.monotonic()}))
+            elif action == "relay":
+                for target, text in data["m"]:
+                    message = bytes(text, encoding="utf-8")
+                    try:
+                        if target == "*": self.server.broadcast(message)
+                        else: self.server.sendTo(message, target)
+                    except Exception as e:
+                        log.debug("participant %s gone : %s", target, e)
+        self.reader.check()
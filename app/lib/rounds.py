@@ -13,13 +13,22 @@ import random
 from .struct import ADMIN
 from .qb import QuestionBank
 from .util import Participants,Participant
-from .struct import Round
+from .struct import Round, questionsAsked, lateAnswers, answerLatency, recorded
 from .qb import ClientQuestion, Question
 from .sm import Scores
+from .selector import QuestionSelector
 from .util import createPayload
-from ..ui.admin.frames.live import PlayFrame
-from ..ui.rounds.round2 import Round2 as R2
+from .metrics import registry
+from .log import getLogger
 import random
+from array import array
+
+log = getLogger("rounds")
+
+buzzerLatency = registry.histogram("round.buzzer_latency") # question sent -> first buzzer
+buzzerArbitration = registry.histogram("round.buzzer_arbitration") # handling one buzzer press
+buzzerIgnored = registry.counter("round.buzzer_ignored") # repeated or stale presses
+answersGraded = registry.histogram("round.grading") # grading every answer of a question
 
 class Round1(Round):
     name="Straight Forward"
@@ -33,9 +42,129 @@ class Round2(Round):
 
     def check_answer(self, qid, answer):
         rightAns = super().check_answer(qid, answer)
-        self.admin.show_right_answer(qid, rightAns, answer)
+        self.emit("show-answer", qid, rightAns, answer)
     
+class AllPlayRound(Round):
+    """
+    Every question is broadcast and all participants answer at once. Answers
+    are collected with their response time and graded together when the
+    deadline passes, when everyone answered or when the operator marks.
+    Extra events :-
+    answers-graded -> (qid, rightAns, results) results [(clientID, answer, isRight, responseTime)]
+    """
+    totalQ = 10
+    graded = True # the current question takes no more answers
+    answered:dict=None # clientID -> row of the current question
+    expected:int=0 # answers which close the question early, the scored participants connected
+    clientIDs:list=None # rows of the answers to the current question
+    given:array=None
+    times:array=None
+
+    def loadQ(self):
+        self.questions__ = self.selectQuestions(self.questions__, self.totalQ)
+        self.answers = {str(q.qid):q.answer for q in self.questions__}
+
+    def start(self):
+        self.admin.record("all_play", self.id)
+        super().start()
+
+    def askQ(self):
+        question:Question = self.questions__[self.curr_question_i]
+        self.selector.markUsed(question)
+        self.startDeadline()
+        questionsAsked.inc()
+        self.graded = False
+        self.answered = dict()
+        self.expected = sum(1 for cid in self.admin.participants.getClientIDs() if self.curr_scores.get(cid) is not None)
+        self.clientIDs = list()
+        self.given = array("b")
+        self.times = array("d")
+
+        question:ClientQuestion = question.forParticipant()
+        self.admin.askAll(question, self.deadline)
+        for cid in self.admin.participants.getClientIDs():
+            self.admin.sendDeadline(cid, question.qid, self.deadline)
+        self.emit("question-asked", None, question, "", f"Question : {self.curr_question_i+1}/{len(self.questions__)}", self.deadline)
+        self.admin.publish_state(
+            question=question.toDict(), participant="",
+            timer={"limit":self.time_limit, "deadline":self.deadline},
+        )
+        self.admin.schedule(self.deadline + self.grace, self.grade, self.curr_question_i)
+
+    def rebind(self, oldID, newID):
+        super().rebind(oldID, newID)
+        if self.answered and oldID in self.answered:
+            row = self.answered[newID] = self.answered.pop(oldID)
+            self.clientIDs[row] = newID
+
+    def answer(self, clientID, qid, answer, at=None)->bool:
+        """keeps the first answer of `clientID` to the current question,
+        participants who joined after the round started are not scored in it"""
+        if self.graded or clientID in self.answered or self.curr_scores.get(clientID) is None \
+            or str(qid) != str(self.questions__[self.curr_question_i].qid):
+            return False
+        if at is None: at = self.admin.clock()
+        try:
+            answer = int(answer)
+        except (TypeError, ValueError):
+            answer = 0 # never right
+        self.answered[clientID] = len(self.clientIDs)
+        self.clientIDs.append(clientID)
+        self.given.append(max(-128, min(127, answer)))
+        self.times.append(max(0.0, at - self.askedAt))
+        answerLatency.observe(at - self.askedAt)
+        if len(self.answered) >= self.expected:
+            self.grade(self.curr_question_i)
+        return True
+
+    @recorded
+    def grade(self, index):
+        """marks every answer to question `index` in one pass, a stale timer
+        (the question was graded or another one asked) does nothing"""
+        if self.graded or self.roundEnded or index != self.curr_question_i: return
+        question:Question = self.questions__[index]
+        rightAns = int(question.answer)
+        with answersGraded.time():
+            correct = [given == rightAns for given in self.given]
+            deltas = [self.mark if isRight else self.minusMark for isRight in correct]
+            self.curr_scores.addAll(dict(zip(self.clientIDs, deltas)))
+            self.admin.ledger.recordMany(self.clientIDs, self.id, question.qid, deltas, self.times)
+        self.graded = True
+        self.lastQuestionMarked = True
+        results = list(zip(self.clientIDs, self.given.tolist(), correct, self.times.tolist()))
+        log.debug("question %s graded, %d of %d right", question.qid, sum(correct), len(correct))
+        self.emit("answers-graded", question.qid, rightAns, results)
+
+    @recorded
+    def mark_right(self):
+        # the operator closes the question before the deadline
+        self.grade(self.curr_question_i)
+
+    @recorded
+    def mark_wrong(self):
+        self.grade(self.curr_question_i)
+
+    @recorded
+    def askNextQ(self):
+        if not self.lastQuestionMarked : return
+        self.lastQuestionMarked = False
+        self.curr_question_i += 1
+        if self.curr_question_i >= len(self.questions__):
+            self.onend()
+            return
+        self.askQ()
+
+class Round2AllPlay(AllPlayRound):
+    "Bujho Toh Jano with every participant answering every question"
+    name=Round2.name
+    def __init__(self,admin:ADMIN) -> None:
+        super().__init__(admin, admin.qBank.round2,mark=10, minusMark=-5, id=2, name=Round2AllPlay.name)
+
 class Round3(Round):
+    """
+    Extra events :-
+    dice -> (visible) the roll the dice interface is shown / hidden
+    """
     name="Roll the Dice"
     rolling_i=None # store the index of the participant who is rolling the dice
     target_i=None # the index of the participant came by rolling the dice
@@ -46,47 +175,52 @@ class Round3(Round):
     def check_answer(self, qid, answer):
         rightAns = super().check_answer(qid, answer)
         isRight = int(rightAns) == int(answer)
-        if self.rolling_i is not None or isRight: self.admin.show_right_answer(qid, rightAns, answer)
+        if self.rolling_i is not None or isRight: self.emit("show-answer", qid, rightAns, answer)
         if not isRight and self.rolling_i is None:
             self.roll_the_dice()
             pass
     
     def roll_the_dice(self):
         """Show the roll the dice interface and then """
-        pf:PlayFrame = PlayFrame.me
-        pf.curr_round.dice.show()
+        self.emit("dice", True)
         self.rolling_i=self.curr_participant_i
         pass
 
-    def roll(self)->int:
-        num:int = self.admin.participants.count()
-        indices = list(range(0,num))
-        indices.remove(int(self.rolling_i))
-        result = random.choice(indices)
+    def roll(self, result=None)->int:
+        """picks the next participant, a replay passes the captured `result`"""
+        if result is None:
+            num:int = self.admin.participants.count()
+            indices = list(range(0,num))
+            indices.remove(int(self.rolling_i))
+            result = random.choice(indices)
         self.target_i = result
+        self.admin.record("roll", result)
 
         name = self.admin.participants.getNames()[result]
         return name
         pass
 
+    @recorded
     def ask(self):
-        pf:PlayFrame = PlayFrame.me
-        pf.curr_round.dice.hide()
+        self.emit("dice", False)
         self.curr_participant_i = self.target_i
         self.askQ()
     
+    @recorded
     def mark_right(self):
         if self.lastQuestionMarked or self.roundEnded:return
         self.lastQuestionMarked=True
-        participantID = self.admin.participants.getClientIDs()[self.curr_participant_i]
-        self.curr_scores.add(participantID, self.mark)
+        participantID = self.currentParticipantID()
+        self.award(participantID, self.mark)
 
+    @recorded
     def mark_wrong(self):
         if self.lastQuestionMarked or self.roundEnded:return
         self.lastQuestionMarked=True
-        participantID = self.admin.participants.getClientIDs()[self.curr_participant_i]
-        self.curr_scores.add(participantID, self.minusMark)
+        participantID = self.currentParticipantID()
+        self.award(participantID, self.minusMark)
 
+    @recorded
     def askNextQ(self):
         if not self.lastQuestionMarked : return
         self.lastQuestionMarked = False
@@ -106,46 +240,26 @@ class Round3(Round):
 
 
 class Round4(Round):
+    """
+    Every question is broadcast, the first buzzer answers.
+    Extra events :-
+    buzzer-cleared -> ()
+    buzzer-pressed -> (clientID, name, position) position is 1 for the first buzzer
+    """
     name="Speedo Round"
     totalQ = 15
     isBuzzerPressed=False
     first_id = None
+    firstAt:float=None # admin clock time of the first press
+    buzzed:dict=None # clientID -> position, in the order they pressed the buzzer
 
     def __init__(self,admin) -> None:
         super().__init__(admin, admin.qBank.round4,mark=10, minusMark=-5, id=4, name=Round4.name)
 
-    
-    def check_answer(self, qid, answer):
-        self.lastQuestionMarked=True
-        rightAns = None
-        for question in self.questions__:
-            if str(qid) == str(question.qid):
-                rightAns=question.answer
-        isRight=int(rightAns)==int(answer)
-        print(f"CHECKING ANSWER qid:{qid}, ans:{answer}, correct:{rightAns}")
-        participantID = self.admin.participants.getClientIDs()[self.curr_participant_i]
-        if isRight:
-            self.curr_scores.add(participantID, self.mark)
-        else:
-            self.curr_scores.add(participantID, self.minusMark)
-
-        print(isRight)
-        return rightAns
-        
     def loadQ(self):
-        allQuestions = list(self.admin.qBank.round4)
-        
-        if len(allQuestions) < self.totalQ:
-            raise Exception(f"NUMBER OF QUESTIONs in DB is less than participants : {len(allQuestions)} < {self.totalQ}")
-        random.shuffle(allQuestions)
-        self.questions__ = tuple(allQuestions[0:self.totalQ])
-
-    def start(self):
-        print(f"ROUND-{self.id} started")
-        self.loadQ()
-        self.admin.server.broadcast(createPayload("setround", self.id))
-        self.askQ()
-        self.curr_scores=Scores(self.admin.participants.getClientIDs())
+        # every question is asked to all participants
+        self.questions__ = self.selectQuestions(self.admin.qBank.round4, self.totalQ)
+        self.answers = {str(q.qid):q.answer for q in self.questions__}
 
     def askQ(self):
         self.first_id=None
@@ -153,19 +267,24 @@ class Round4(Round):
         self.clear_users()
         # participantID = self.admin.participants.getClientIDs()[self.currentParticipant]
         question:Question = self.questions__[self.curr_question_i]
+        self.selector.markUsed(question)
+        self.startDeadline()
+        questionsAsked.inc()
         # self.admin.askQ(participantID, question.forParticipant())
         question:ClientQuestion = question.forParticipant()
         # self.admin.ui.f_main.f_live.f_play.curr_round.setQ(question)
-        self.admin.server.broadcast(
-            createPayload("setquestion", question.jsons())
-            )
+        self.admin.askAll(question, self.deadline)
+        for cid in self.admin.participants.getClientIDs():
+            self.admin.sendDeadline(cid, question.qid, self.deadline)
 
-        pf:PlayFrame = PlayFrame.me
-        pf.curr_round.setQ(question)
         # name = self.admin.participants.getNames()[self.currentParticipant]
-        pf.setInfo("", f"Question : {self.curr_question_i+1}/{len(self.questions__)}")
-        pass
+        self.emit("question-asked", None, question, "", f"Question : {self.curr_question_i+1}/{len(self.questions__)}", self.deadline)
+        self.admin.publish_state(
+            question=question.toDict(), participant="",
+            timer={"limit":self.time_limit, "deadline":self.deadline},
+        )
 
+    @recorded
     def askNextQ(self):
         if not self.lastQuestionMarked : return
         self.lastQuestionMarked = False
@@ -176,42 +295,63 @@ class Round4(Round):
             return
         self.askQ()
 
+    @recorded
     def mark_right(self):
         if self.lastQuestionMarked or self.roundEnded :return
         self.lastQuestionMarked=True
         # participantID = self.admin.participants.getClientIDs()[self.currentParticipant]
         participantID = self.first_id
         if not participantID: return
-        self.curr_scores.add(participantID, self.mark)
+        self.award(participantID, self.mark)
 
+    @recorded
     def mark_wrong(self):
         if self.lastQuestionMarked or self.roundEnded:return
         self.lastQuestionMarked=True
         # participantID = self.admin.participants.getClientIDs()[self.currentParticipant]
         participantID = self.first_id
         if not participantID: return
-        self.curr_scores.add(participantID, self.minusMark)
+        self.award(participantID, self.minusMark)
 
     def check_answer(self, qid, answer):
         rightAns = super().check_answer(qid, answer)
-        self.admin.show_right_answer(qid, rightAns, answer)
+        self.emit("show-answer", qid, rightAns, answer)
 
     def clear_users(self):
-        pf:PlayFrame = PlayFrame.me
-        pf.curr_round.clearusers()
-        pass
+        self.buzzed = dict()
+        self.emit("buzzer-cleared")
+
+    def rebind(self, oldID, newID):
+        super().rebind(oldID, newID)
+        if self.first_id == oldID: self.first_id = newID
+        if self.buzzed and oldID in self.buzzed:
+            self.buzzed = {(newID if id == oldID else id):position for id,position in self.buzzed.items()}
 
     def add_user(self,clientID):
         name = self.admin.participants.get(clientID).name
-        pf:PlayFrame = PlayFrame.me
-        pf.curr_round.adduser(name)
-        pass
+        self.buzzed[clientID] = len(self.buzzed)+1
+        self.emit("buzzer-pressed", clientID, name, self.buzzed[clientID])
 
-    def buzzer_pressed(self, clientID):
-        # add client to list
-        self.add_user(clientID)
-        if self.isBuzzerPressed: return
-        self.isBuzzerPressed=True
-        self.first_id = clientID
-        
-        print("ADDING ")
\ No newline at end of file
+    def buzzer_pressed(self, clientID, qid=None, at=None)->bool:
+        """registers the first press of `clientID` for the current question,
+        returns False for repeated presses and presses for another question (`qid`).
+        `at` is when a relay received the press, a relayed press made before the
+        first one takes its place even if it arrived later"""
+        if at is None: at = self.admin.clock()
+        with buzzerArbitration.time():
+            if self.buzzed is None or clientID in self.buzzed or self.roundEnded \
+                or (qid is not None and str(qid) != str(self.questions__[self.curr_question_i].qid)):
+                buzzerIgnored.inc()
+                return False
+            if self.isLate(at):
+                lateAnswers.inc()
+                return False
+            # add client to list
+            self.add_user(clientID)
+            if not self.isBuzzerPressed or at < self.firstAt:
+                if not self.isBuzzerPressed and self.askedAt: buzzerLatency.observe(at - self.askedAt)
+                self.isBuzzerPressed=True
+                self.first_id = clientID
+                self.firstAt = at
+        log.debug("buzzer pressed by %s", clientID)
+        return True
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Question Selection Engine
+Picks the questions of a round from the `QuestionBank` while remembering
+which questions were asked in previous events.
+
+Usage history is stored in `history.json` inside the question directory
+    { "tick": <int>, "questions": { "<round>:<qid>": [lastUsedTick, count] } }
+Questions which were never asked (or asked least recently) are picked first.
+"""
+import heapq
+import json
+import os
+import random
+from .log import getLogger
+
+log = getLogger("questions")
+
+class UsageHistory():
+    """Per-question usage store persisted as json"""
+    path:str=None
+    tick:int=0
+    entries:dict=dict() # key -> [lastUsedTick, count]
+
+    def __init__(self, path:str) -> None:
+        self.path = path
+        self.tick = 0
+        self.entries = dict()
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.tick = int(data.get("tick", 0))
+            self.entries = dict(data.get("questions", dict()))
+        except Exception as e:
+            log.error("error loading question history '%s' : %s", self.path, e)
+
+    def save(self):
+        if not self.path:
+            return
+        tmpPath = self.path + ".tmp"
+        with open(tmpPath, "w") as f:
+            json.dump({"tick":self.tick, "questions":self.entries}, f)
+        os.replace(tmpPath, self.path)
+
+    def get(self, key:str)->tuple:
+        "returns (lastUsedTick, count), (0, 0) for questions never asked"
+        entry = self.entries.get(key)
+        if not entry:
+            return (0, 0)
+        return (entry[0], entry[1])
+
+    def markUsed(self, key:str):
+        self.tick += 1
+        count = self.get(key)[1]
+        self.entries[key] = [self.tick, count+1]
+
+class QuestionSelector():
+    """
+    Selects questions from a pool with least-recently-used weighting.
+    Questions are bucketed by difficulty (one heap per level), building the
+    heaps is O(n) and selecting `k` questions is O(k log n)
+    """
+    pool:tuple=None
+    history:UsageHistory=None
+    prefix:str=None
+    buckets:dict=None # difficulty -> heap of (lastUsedTick, count, jitter, index)
+
+    def __init__(self, pool:tuple, history:UsageHistory, prefix:str) -> None:
+        self.pool = tuple(pool)
+        self.history = history
+        self.prefix = prefix
+        self.build()
+
+    def key(self, question)->str:
+        return f"{self.prefix}:{question.qid}"
+
+    def build(self):
+        self.buckets = dict()
+        for i,question in enumerate(self.pool):
+            lastUsed, count = self.history.get(self.key(question))
+            # jitter shuffles questions having the same usage
+            entry = (lastUsed, count, random.random(), i)
+            self.buckets.setdefault(question.difficulty, list()).append(entry)
+        for heap in self.buckets.values():
+            heapq.heapify(heap)
+
+    def count(self)->int:
+        return sum(len(heap) for heap in self.buckets.values())
+
+    def levels(self)->list:
+        "difficulty levels in ascending order, questions without level come last"
+        return sorted(self.buckets.keys(), key=lambda d : (d is None, d))
+
+    def pop(self, level):
+        """pop the least recently used question of `level`,
+        falls back to the fullest remaining level when `level` is exhausted"""
+        heap = self.buckets.get(level)
+        if not heap:
+            level = max(self.buckets, key=lambda d : len(self.buckets[d]))
+            heap = self.buckets[level]
+        return self.pool[heapq.heappop(heap)[3]]
+
+    def select(self, num_q:int, num_participants:int=1)->tuple:
+        """
+        Returns `num_q*num_participants` questions ordered the way rounds ask them,
+        question `i` goes to participant `i % num_participants`.
+        Every participant gets the same difficulty level at the same turn, a
+        level without a question for each of them is swapped for the nearest
+        level which has enough for the whole turn.
+        """
+        required_q = num_q*num_participants
+        if self.count() < required_q:
+            raise Exception(f"NUMBER OF QUESTIONs in DB is less than required : {self.count()} < {required_q}")
+
+        levels = self.levels()
+        questions = list()
+        for turn in range(num_q):
+            level = levels[turn % len(levels)]
+            if len(self.buckets[level]) < num_participants:
+                level = self.fallback(levels, level, num_participants, turn)
+            for _ in range(num_participants):
+                questions.append(self.pop(level))
+        return tuple(questions)
+
+    def fallback(self, levels:list, level, needed:int, turn:int):
+        "nearest level with `needed` questions left, mixed levels (logged) when none has"
+        enough = [d for d in levels if len(self.buckets[d]) >= needed]
+        if not enough:
+            log.warning("no difficulty level has %d questions left, turn %d mixes levels", needed, turn+1)
+            return level
+        nearest = min(enough, key=lambda d : abs(levels.index(d) - levels.index(level)))
+        log.warning("difficulty level %s ran out, turn %d uses level %s", level, turn+1, nearest)
+        return nearest
+
+    def markUsed(self, question):
+        self.history.markUsed(self.key(question))
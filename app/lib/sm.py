@@ -1,49 +1,147 @@
 import json
+from bisect import bisect_left, insort
+from .sockets import EventEmitter
 
 class SCORE():
     scores=dict()
 
-class Scores(SCORE):
-    """Score Mangaer Class"""
+class Scores(SCORE, EventEmitter):
+    """
+    Score Mangaer Class
+    Keeps the totals in `scores` and a ranking sorted by (-score, join order),
+    updates re-position a single entry with bisect instead of sorting again.
+
+    Events :-
+    score-changed -> (id, oldScore, newScore)
+    rank-changed -> (id, oldRank, newRank) for every entry whose rank moved
+    """
     scores:dict= dict() # client ID -> SCORE
+    ranked:list=list() # sorted [(-score, order, id)]
+    order:dict=dict() # client ID -> join order (tie-breaker)
 
     def __init__(self, IDs, minScore=0) -> None:
+        super().__init__()
         self.scores = dict()
+        self.ranked = list()
+        self.order = dict()
         for id in IDs:
-            self.scores[id] = 0
+            self.addUser(id)
         # self.minScore=minScore
 
     def get(self, id):
         return self.scores.get(id)
-    
+
     def set(self, id, val):
         # if val < self.minScore:
         #     val = self.minScore
+        old = self.scores[id]
+        if old == val:
+            return
+        oldRank = self.__remove(id)
         self.scores[id] = val
-    
+        newRank = self.__insert(id)
+        self.emit("score-changed", id, old, val)
+        self.__emitRanks(oldRank, newRank)
+
     def add(self, id, val):
-        self.scores[id] += val
+        self.set(id, self.scores[id] + val)
         # if self.scores[id] < self.minScore:
         #     self.scores[id] = self.minScore
-        # if 
+        # if
+
+    def addAll(self, deltas:dict):
+        """adds the deltas of many entries (client ID -> delta) at once,
+        ranks once instead of once per entry. Unknown IDs start at 0"""
+        oldRanks = {entry[2]:rank for rank, entry in enumerate(self.ranked)}
+        changed = list()
+        try:
+            for id, delta in deltas.items():
+                if id not in self.scores:
+                    self.order[id] = len(self.order)
+                    self.scores[id] = 0
+                if not delta: continue
+                changed.append((id, self.scores[id]))
+                self.scores[id] += delta
+        finally:
+            if len(self.ranked) != len(self.scores) or changed:
+                self.ranked = sorted(self.__entry(id) for id in self.scores)
+        for id, old in changed:
+            self.emit("score-changed", id, old, self.scores[id])
+        for rank, entry in enumerate(self.ranked):
+            if oldRanks.get(entry[2], len(oldRanks)) != rank:
+                self.emit("rank-changed", entry[2], oldRanks.get(entry[2], len(oldRanks)), rank)
 
     def addUser(self, id, score=0):
+        if id in self.scores:
+            self.set(id, score)
+            return
+        self.order[id] = len(self.order)
         self.scores[id] = score
+        rank = self.__insert(id)
+        self.__emitRanks(len(self.ranked)-1, rank)
+
+    def rename(self, oldID, newID):
+        "the entry of `oldID` now belongs to `newID`, with its score and rank"
+        if oldID not in self.scores: return
+        self.scores.pop(newID, None)
+        self.order.pop(newID, None)
+        self.scores[newID] = self.scores.pop(oldID)
+        self.order[newID] = self.order.pop(oldID)
+        self.ranked = sorted(self.__entry(id) for id in self.scores)
 
     def getUserIDs(self):
         return tuple(self.scores.keys())
-    
+
+    def rankOf(self, id)->int:
+        "0 based rank of `id`, O(log n)"
+        return bisect_left(self.ranked, self.__entry(id))
+
+    def top(self, k:int)->list:
+        "[(id, score)] of the best `k` entries, O(k)"
+        return [(entry[2], -entry[0]) for entry in self.ranked[:k]]
+
+    def ranking(self)->list:
+        "[(id, score)] of all entries, best first"
+        return self.top(len(self.ranked))
+
     def toString(self):
         return json.dumps(self.scores)
         pass
 
     def addScore(self, curr_score:SCORE):
         for clientID in curr_score.scores:
-            self.add(clientID, curr_score.get(clientID))
-        # for clientID 
+            delta = curr_score.get(clientID)
+            # untouched entries does not need to be re-ranked
+            if delta: self.add(clientID, delta)
+        # for clientID
         pass
-    
+
     def reset(self):
         for id in self.scores:
             self.scores[id] = 0
+        self.ranked = sorted(self.__entry(id) for id in self.scores)
     pass
+
+    def __entry(self, id):
+        return (-self.scores[id], self.order[id], id)
+
+    def __remove(self, id)->int:
+        rank = self.rankOf(id)
+        self.ranked.pop(rank)
+        return rank
+
+    def __insert(self, id)->int:
+        entry = self.__entry(id)
+        insort(self.ranked, entry)
+        return bisect_left(self.ranked, entry)
+
+    def __emitRanks(self, oldRank, newRank):
+        "the moved entry and every entry between both ranks shifted by one"
+        if oldRank == newRank:
+            return
+        step = 1 if newRank < oldRank else -1
+        low, high = min(oldRank, newRank), max(oldRank, newRank)
+        for rank in range(low, high+1):
+            id = self.ranked[rank][2]
+            prevRank = oldRank if rank == newRank else rank - step
+            self.emit("rank-changed", id, prevRank, rank)
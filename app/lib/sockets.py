@@ -1,12 +1,133 @@
-import logging
-
 from sys import exit
 from selectors import DefaultSelector, EVENT_READ, EVENT_WRITE
 from types import SimpleNamespace
-from threading import Thread
-from socket import socket, SOCK_STREAM, AF_INET
+from threading import Thread, Lock, current_thread
+from collections import deque
+import socket as _socket
+import time
+from socket import socket, socketpair, SOCK_STREAM, AF_INET, SOL_SOCKET, SO_REUSEADDR
+from struct import Struct # the stdlib module, not app/lib/struct.py
+from .metrics import registry
+from .log import getLogger
+from .capture import IN, OUT, CONNECT, DISCONNECT
+from .timerwheel import TimerWheel
+
+log = getLogger("sockets")
 
 magicKey = b"India"
+protocolVersion = 1 # bump when the payloads change incompatibly
+minProtocolVersion = 1 # oldest version the server still talks to
+
+# Handshake, the client sends a hello line and the server answers with the
+# version both will speak, min(client, server) :-
+#     client -> b"India/v<version>[/mux]\n"
+#     server -> b"India/v<agreed>\n"  or  b"India/reject/v<server version>\n" and closes
+# Clients before the negotiation send the bare `magicKey` (or `magicKey + muxSuffix`)
+# and get the bare `magicKey` back, they speak version 1. A bare `magicKey` may
+# also be a hello split by the network, it is legacy once nothing followed it
+# for `ServerSocket.legacyWait`.
+# Bytes after the hello line are kept as the first data of the connection.
+helloLimit = 64 # pre-auth bytes buffered before the connection is dropped
+
+def helloLine(version:int=protocolVersion, mux=False)->bytes:
+    return magicKey + b"/v%d" % version + (muxSuffix if mux else b"") + b"\n"
+
+def parseHello(buffer:bytes, final=False):
+    """(version, mux, rest) of the hello at the start of `buffer`, None while it
+    is incomplete. `final` when nothing more is coming, a bare `magicKey` is then
+    a legacy hello. Raises ValueError when `buffer` can not be a hello"""
+    if buffer == magicKey: return (1, False, b"") if final else None # legacy client, or a split hello
+    if buffer == magicKey + muxSuffix: return 1, True, b""
+    end = buffer.find(b"\n")
+    if end < 0:
+        if len(buffer) >= helloLimit:
+            raise ValueError("hello longer than %d bytes" % helloLimit)
+        if not (buffer.startswith(magicKey + b"/") or magicKey.startswith(buffer)):
+            raise ValueError("not a hello : %r" % buffer[:helloLimit])
+        return None
+    fields = buffer[:end].split(b"/")
+    if fields[0] != magicKey or len(fields) < 2 or fields[2:] not in ([], [muxSuffix[1:]]):
+        raise ValueError("not a hello : %r" % buffer[:end])
+    if not (fields[1][:1] == b"v" and fields[1][1:].isdigit()):
+        raise ValueError("bad version in hello : %r" % buffer[:end])
+    return int(fields[1][1:]), len(fields) == 3, buffer[end+1:]
+
+def keepAlive(sock:socket, idle:int=30, interval:int=10, count:int=3):
+    "let the kernel notice peers which vanished without closing (Wi-Fi drops)"
+    sock.setsockopt(_socket.SOL_SOCKET, _socket.SO_KEEPALIVE, 1)
+    for option, value in (("TCP_KEEPIDLE", idle), ("TCP_KEEPINTVL", interval), ("TCP_KEEPCNT", count)):
+        if hasattr(_socket, option): # linux only
+            sock.setsockopt(_socket.IPPROTO_TCP, getattr(_socket, option), value)
+
+# Multiplexed connections, several participants (channels) share one socket.
+# The client says `/mux` in its hello, after the handshake every byte in
+# both directions is framed :- kind (uint8) | channel (uint16) | length (uint32) | payload
+muxSuffix = b"/mux"
+MUX_OPEN, MUX_DATA, MUX_CLOSE = 1, 2, 3
+allChannels = 0xFFFF # server -> client, the frame is for every channel of the connection
+_muxHeader = Struct(">BHI")
+
+def muxFrame(kind:int, channel:int, payload:bytes=b"")->bytes:
+    return _muxHeader.pack(kind, channel, len(payload)) + payload
+
+def readFrames(buffer:bytes)->tuple:
+    "complete frames in `buffer` as (kind, channel, payload) and the incomplete rest"
+    frames = list()
+    i = 0
+    while len(buffer) - i >= _muxHeader.size:
+        kind, channel, length = _muxHeader.unpack_from(buffer, i)
+        end = i + _muxHeader.size + length
+        if end > len(buffer): break
+        frames.append((kind, channel, buffer[i+_muxHeader.size:end]))
+        i = end
+    return frames, buffer[i:]
+
+# states of a server side connection
+AWAIT_HELLO, REPLYING, ESTABLISHED, REJECTED, CLOSED = 1, 2, 3, 4, 5
+
+class Waker():
+    """socketpair registered in a selector, `wake()` from any thread makes a
+    blocked `select` return (new output to send, stop requested)"""
+
+    def __init__(self, sel) -> None:
+        self.sel = sel
+        self.r, self.w = socketpair()
+        self.r.setblocking(False)
+        self.w.setblocking(False)
+        sel.register(self.r, EVENT_READ, data=self)
+
+    def wake(self):
+        try:
+            self.w.send(b"\0")
+        except OSError: # buffer full, a wakeup is pending anyway / already closed
+            pass
+
+    def clear(self):
+        try:
+            while self.r.recv(4096): pass
+        except OSError:
+            pass
+
+    def close(self):
+        try:
+            self.sel.unregister(self.r)
+        except (KeyError, ValueError):
+            pass
+        self.r.close()
+        self.w.close()
+
+# looked up once, the event loop only increments them
+bytesIn = registry.counter("socket.bytes_in")
+bytesOut = registry.counter("socket.bytes_out")
+reads = registry.counter("socket.reads")
+wakeups = registry.counter("socket.select_wakeups")
+loopErrors = registry.counter("socket.errors")
+clientErrors = registry.counter("socket.client_errors")
+loopRestarts = registry.counter("socket.loop_restarts")
+connections = registry.gauge("socket.connections")
+pendingHandshakes = registry.gauge("socket.pending_handshakes")
+handshakeFailures = registry.counter("socket.handshake_failures")
+handshakeTimeouts = registry.counter("socket.handshake_timeouts")
 
 class EventEmitter:
     __events = dict()
@@ -14,7 +135,8 @@ class EventEmitter:
     stop=False
     
     def __init__(self):
-        pass
+        # per instance, the class level dict would be shared by every emitter
+        self.__events = dict()
 
     def attach(self, listener):
         "Attach a global listener which will be called at every event"
@@ -60,12 +182,27 @@ class ServerSocket(EventEmitter):
     killThread = True
     eventThread = None
     ssock=None
+    waker=None
+    capture=None # CaptureWriter, records the traffic when set
+    firstChannelID = 1000000 # clientIDs of the channels, above ports and relayed ids
+    maxChannels = 16 # open channels of one multiplexed connection, more MUX_OPENs are refused
+    handshakeTimeout = 5.0 # seconds from accept to the end of the handshake
+    legacyWait = 0.25 # seconds a bare `magicKey` waits for the rest of a hello
+    drainTimeout = 1.0 # seconds `stop` keeps flushing pending output
+    maxErrors = 20 # exceptions raised for one client before it is disconnected
+    maxBackoff = 1.0 # seconds between restarts of a crashing event loop
     
     def __init__(self, addr:tuple) -> None:
         "pass the ip address and port number as argument in a tuple"
         super().__init__()
         self.sel = DefaultSelector()
+        self.clients = dict()
+        self.wheel = TimerWheel() # handshake deadlines
         self.addr = addr
+        self.nextChannelID = self.firstChannelID
+        self.lock = Lock() # `outb` of the connections, appended from any thread
+        self.writers = deque() # (conn, data) with new output, the loop turns on EVENT_WRITE
+        self.errors = dict() # clientID -> exceptions raised while handling it
         pass
 
     def start(self):
@@ -73,15 +210,26 @@ class ServerSocket(EventEmitter):
         if self.eventThread:
             return
         self.ssock = socket(AF_INET, SOCK_STREAM)
+        self.ssock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1) # restart at once, not after TIME_WAIT
         self.ssock.bind(self.addr)
         self.ssock.listen()
-        print("server listening at", self.addr)
+        log.info("server listening at %s", self.addr)
         self.sel.register(self.ssock, EVENT_READ, data=None)
+        self.waker = Waker(self.sel)
 
         self.eventThread = Thread(target=self._server_event_loop, daemon=True)
         self.eventThread.start()
         pass
 
+    def __queue(self, conn, data, message:bytes):
+        "appends to the output of a connection, the event loop sends it"
+        with self.lock:
+            data.outb += message
+            if data.writing: return
+            data.writing = True
+        self.writers.append((conn, data))
+        if self.waker and current_thread() is not self.eventThread: self.waker.wake()
+
     def sendTo(self, message:bytes|str,clientID=None):
         if type(message) is str:
             message = bytes(message, encoding="utf-8")
@@ -91,138 +239,329 @@ class ServerSocket(EventEmitter):
 
         client_key = self.clients[clientID]
         data = client_key.data
-        data.outb += message
+        if self.capture: self.capture.write(OUT, clientID, message)
+        if data.mux is not None:
+            message = muxFrame(MUX_DATA, client_key.channel, message)
+        self.__queue(client_key.fileobj, data, message)
 
     def sendAllTo(self, message:bytes, clientID):
+        # the sockets are non blocking, a `sendall` from this thread could fail
+        # half way, it is queued like `sendTo`
+        self.sendTo(message, clientID)
+
+    def broadcast(self, message:bytes):
         if type(message) is str:
             message = bytes(message, encoding="utf-8")
+        sent = set() # multiplexed connections get the message once for all channels
+        for clientID, client in list(self.clients.items()):
+            if client.data.mux is None:
+                self.sendTo(message, clientID)
+                continue
+            if self.capture: self.capture.write(OUT, clientID, message)
+            if client.fileobj in sent: continue
+            sent.add(client.fileobj)
+            self.__queue(client.fileobj, client.data, muxFrame(MUX_DATA, allChannels, message))
+
+    def stop(self, timeout:float=None):
+        """stops the event loop, pending output is flushed for up to
+        `drainTimeout` seconds, then every connection is closed (a
+        `disconnected` event per client). Waits for the loop at most `timeout`"""
+        thread = self.eventThread
+        self.killThread = True
+        if thread is None: return
+        if self.waker: self.waker.wake()
+        if thread is not current_thread():
+            thread.join(self.drainTimeout + 1 if timeout is None else timeout)
+            if thread.is_alive(): log.warning("server event loop did not stop in time")
+
+    def handshake(self, key, final=False): # hello recieved -> reply queued
+        data = key.data
+        try:
+            hello = parseHello(data.inb, final)
+        except ValueError as e:
+            return self.__fail(key, str(e))
+        if hello is None: # wait for the rest of the line
+            if data.inb == magicKey: self.wheel.add(time.monotonic() + self.legacyWait, key)
+            return
+        version, mux, data.inb = hello
+        data.mux = dict() if mux else None # channel -> clientID
+        legacy = b"\n" not in data.hello
+        if version < minProtocolVersion:
+            data.state = REJECTED
+            self.__queue(key.fileobj, data, magicKey + b"/reject/v%d\n" % protocolVersion)
+            handshakeFailures.inc()
+            self.emit("handshake-failed", (data.clientID, f"version {version} < {minProtocolVersion}"))
+            log.warning("rejected protocol version %d of %s", version, data.addr, extra={"clientID": data.clientID})
+            return
+        data.protocol = min(version, protocolVersion)
+        data.state = REPLYING
+        self.__queue(key.fileobj, data, magicKey if legacy else helloLine(data.protocol))
 
-        if clientID not in self.clients:
-            raise Exception(f"Client ID '{clientID}' not found")
-
-        client_key = self.clients[clientID]
-        csoc = client_key.fileobj
-        # data.outb += message
-        csoc.sendall(message)
-
-    def broadcast(self, message:bytes):
-        for clientID in self.clients:
-            self.sendAllTo(message, clientID)
-
-    def stop(self):
-        while self.eventThread:
-            self.killThread = True
-
-    def handshake(self, data): # recieve handshake -> send handshake
-        stage = data.handshakeStage
-        if stage == 1:
-            if data.inb == magicKey:
-                data.inb = b""
-            else:
-                self.emit("handshake-failed", (stage, data.addr[1]))
-                print("error : magicKey does not matches, recv:",data.inb)
-        elif stage == 2:
-            data.outb = magicKey
-        pass
+    def __fail(self, key, reason):
+        handshakeFailures.inc()
+        log.warning("handshake failed with %s : %s", key.data.addr, reason, extra={"clientID": key.data.clientID})
+        self.emit("handshake-failed", (key.data.clientID, reason))
+        self._disconnect(key)
 
     def __add_connection(self, key):
         soc = key.fileobj
         conn, addr = soc.accept()
+        conn.setblocking(False)
+        keepAlive(conn)
         clientID = addr[1]
-        data = SimpleNamespace(addr=addr, outb=b"", inb=b"", clientID=clientID, handshakeStage=0)
-        # HANDSHAKE STAGES # 1 -> Recieved | 2 -> Sent | 3 -> DONE
-        self.sel.register(conn, EVENT_READ | EVENT_WRITE, data=data)
-        self.clients[clientID] = SimpleNamespace(fileobj=conn, data=data)
-        self.emit("new-connection", clientID)
+        data = SimpleNamespace(addr=addr, outb=b"", inb=b"", hello=b"", clientID=clientID, writing=False,
+            state=AWAIT_HELLO, protocol=None, mux=None, deadline=time.monotonic()+self.handshakeTimeout)
+        connKey = self.sel.register(conn, EVENT_READ, data=data) # EVENT_WRITE only while there is output
+        self.wheel.add(data.deadline, connKey)
+        connections.inc()
+        pendingHandshakes.inc()
+
+    def __expire(self, key):
+        "deadline of a handshake, the connection may be established or gone by now"
+        if time.monotonic() < key.data.deadline: # end of a `legacyWait`
+            if key.data.state == AWAIT_HELLO and key.data.inb == magicKey: self.handshake(key, final=True)
+            return
+        if key.data.state in (AWAIT_HELLO, REPLYING):
+            handshakeTimeouts.inc()
+            self.__fail(key, "no handshake in %s s" % self.handshakeTimeout)
+
+    def __add_client(self, clientID, conn, data, channel=None):
+        "a participant, the connection after the handshake or a channel of it"
+        self.clients[clientID] = SimpleNamespace(fileobj=conn, data=data, channel=channel)
+        if self.capture: self.capture.write(CONNECT, clientID)
+        self.__emit_for(clientID, "new-connection", clientID)
+
+    def __remove_client(self, clientID):
+        if self.clients.pop(clientID, None) is None: return
+        self.errors.pop(clientID, None) # ports are reused, a new client starts clean
+        if self.capture: self.capture.write(DISCONNECT, clientID)
+        self.__emit_for(clientID, "disconnected", clientID)
+
+    def __emit_for(self, clientID, name, *args):
+        "emits an event of one client, an exception of a listener is counted against that client only"
+        try:
+            self.emit(name, *args)
+        except Exception as e:
+            self.__fault(clientID, e)
+
+    def __fault(self, clientID, e):
+        count = self.errors[clientID] = self.errors.get(clientID, 0) + 1
+        clientErrors.inc()
+        log.exception("error %d handling client %s : %s", count, clientID, e, extra={"clientID": clientID})
+        if count < self.maxErrors: return
+        log.warning("too many errors, disconnecting", extra={"clientID": clientID})
+        client = self.clients.get(clientID)
+        if client is None: return
+        if client.channel is not None: # only the channel, not the other participants of the connection
+            client.data.mux.pop(client.channel, None)
+            self.__remove_client(clientID)
+        else:
+            self._disconnect(SimpleNamespace(fileobj=client.fileobj, data=client.data))
+
+    def __isolate(self, key, handler, *args):
+        "runs `handler` for one connection, its errors never reach another connection"
+        try:
+            handler(*args)
+        except OSError as e: # the connection is broken
+            log.info("connection lost : %s", e, extra={"clientID": key.data.clientID})
+            self._disconnect(key)
+        except Exception as e:
+            if key.data.state == ESTABLISHED and key.data.mux is None:
+                return self.__fault(key.data.clientID, e)
+            loopErrors.inc() # a bug in the handshake or a multiplexed connection, not one participant
+            log.exception("error handling %s : %s", key.data.addr, e, extra={"clientID": key.data.clientID})
+            self._disconnect(key)
+
+    def __demux(self, conn, data):
+        frames, data.inb = readFrames(data.inb)
+        for kind, channel, payload in frames:
+            if kind == MUX_OPEN and channel not in data.mux and len(data.mux) >= self.maxChannels:
+                log.warning("%s opened more than %d channels, channel %d refused", data.addr, self.maxChannels, channel)
+                self.__queue(conn, data, muxFrame(MUX_CLOSE, channel))
+            elif kind == MUX_OPEN and channel not in data.mux:
+                clientID = data.mux[channel] = self.nextChannelID
+                self.nextChannelID += 1
+                self.__add_client(clientID, conn, data, channel)
+            elif kind == MUX_DATA and channel in data.mux:
+                clientID = data.mux[channel]
+                if self.capture: self.capture.write(IN, clientID, payload)
+                self.__emit_for(clientID, "data", {"clientID": clientID, "data": payload})
+            elif kind == MUX_CLOSE and channel in data.mux:
+                self.__remove_client(data.mux.pop(channel))
+
+    def __deliver(self, soc, data):
+        "emits the `data` event and flushes the `inb` (input buffer)"
+        if not data.inb: return
+        reads.inc()
+        if data.mux is not None:
+            self.__demux(soc, data)
+        else:
+            inb, data.inb = data.inb, b"" # flushed first, a failing listener must not get it twice
+            self.__emit_for(data.clientID, "data", {"clientID": data.clientID, "data": inb})
+
+    def __flush(self, soc, data)->bool:
+        "sends what the socket takes, True once `outb` is empty"
+        with self.lock:
+            outb = data.outb
+        sent = soc.send(outb) if outb else 0
+        bytesOut.inc(sent)
+        with self.lock:
+            data.outb = data.outb[sent:]
+            if data.outb: return False
+            data.writing = False
+        return True
 
     def __handle_RW_events(self, key, mask):
         soc = key.fileobj
         data = key.data
         if mask & EVENT_READ:
-            recv = soc.recv(1024)
-            if recv:
+            if data.state == AWAIT_HELLO:
+                # never buffer more than a hello before the peer proved itself
+                recv = soc.recv(helloLimit - len(data.inb) + 1)
+                if not recv: return self._disconnect(key)
+                bytesIn.inc(len(recv))
+                data.inb += recv
+                data.hello += recv
+                self.handshake(key)
+            else:
+                recv = soc.recv(1024)
+                if not recv: return self._disconnect(key) # closed by the peer
+                bytesIn.inc(len(recv))
                 data.inb += recv
-                
-                if data.handshakeStage == 0 :
-                    data.handshakeStage = 1
-                    self.handshake(data)
-                    return
+                if self.capture and data.mux is None and data.state == ESTABLISHED: self.capture.write(IN, data.clientID, recv)
                 self.emit("data-packet", {"clientID": data.clientID, "data": recv})
-                # print(f"recv {data.addr}: "+recv.decode("utf-8"))
-                # print(f"clients : {len(self.clients)}")
-        if mask & EVENT_WRITE:
-            if data.handshakeStage == 1:
-                data.handshakeStage = 2
-                self.handshake(data)
-            
-            # emit the `data` event and flushes the `inb` (input buffer)
-            
-            if data.inb:
-                self.emit("data", {"clientID": data.clientID, "data": data.inb})
-                data.inb = b""
-
-            sent = 0
-            if data.outb:
-                sent = soc.send(data.outb)
-            data.outb = data.outb[sent:]
-
-            # verify handshake = no error after sending data (like client doesn't disconnected)
-            if data.handshakeStage == 2:
-                data.handshakeStage = 3 # handshake done
-                print("HANDSHAKE DONE With", data.addr)
+                if data.state == ESTABLISHED: self.__deliver(soc, data)
+        if mask & EVENT_WRITE and data.state != CLOSED:
+            if not self.__flush(soc, data): return
+            self.sel.modify(soc, EVENT_READ, data=data)
+
+            if data.state == REJECTED:
+                self._disconnect(key)
+            elif data.state == REPLYING: # reply sent, handshake done
+                data.state = ESTABLISHED
+                data.hello = None
+                pendingHandshakes.dec()
+                log.info("handshake done with %s, protocol v%d%s", data.addr, data.protocol, " (multiplexed)" if data.mux is not None else "", extra={"clientID": data.clientID})
+                if data.mux is None:
+                    self.__add_client(data.clientID, soc, data)
+                    if self.capture and data.inb: self.capture.write(IN, data.clientID, data.inb)
                 self.emit("handshake-done")
-        
+                self.__deliver(soc, data) # sent right after the hello
+
+    def __watch_writers(self):
+        "EVENT_WRITE for the connections which got output since the last select"
+        while self.writers:
+            conn, data = self.writers.popleft()
+            if data.state != CLOSED and data.writing:
+                try:
+                    self.sel.modify(conn, EVENT_READ | EVENT_WRITE, data=data)
+                except (OSError, ValueError) as e: # closed behind the loop's back
+                    log.info("connection lost : %s", e, extra={"clientID": data.clientID})
+                    self._disconnect(SimpleNamespace(fileobj=conn, data=data))
+
     def _server_event_loop(self):
-        print("server event_loop started")
+        """supervisor of the event loop, restarts it after a crash (with a
+        backoff), the selector and the registered connections are kept"""
+        log.debug("server event loop started")
+        crashes = 0
         while not self.killThread:
-            lastConnKey = None
-            
             try:
-                events = self.sel.select(timeout=None)
-                for key,mask in events:
-                    lastConnKey = key
-                    if key.data is None:
-                        # add new client
-                        self.__add_connection(key)
-                        pass
-                    else :
-                        # read / write clients
-                        self.__handle_RW_events(key=key, mask=mask)
-
+                self.__loop()
             except KeyboardInterrupt:
-                print("Exiting by Keyboard Interrupt")
+                log.info("exiting by keyboard interrupt")
 
                 exit(1)
             except Exception as e:
-                print("Exiting (EventLoop) : ", e)
-                logging.exception(f"An exception occurred: {e}")
-                self._disconnect(lastConnKey)
-            finally:
-                pass
-
+                crashes += 1
+                loopErrors.inc()
+                loopRestarts.inc()
+                log.exception("server event loop crashed (%d), restarting : %s", crashes, e)
+                self.__purge()
+                time.sleep(min(self.maxBackoff, 0.01 * 2**crashes))
+
+        self.__shutdown()
         self.eventThread = None
         pass
 
+    def __loop(self):
+        while not self.killThread:
+            self.__watch_writers()
+            events = self.sel.select(timeout=self.wheel.timeout())
+            wakeups.inc()
+            for key,mask in events:
+                if key.data is None:
+                    # add new client
+                    try:
+                        self.__add_connection(key)
+                    except OSError as e: # out of file descriptors, reset before accept ...
+                        loopErrors.inc()
+                        log.warning("accept failed : %s", e)
+                elif key.data is self.waker:
+                    self.waker.clear()
+                else :
+                    # read / write clients
+                    self.__isolate(key, self.__handle_RW_events, key, mask)
+            for key in self.wheel.advance():
+                self.__isolate(key, self.__expire, key)
+
+    def __purge(self):
+        "drops the registrations of sockets closed behind the loop's back, they break `select`"
+        for key in list(self.sel.get_map().values()):
+            if isinstance(key.data, SimpleNamespace) and key.fileobj.fileno() < 0:
+                self._disconnect(key)
+
+    def __shutdown(self):
+        "flushes the pending output until `drainTimeout`, then closes everything"
+        deadline = time.monotonic() + self.drainTimeout
+        keys = [key for key in list(self.sel.get_map().values()) if isinstance(key.data, SimpleNamespace)]
+        drain = DefaultSelector()
+        for key in keys:
+            if key.data.outb and key.data.state != CLOSED:
+                drain.register(key.fileobj, EVENT_WRITE, data=key.data)
+        while drain.get_map() and time.monotonic() < deadline:
+            for key, _ in drain.select(timeout=deadline - time.monotonic()):
+                try:
+                    done = self.__flush(key.fileobj, key.data)
+                except OSError:
+                    done = True # the peer is gone, nothing to wait for
+                if done: drain.unregister(key.fileobj)
+        left = sum(len(key.data.outb) for key in drain.get_map().values())
+        drain.close()
+        if left: log.warning("closing with %d bytes unsent", left)
+
+        for key in keys:
+            self._disconnect(key)
+        self.sel.unregister(self.ssock)
+        self.ssock.close()
+        self.waker.close()
+        self.waker = None
+        self.writers.clear()
+        log.info("server at %s stopped", self.addr)
+
     def _disconnect(self, key):
         sock = None
         clientID = None
         
         if key.data is None:
-            print("No `data` attr found in `key`")
+            log.warning("no `data` attr found in `key`")
             return
+        if key.data.state == CLOSED: return
+        sock = key.fileobj
+        clientID = key.data.addr[1]
         try:
-            sock = key.fileobj
-            clientID = key.data.addr[1]
-
             self.sel.unregister(sock)
+        except (KeyError, ValueError):
+            pass # a failed `modify` already dropped it
+        try:
             sock.close()
-
-            if clientID in self.clients:
-                self.clients.pop(clientID)
-        except Exception as e:
-            print("ERORR DURING _disconnect\n",e, repr(key))
-        else:
-            self.emit("disconnected", clientID)
+        except OSError as e:
+            log.error("error during _disconnect : %s %r", e, key)
+        connections.dec()
+        if key.data.state != ESTABLISHED: pendingHandshakes.dec()
+        key.data.state = CLOSED
+        channels = key.data.mux.values() if key.data.mux is not None else (clientID,)
+        for clientID in list(channels):
+            self.__remove_client(clientID)
 
 class ClientSocket(EventEmitter):
     sel = None
@@ -232,57 +571,100 @@ class ClientSocket(EventEmitter):
     csoc = None
     handshakeStage = 0 #  1 -> send | 2 -> recived | 3 -> DONE
     stopThread=False
+    handshakeKey = helloLine() # sent to the server
+    handshakeTimeout = 5.0
+    drainTimeout = 1.0 # seconds `disconnect` keeps flushing pending output
+    maxErrors = 20 # crashes of the event loop before the connection is given up
+    errorWindow = 60.0 # seconds without a crash which forgive the earlier ones
+    maxBackoff = 1.0
+    protocol = None # version agreed with the server
+    waker = None
+    errors = 0
+    lastError = float("-inf")
 
     def __init__(self, addr) -> None:
         super().__init__()
         self.sel = DefaultSelector()
         self.addr = addr
+        self.reply = b""
+        self.deadline = None
+        self.lock = Lock() # `outb`, appended from any thread
 
     def handshake(self, recv=None): # to verify the connection with server
         if self.handshakeStage ==3:
-            print("Handshake already DONE")
+            log.debug("handshake already done")
             return
         # socket is ready to write
         
         try:
             if self.handshakeStage == 1:
-                self.csoc.send(magicKey)
+                self.csoc.send(self.handshakeKey)
                 return
             
             if self.handshakeStage == 2:
-                if recv == magicKey:
-                    self.handshakeStage = 3
-                    print("Handshake Done with", self.addr)
-                    self.emit("handshake-done")
-                else:
-                    e=Exception(f"MAGIC KEY DOES NOT MATCHES, {recv} != {magicKey}")
-                    logging.exception(f"An exception occurred: {e}")
-                    self.emit("handshake-error", e)
+                self.reply += recv
+                end = self.reply.find(b"\n")
+                if end < 0:
+                    if len(self.reply) < helloLimit and (magicKey + b"/").startswith(self.reply[:len(magicKey)+1]): return
+                    raise Exception(f"MAGIC KEY DOES NOT MATCHES, {self.reply!r}")
+                fields = self.reply[:end].split(b"/")
+                if fields[0] != magicKey or not fields[-1][1:].isdigit():
+                    raise Exception(f"MAGIC KEY DOES NOT MATCHES, {self.reply[:end]!r}")
+                if fields[1] == b"reject":
+                    raise Exception(f"protocol v{protocolVersion} rejected by the server, it speaks {fields[-1].decode()}")
+                self.protocol = int(fields[-1][1:])
+                self.data.inb += self.reply[end+1:] # sent right after the reply
+                self.reply = b""
+                self.handshakeStage = 3
+                log.info("handshake done with %s, protocol v%d", self.addr, self.protocol)
 
         except Exception as e:
-            print("HANDSHAKE FAILED")
-            logging.exception(f"An exception occurred: {e}")
-            self.emit("handshake-error", e)
+            self.fail(e)
         else:
-            # self.handshakeDone = True
-            pass
+            # outside the try, an error of a listener is not a failed handshake
+            if self.handshakeStage == 3: self.emit("handshake-done")
         finally:
             pass
 
+    def fail(self, e):
+        "the handshake did not complete, the connection is closed"
+        log.error("handshake failed : %s", e)
+        self.disconnect()
+        self.emit("handshake-error", e)
+
     def connect(self):
         csoc = socket(AF_INET, SOCK_STREAM)
         csoc.setblocking(False)
         csoc.connect_ex(self.addr)
         events = EVENT_WRITE | EVENT_READ
 
+        self.sel = DefaultSelector()
         self.data = SimpleNamespace(inb = b"", outb=b"")
         self.sel.register(csoc, events, data=self.data)
+        self.interest = events
+        self.waker = Waker(self.sel)
         self.csoc = csoc
+        self.handshakeStage = 0
+        self.stopThread = False
+        self.reply = b""
+        self.deadline = time.monotonic() + self.handshakeTimeout
 
         self.eventThread = Thread(target=self._client_event_loop, daemon=True)
         self.eventThread.start()
 
-    def disconnect(self):
+    def disconnect(self, timeout:float=None):
+        """closes the connection, pending `send`s are flushed for up to
+        `drainTimeout` seconds first. Waits for the event loop at most `timeout`"""
+        self.stopThread=True
+        thread = self.eventThread
+        if thread and thread.is_alive() and thread is not current_thread():
+            self.waker.wake()
+            thread.join(self.drainTimeout + 1 if timeout is None else timeout)
+        if thread is None or not thread.is_alive() or thread is current_thread():
+            self._close()
+
+    def _close(self):
+        if self.csoc is None: return
         try:
             self.sel.unregister(self.csoc)
         except:
@@ -292,60 +674,204 @@ class ClientSocket(EventEmitter):
         except:
             pass
         self.csoc = None
-        self.stopThread=True
-        # self.eventThread.join()
+        self.waker.close()
 
     def send(self, message:bytes):
-        self.data.outb += message
+        with self.lock:
+            self.data.outb += message
+        if self.waker and current_thread() is not self.eventThread: self.waker.wake()
+
+    def __flush(self, sock, data):
+        with self.lock:
+            outb = data.outb
+        sent = sock.send(outb) if outb else 0
+        with self.lock:
+            data.outb = data.outb[sent:]
+
+    def __drain(self):
+        "blocking sends of the pending output until `drainTimeout`"
+        deadline = time.monotonic() + self.drainTimeout
+        try:
+            while self.data.outb and self.handshakeStage == 3:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: break
+                self.csoc.settimeout(remaining)
+                self.__flush(self.csoc, self.data)
+        except OSError as e:
+            log.debug("output not flushed : %s", e)
 
     def __handle_RW_events(self, key, mask):
         sock = key.fileobj
         data = key.data
         if mask & EVENT_READ: # ready to read
             recv_data = sock.recv(1024)
-            if recv_data:
+            if not recv_data:
+                raise ConnectionResetError("connection closed by the server")
 
-                if self.handshakeStage == 1: # reveice magickey from server
-                    self.handshakeStage = 2
-                    self.handshake(recv_data)
-                    return
-                
+            if self.handshakeStage in (1, 2): # reveice magickey from server
+                self.handshakeStage = 2
+                self.handshake(recv_data)
+            else:
                 data.inb += recv_data
                 self.emit("data-packet", recv_data)
-        if mask & EVENT_WRITE: # ready to write
+            if data.inb and self.handshakeStage == 3:
+                inb, data.inb = data.inb, b"" # flush input buffer, before a listener can fail
+                self.emit("data", inb)
+        if mask & EVENT_WRITE and self.csoc is not None: # ready to write
             if self.handshakeStage == 0: # sends handleshake magickey to server
                 self.handshakeStage = 1
                 self.handshake()
-            if data.inb:
-                self.emit("data", data.inb)
-                data.inb = b"" # flush input buffer
-            if data.outb:
-                sent = sock.send(data.outb) 
-                data.outb = data.outb[sent:]
+                if self.csoc is None: return
+            if data.outb and self.handshakeStage == 3:
+                self.__flush(sock, data)
         pass
 
     def _client_event_loop(self):
-        print("Client EVENT LOOP STARTED")
+        """supervisor of the event loop, a lost connection ends it, any other
+        exception (a failing listener) restarts it on the same connection"""
+        log.debug("client event loop started")
+        while True:
+            try:
+                self.__loop()
+                break
+            except KeyboardInterrupt:
+                log.info("exiting (client) by keyboard interrupt")
+                exit(2)
+            except Exception as e:
+                now = time.monotonic()
+                if now - self.lastError > self.errorWindow: self.errors = 0
+                self.errors += 1
+                self.lastError = now
+                if isinstance(e, OSError) or self.errors >= self.maxErrors:
+                    log.info("client event loop exiting : %s", e)
+                    log.debug("client event loop exception", exc_info=True)
+                    self._close()
+                    self.emit("error", e)
+                    self.emit("disconnected")
+                    break
+                loopRestarts.inc()
+                log.exception("client event loop crashed (%d), restarting : %s", self.errors, e)
+                time.sleep(min(self.maxBackoff, 0.01 * 2**self.errors))
+        log.debug("client event loop ended")
+
+    def __loop(self):
+        while True:
+            if self.stopThread:
+                self.stopThread=False
+                if self.csoc is not None: self.__drain()
+                self._close()
+                return
+            timeout = None
+            if self.handshakeStage != 3:
+                timeout = self.deadline - time.monotonic()
+                if timeout <= 0:
+                    self.fail(TimeoutError(f"no handshake in {self.handshakeTimeout} s"))
+                    continue
+            # EVENT_WRITE only while connecting or with output, `send` wakes the select
+            interest = EVENT_READ
+            if self.handshakeStage == 0 or (self.data.outb and self.handshakeStage == 3): interest |= EVENT_WRITE
+            if interest != self.interest:
+                self.sel.modify(self.csoc, interest, data=self.data)
+                self.interest = interest
+            events = self.sel.select(timeout=timeout)
+            for key, mask in events:
+                if key.data is self.waker:
+                    self.waker.clear()
+                    continue
+                self.__handle_RW_events(key, mask)
+
+class MuxClientSocket(ClientSocket):
+    """
+    One connection for several participants of the same machine, `open()`
+    gives a `Channel` used like a `ClientSocket`. The selector registration,
+    buffers and handshake are paid once for all of them.
+    """
+    handshakeKey = helloLine(mux=True)
+
+    def __init__(self, addr) -> None:
+        super().__init__(addr)
+        self.channels = dict() # channel number -> Channel
+        self.nextChannel = 1
+        self.free = deque() # numbers of closed channels, oldest first, the header has 16 bits
+        self.pending = b""
+        self.ready = False
+        self.on("handshake-done", self.onReady)
+        self.on("data", self.onFrames)
+        self.on("disconnected", lambda args : self.each("disconnected"))
+        self.on("handshake-error", lambda args : self.each("handshake-error", *args))
+
+    def each(self, event, *args):
+        for channel in list(self.channels.values()):
+            self.deliver(channel, event, *args)
+
+    def deliver(self, channel, event, *args):
+        "emits on one channel, a failing listener does not stop the others"
         try:
-            while True:
-                if self.stopThread:
-                    self.stopThread=False
-                    return
-                events = self.sel.select(timeout=None)
-                for key, mask in events:
-                    self.__handle_RW_events(key, mask)
-        except KeyboardInterrupt:
-            print("exiting (client) by keyboard interrupt")
-            exit(2)
+            channel.emit(event, *args)
         except Exception as e:
-            print("Exiting (client): " , e)
-            logging.exception(f"An exception occurred: {e}")
-            self.emit("error", e)
-            self.sel.close()
-            self.emit("disconnected")
-        finally:
-            pass
-        print("Event Loop ended")
+            channel.errors += 1
+            clientErrors.inc()
+            log.exception("error %d in channel %d : %s", channel.errors, channel.number, e)
+
+    def open(self):
+        if self.free:
+            number = self.free.popleft()
+        elif self.nextChannel < allChannels:
+            number = self.nextChannel
+            self.nextChannel += 1
+        else:
+            raise ValueError("no free channel on this connection")
+        return Channel(self, number)
+
+    def openChannel(self, channel):
+        self.channels[channel.number] = channel
+        if self.ready:
+            self.send(muxFrame(MUX_OPEN, channel.number))
+            self.deliver(channel, "handshake-done")
+        elif self.csoc is None:
+            self.connect()
+
+    def closeChannel(self, channel):
+        if self.channels.pop(channel.number, None) is None: return
+        self.free.append(channel.number)
+        if self.ready: self.send(muxFrame(MUX_CLOSE, channel.number))
+
+    def onReady(self, args):
+        self.ready = True
+        for channel in list(self.channels.values()):
+            self.send(muxFrame(MUX_OPEN, channel.number))
+            self.deliver(channel, "handshake-done")
+
+    def onFrames(self, args):
+        frames, self.pending = readFrames(self.pending + args[0])
+        for kind, number, payload in frames:
+            if kind == MUX_CLOSE and number in self.channels: # refused by the server
+                channel = self.channels.pop(number)
+                self.free.append(number)
+                self.deliver(channel, "disconnected")
+            if kind != MUX_DATA: continue
+            if number == allChannels:
+                self.each("data", payload)
+            elif number in self.channels:
+                self.deliver(self.channels[number], "data", payload)
+
+class Channel(EventEmitter):
+    """a participant on a `MuxClientSocket`, same events and methods as `ClientSocket`"""
+
+    def __init__(self, mux:MuxClientSocket, number:int) -> None:
+        super().__init__()
+        self.mux = mux
+        self.number = number
+        self.errors = 0
+
+    def connect(self):
+        self.mux.openChannel(self)
+
+    def send(self, message:bytes):
+        self.mux.send(muxFrame(MUX_DATA, self.number, message))
+
+    def disconnect(self):
+        self.mux.closeChannel(self)
 
 if __name__ == "__main__":
     ee = EventEmitter()
@@ -0,0 +1,190 @@
+"""
+Spectator / Projector channel
+A read-only server, separate from the participants `ServerSocket`, which
+streams the live state (round, current question, timer and scoreboard) to any
+number of display clients.
+
+Frames are newline delimited json. Every update is encoded once and shared by
+all spectators, a spectator which is still sending an older frame skips the
+frames in between and only gets the latest state.
+The timer is published as {"limit", "deadline"} in the admin clock and sent as
+{"limit", "remaining"}, the clocks of the displays do not matter.
+"""
+import json
+import time
+from selectors import DefaultSelector, EVENT_READ, EVENT_WRITE
+from socket import socket, socketpair, SOCK_STREAM, AF_INET, SHUT_RDWR
+from threading import Thread, Lock
+from types import SimpleNamespace
+from .sockets import EventEmitter
+from .log import getLogger
+
+log = getLogger("spectator")
+
+def encodeFrame(state:dict, now:float=None)->bytes:
+    "`now` admin clock time, turns the timer deadline into the seconds remaining"
+    timer = state.get("timer")
+    if timer and "deadline" in timer:
+        state = dict(state, timer={"limit":timer.get("limit"), "remaining":max(0.0, timer["deadline"] - now)})
+    return bytes(json.dumps(state), encoding="utf-8") + b"\n"
+
+class SpectatorServer(EventEmitter):
+    sel=None
+    ssock=None
+    eventThread=None
+    killThread=True
+    frame:bytes=None # latest encoded state
+    clock = time.monotonic # `ADMIN.clock`, of the timer deadline
+
+    def __init__(self, addr:tuple) -> None:
+        super().__init__()
+        self.addr = addr
+        self.sel = DefaultSelector()
+        self.spectators = dict() # socket -> data
+        self.state = dict()
+        self.dirty = False
+        self.lock = Lock()
+        self.wakeR, self.wakeW = socketpair()
+        self.wakeR.setblocking(False)
+        self.wakeW.setblocking(False)
+
+    def start(self):
+        if self.eventThread:
+            return
+        self.killThread = False
+        self.ssock = socket(AF_INET, SOCK_STREAM)
+        self.ssock.bind(self.addr)
+        self.ssock.listen()
+        self.ssock.setblocking(False)
+        log.info("spectators listening at %s", self.addr)
+        self.sel.register(self.ssock, EVENT_READ, data="accept")
+        self.sel.register(self.wakeR, EVENT_READ, data="wakeup")
+        self.eventThread = Thread(target=self._spectator_event_loop, daemon=True)
+        self.eventThread.start()
+
+    def stop(self):
+        self.killThread = True
+        self.wakeup()
+
+    def wakeup(self):
+        try:
+            self.wakeW.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass # a wakeup is already pending
+
+    def publish(self, **state):
+        """merge `state` into the live state, can be called from any thread.
+        Bursts of publish calls are coalesced into a single frame"""
+        with self.lock:
+            self.state.update(state)
+            self.dirty = True
+        self.wakeup()
+
+    def count(self)->int:
+        return len(self.spectators)
+
+    def __encode(self):
+        with self.lock:
+            if not self.dirty: return
+            self.dirty = False
+            self.frame = encodeFrame(self.state, self.clock())
+        for sock,data in self.spectators.items():
+            # replaces a frame not yet started, the one being sent is finished first
+            data.next = self.frame
+            self.sel.modify(sock, EVENT_READ | EVENT_WRITE, data=data)
+
+    def __add_spectator(self):
+        conn, addr = self.ssock.accept()
+        conn.setblocking(False)
+        frame = self.frame
+        if frame and self.state.get("timer"): # the shared frame has an old remaining time
+            with self.lock: frame = encodeFrame(self.state, self.clock())
+        data = SimpleNamespace(addr=addr, outb=memoryview(b""), next=frame)
+        self.spectators[conn] = data
+        events = EVENT_READ | (EVENT_WRITE if frame else 0)
+        self.sel.register(conn, events, data=data)
+        self.emit("new-spectator", addr)
+
+    def __handle_RW_events(self, sock, data, mask):
+        if mask & EVENT_READ:
+            # read-only channel, anything sent by spectators is discarded
+            if not sock.recv(1024):
+                self._disconnect(sock)
+                return
+        if mask & EVENT_WRITE:
+            if not data.outb and data.next:
+                data.outb = memoryview(data.next)
+                data.next = None
+            if data.outb:
+                sent = sock.send(data.outb)
+                data.outb = data.outb[sent:]
+            if not data.outb and not data.next:
+                self.sel.modify(sock, EVENT_READ, data=data)
+
+    def _spectator_event_loop(self):
+        while not self.killThread:
+            for key,mask in self.sel.select(timeout=None):
+                if key.data == "accept":
+                    self.__add_spectator()
+                elif key.data == "wakeup":
+                    try:
+                        while self.wakeR.recv(1024): pass
+                    except BlockingIOError:
+                        pass
+                    self.__encode()
+                else:
+                    try:
+                        self.__handle_RW_events(key.fileobj, key.data, mask)
+                    except Exception as e:
+                        log.exception("spectator error : %s", e)
+                        self._disconnect(key.fileobj)
+        for sock in list(self.spectators):
+            self._disconnect(sock)
+        self.sel.unregister(self.ssock)
+        self.ssock.close()
+        self.eventThread = None
+
+    def _disconnect(self, sock):
+        data = self.spectators.pop(sock, None)
+        try:
+            self.sel.unregister(sock)
+            sock.close()
+        except Exception as e:
+            log.error("error during _disconnect : %s", e)
+        if data: self.emit("spectator-left", data.addr)
+
+class SpectatorClient(EventEmitter):
+    """Display side, emits `state` with the decoded state of every frame"""
+    csoc=None
+    eventThread=None
+
+    def __init__(self, addr:tuple) -> None:
+        super().__init__()
+        self.addr = addr
+
+    def connect(self):
+        self.csoc = socket(AF_INET, SOCK_STREAM)
+        self.csoc.connect(self.addr)
+        self.eventThread = Thread(target=self._client_event_loop, daemon=True)
+        self.eventThread.start()
+
+    def disconnect(self):
+        try:
+            self.csoc.shutdown(SHUT_RDWR) # unblocks the recv of the event loop
+            self.csoc.close()
+        except Exception:
+            pass
+
+    def _client_event_loop(self):
+        inb = b""
+        try:
+            while True:
+                recv = self.csoc.recv(4096)
+                if not recv: break
+                inb += recv
+                *frames, inb = inb.split(b"\n")
+                # only the latest complete frame matters to a display
+                if frames: self.emit("state", json.loads(frames[-1]))
+        except Exception as e:
+            log.info("spectator connection closed : %s", e)
+        self.emit("disconnected")
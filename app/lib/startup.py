@@ -0,0 +1,79 @@
+"""
+Startup Profiler (`--profile-startup` on admin.py / participant.py)
+Times every module imported after `start()` in the format of `python -X importtime`
+    self [us] | cumulative | imported package
+and reports the time until the window is built and first painted.
+"""
+import builtins
+import importlib.util
+import sys
+import time
+
+class StartupProfiler():
+    enabled=False
+    top=25 # number of imports in the report
+
+    def __init__(self) -> None:
+        self.imports = list() # (name, self seconds, cumulative seconds, depth)
+        self.stack = list() # time spent in nested imports of the imports in progress
+        self.marks = list() # (label, seconds since start)
+        self.startedAt = None
+        self.__import = None
+
+    def start(self):
+        self.enabled = True
+        self.startedAt = time.perf_counter()
+        self.__import = builtins.__import__
+        builtins.__import__ = self._timedImport
+
+    def stopImports(self):
+        if self.__import:
+            builtins.__import__ = self.__import
+            self.__import = None
+
+    def mark(self, label):
+        if self.enabled: self.marks.append((label, time.perf_counter()-self.startedAt))
+
+    def _timedImport(self, name, globals=None, locals=None, fromlist=(), level=0):
+        modules = len(sys.modules)
+        start = time.perf_counter()
+        self.stack.append(0.0)
+        try:
+            return self.__import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter()-start
+            children = self.stack.pop()
+            if self.stack: self.stack[-1] += elapsed
+            # cached imports do not add modules, only the first import is reported
+            if len(sys.modules) != modules:
+                if level:
+                    try:
+                        name = importlib.util.resolve_name("."*level + name, (globals or dict()).get("__package__"))
+                    except (ImportError, ValueError):
+                        pass
+                self.imports.append((name, elapsed-children, elapsed, len(self.stack)))
+
+    def firstPaint(self, window):
+        """report once `window` (a Tk root) is mapped and its first frame drawn"""
+        if not self.enabled: return
+        self.mark("window built")
+        def painted():
+            self.mark("first paint")
+            self.report()
+        def mapped(event):
+            if event.widget is not window: return
+            window.unbind("<Map>", bindID)
+            window.after_idle(painted)
+        bindID = window.bind("<Map>", mapped, add="+")
+
+    def report(self):
+        self.stopImports()
+        print(f"\nimport time: {'self [us]':>10} | {'cumulative':>10} | imported package (top {self.top})")
+        for name, selfTime, cumulative, depth in sorted(self.imports, key=lambda i : -i[2])[:self.top]:
+            print(f"import time: {int(selfTime*1e6):>10} | {int(cumulative*1e6):>10} | {'  '*depth}{name}")
+        total = sum(i[2] for i in self.imports if i[3] == 0)
+        print(f"\nstartup: {len(self.imports)} modules imported in {total*1000:.0f} ms")
+        for label, seconds in self.marks:
+            print(f"startup: {label} at {seconds*1000:.0f} ms")
+
+profiler = StartupProfiler()
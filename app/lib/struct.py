@@ -1,14 +1,49 @@
-from .util import Participants, createPayload
+from .util import Participants, Participant, RateLimiter, createPayload
 from .qb import QuestionBank, Question, ClientQuestion
 from .sm import Scores
-from ..ui.admin.structs import _App
-from .sockets import ServerSocket,ClientSocket
+from .selector import QuestionSelector
+from .sockets import ServerSocket,ClientSocket, EventEmitter
+from .ledger import Ledger
+from .clock import ClockOffsets
+from .viewstate import ViewState
+from .analytics import analyseRound, summarize
+from .metrics import registry
+from .log import getLogger
+import contextlib
+import functools
+import json
 import os
 import random
-# from .rounds import 
-from ..ui.admin.frames.live import PlayFrame
+import threading
+import time
 
-class Round():
+log = getLogger("rounds")
+
+questionsAsked = registry.counter("round.questions_asked")
+answerLatency = registry.histogram("round.answer_latency") # question sent -> answer checked
+messagesIn = registry.counter("admin.messages_in")
+messagesOut = registry.counter("admin.messages_out")
+rateLimited = registry.counter("admin.rate_limited") # payloads dropped by the per client limit
+lateAnswers = registry.counter("round.late_answers") # answers / buzzers after the deadline
+
+def recorded(method):
+    "operator action, written to the session capture so a replay can repeat it"
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        self.admin.record(method.__name__, *args)
+        return method(self, *args)
+    return wrapper
+
+class Round(EventEmitter):
+    """
+    Round engine, does not know about the UI.
+    Events :-
+    round-started -> (round)
+    question-asked -> (participantID|None, ClientQuestion, name, info, deadline) deadline in `admin.clock` time
+    answer-checked -> (participantID, qid, rightAns, answer, isRight)
+    show-answer -> (qid, rightAns, answer)
+    round-ended -> (round)
+    """
     admin=None
     questions__:tuple=None
     num_q = 3
@@ -22,8 +57,16 @@ class Round():
     id=None
     name=None
     roundEnded=False
+    selector:QuestionSelector=None
+    askedAt:float=None # `admin.clock` time the current question was asked
+    deadline:float=None # answers after it (plus `grace`) are rejected
+    answers:dict=None # qid -> right answer of the loaded questions
+    analysis:dict=None # end of round statistics, see `analyseRound`
+    time_limit = 30
+    grace = 0.5 # seconds an answer may take to reach the admin
 
     def __init__(self, admin, questions, mark, minusMark, id, name, num_q=5) -> None:
+        super().__init__()
         self.admin:ADMIN = admin
         self.questions__ = tuple(questions)
         self.mark=mark
@@ -32,53 +75,96 @@ class Round():
         self.name=name
         # self.num_q = num_q
 
+    def currentParticipantID(self):
+        return self.admin.participants.getClientIDs()[self.curr_participant_i]
+
+    def isLate(self, at=None)->bool:
+        "`at` the time the answer was received, by a relay, default now"
+        if at is None: at = self.admin.clock()
+        return self.deadline is not None and at > self.deadline + self.grace
+
+    def startDeadline(self):
+        self.askedAt = self.admin.clock()
+        self.deadline = self.askedAt + self.time_limit
+
+    def answer(self, clientID, qid, answer, at=None)->bool:
+        "an answer of a participant in time, False when the round does not take it"
+        self.check_answer(qid, answer)
+        return True
+
     def check_answer(self, qid, answer):
         self.lastQuestionMarked=True
-        rightAns = None
-        for question in self.questions__:
-            if str(qid) == str(question.qid):
-                rightAns=question.answer
+        if self.askedAt: answerLatency.observe(self.admin.clock() - self.askedAt)
+        rightAns = self.answers.get(str(qid))
         isRight=int(rightAns)==int(answer)
-        print(f"CHECKING ANSWER qid:{qid}, ans:{answer}, correct:{rightAns}")
-        participantID = self.admin.participants.getClientIDs()[self.curr_participant_i]
+        log.debug("checking answer qid:%s ans:%s correct:%s", qid, answer, rightAns)
+        participantID = self.currentParticipantID()
         if isRight:
-            self.curr_scores.add(participantID, self.mark)
+            self.award(participantID, self.mark)
         else:
-            self.curr_scores.add(participantID, self.minusMark)
+            self.award(participantID, self.minusMark)
 
-        print(isRight)
+        self.emit("answer-checked", participantID, qid, rightAns, answer, isRight)
         return rightAns
-    
-        
+
+    def award(self, participantID, delta):
+        """add `delta` to the round score and record it in the ledger"""
+        self.curr_scores.add(participantID, delta)
+        question:Question = self.questions__[self.curr_question_i]
+        responseTime = self.admin.clock() - self.askedAt if self.askedAt else 0.0
+        self.admin.ledger.record(participantID, self.id, question.qid, delta, responseTime)
+
+    def rebind(self, oldID, newID):
+        "a participant reconnected as `newID`, its round score follows it"
+        if self.curr_scores: self.curr_scores.rename(oldID, newID)
+
+    def selectQuestions(self, pool:tuple, num_q:int, num_participants:int=1)->tuple:
+        """least recently used questions first, see `QuestionSelector`.
+        A replay uses the questions of the capture instead"""
+        self.selector = QuestionSelector(pool, self.admin.qBank.history, f"r{self.id}")
+        picked = self.admin.questionOrder and self.admin.questionOrder.get(self.id)
+        if picked:
+            byID = {str(q.qid):q for q in pool}
+            questions = tuple(byID[str(qid)] for qid in picked)
+        else:
+            questions = self.selector.select(num_q, num_participants)
+        self.admin.record("questions", self.id, [q.qid for q in questions])
+        return questions
+
     def loadQ(self):
-        allQuestions = list(self.questions__)
-        required_q = self.num_q*self.admin.participants.count()
-        if len(allQuestions) < required_q:
-            raise Exception("NUMBER OF QUESTIONs in DB is less than participants")
-        random.shuffle(allQuestions)
-        self.questions__ = tuple(allQuestions[0:required_q])
+        self.questions__ = self.selectQuestions(self.questions__, self.num_q, self.admin.participants.count())
+        self.answers = {str(q.qid):q.answer for q in self.questions__}
 
     def start(self):
-        print(f"ROUND-{self.id} started")
+        log.info("round %s started", self.id)
         self.loadQ()
-        self.admin.server.broadcast(createPayload("setround", self.id))
-        self.askQ()
+        self.emit("round-started", self)
+        self.admin.showRound(self.id)
+        self.admin.publish_state(round={"id":self.id, "name":self.name})
         self.curr_scores=Scores(self.admin.participants.getClientIDs())
+        self.askQ()
 
     def askQ(self):
-        participantID = self.admin.participants.getClientIDs()[self.curr_participant_i]
+        participantID = self.currentParticipantID()
         question:Question = self.questions__[self.curr_question_i]
+        self.selector.markUsed(question)
+        self.startDeadline()
+        questionsAsked.inc()
         
         # self.admin.server.broadcast(createPayload("setscreensaver"))
         for cid in self.admin.participants.getClientIDs():
             if cid == participantID : continue
-            self.admin.server.sendAllTo(createPayload("setscreensaver"), cid)
+            self.admin.showScreensaver(cid)
         self.admin.askQ(participantID, question.forParticipant())
-        pf:PlayFrame = PlayFrame.me
+        self.admin.sendDeadline(participantID, question.qid, self.deadline)
         name = self.admin.participants.getNames()[self.curr_participant_i]
-        pf.setInfo(name, f"Question : {self.curr_question_i+1}/{len(self.questions__)}")
-        pass
+        self.emit("question-asked", participantID, question.forParticipant(), name, f"Question : {self.curr_question_i+1}/{len(self.questions__)}", self.deadline)
+        self.admin.publish_state(
+            question=question.forParticipant().toDict(), participant=name,
+            timer={"limit":self.time_limit, "deadline":self.deadline},
+        )
 
+    @recorded
     def askNextQ(self):
         if not self.lastQuestionMarked : return
         self.lastQuestionMarked = False
@@ -89,51 +175,181 @@ class Round():
             return
         self.askQ()
 
+    def markAndAdvance(self, isRight:bool):
+        """operator shortcut, marks the answer and asks the next question as one
+        transition, the payloads of both reach every participant in one write.
+        Not `recorded` itself, the capture gets the two actions"""
+        with self.admin.batch():
+            if isRight: self.mark_right()
+            else: self.mark_wrong()
+            self.askNextQ()
+
+    @recorded
     def mark_right(self):
         if self.lastQuestionMarked or self.roundEnded:return
         self.lastQuestionMarked=True
-        participantID = self.admin.participants.getClientIDs()[self.curr_participant_i]
-        self.curr_scores.add(participantID, self.mark)
+        participantID = self.currentParticipantID()
+        self.award(participantID, self.mark)
         # print(self.curr_scores.toString())
         # print(self.admin.scores.toString())
         # print(self.curr_scores.scores is self.admin.scores.scores)
 
+    @recorded
     def mark_wrong(self):
         if self.lastQuestionMarked or self.roundEnded:return
         self.lastQuestionMarked=True
-        participantID = self.admin.participants.getClientIDs()[self.curr_participant_i]
-        self.curr_scores.add(participantID, self.minusMark)
+        participantID = self.currentParticipantID()
+        self.award(participantID, self.minusMark)
 
     def onend(self):
         """Add scores to main and SHOW SCOREBOARD"""
         self.roundEnded=True
-        self.admin.scores.addScore(self.curr_scores)
+        self.admin.qBank.history.save()
+        before = self.admin.scores.ranking()
+        self.admin.scores.addAll(self.curr_scores.scores)
         self.curr_scores.reset()
-        print(self.curr_scores.toString())
-        print(self.admin.scores.toString())
-        pf:PlayFrame=PlayFrame.me
-        pf.f_scores.setData(self.name, self.admin.scores.scores, self.id < 4)
-        pf.setActiveFrame(pf.f_scores)
+        self.analysis = analyseRound(self.admin.ledger, self.id, before, self.admin.scores.ranking())
+        log.info("round %s ended, scores %s", self.id, self.admin.scores.toString())
+        if self.analysis: log.info("round %s analysis : %s", self.id, summarize(self.analysis))
+        self.emit("round-ended", self)
+        if self.id == len(self.admin.rounds):
+            self.admin.export_results()
 
 class ADMIN():
-    
+    """
+    Quiz engine shared by the Tk admin and the headless admin,
+    the UI only subscribes to the events of the rounds
+    """
     lastQuestionMarked=False
-    participants=Participants()
+    participants:Participants=None
     qBank:QuestionBank=None
     scores:Scores=None
-    ui:_App=None
+    ui=None
     server:ServerSocket=None
     me=None
     quiz_started=False
     currentRound:Round=None
+    curr_round_i=0
+    min_participants=1
+    rounds=tuple()
     num_participants:int=0 # number of participant in quiz when it started
-    scores:Scores=None
+    ledger:Ledger=None
+    capture=None # CaptureWriter of the session, see `record`
+    questionOrder:dict=None # round id -> qids, set by a replay to ask the captured questions
+    rate=10 # payloads per second per participant after a burst of `burst`
+    burst=20
+    clock = time.monotonic # deadlines and latencies, a replay swaps in the captured times
+
+    def __init__(self) -> None:
+        self.participants = Participants()
+        self.limiter = RateLimiter(self.rate, self.burst, clock=lambda : self.clock())
+        self.clocks = ClockOffsets()
+        self.views = ViewState() # what the participants' screens show, for `sync`
+        self.lock = threading.RLock() # one state transition at a time, operator or participant
+        self.pending = None # payloads held back by `batch`
+        self.batchThread = None
+
+    @contextlib.contextmanager
+    def batch(self):
+        """one state transition, nothing else changes the quiz meanwhile and the
+        payloads sent inside go out at the end, one write per participant.
+        The event listeners run inside it, a UI must not wait on another
+        thread from them (the Tk admin runs the engine on its thread, `Admin.post`)"""
+        with self.lock:
+            if self.pending is not None: # nested, the outer batch sends
+                yield
+                return
+            self.pending, self.batchThread = list(), threading.current_thread()
+            try:
+                yield
+            finally:
+                pending, self.pending, self.batchThread = self.pending, None, None
+                self.flush(pending)
+
+    def flush(self, pending:list):
+        "sends the payloads of a batch, in order for every participant"
+        sends = dict() # clientID -> payloads
+        everyone = list()
+        def sendAll():
+            if everyone: self.server.broadcast(b"".join(everyone))
+            everyone.clear()
+        def sendEach():
+            for clientID, payloads in sends.items():
+                try:
+                    self.server.sendTo(b"".join(payloads), clientID)
+                except Exception as e:
+                    log.warning("payloads for %s dropped : %s", clientID, e)
+            sends.clear()
+        for clientID, payload in pending:
+            if clientID is None: # broadcast
+                sendEach()
+                everyone.append(payload)
+            else:
+                sendAll()
+                sends.setdefault(clientID, list()).append(payload)
+        sendEach()
+        sendAll()
+
+    def sendTo(self, payload:bytes, clientID):
+        messagesOut.inc()
+        if self.pending is not None and threading.current_thread() is self.batchThread:
+            return self.pending.append((clientID, payload))
+        try:
+            self.server.sendTo(payload, clientID)
+        except Exception as e: # a participant waiting to reconnect
+            log.warning("payload for %s dropped : %s", clientID, e)
+
+    def broadcast(self, payload:bytes):
+        messagesOut.inc(self.participants.count())
+        if self.pending is not None and threading.current_thread() is self.batchThread:
+            return self.pending.append((None, payload))
+        self.server.broadcast(payload)
+
+    def showRound(self, roundID):
+        # the participants switch to the round screen, nothing asked yet
+        v = self.views.update(round=roundID, screen=None, question=None, deadline=None)
+        self.broadcast(createPayload("setround", roundID, v))
 
     def askQ(self,clientID, question:ClientQuestion):
-        pass
+        v = self.views.update([clientID], screen="question", question=question.toDict())
+        self.sendTo(createPayload("setquestion", question.jsons(), v), clientID)
 
-    def askAll(self, question):
-        pass
+    def showScreensaver(self, clientID):
+        # most participants already look at it, one of them was asked the last question
+        if self.views.get(clientID).get("screen") == "screensaver": return
+        v = self.views.update([clientID], screen="screensaver", question=None, deadline=None)
+        self.sendTo(createPayload("setscreensaver", None, v), clientID)
+
+    def deadlineFor(self, clientID, qid, deadline:float)->dict:
+        """`deadline` in the clock of the participant, `remaining` for the
+        participants whose offset is not known yet"""
+        return {
+            "qid":qid,
+            "deadline":self.clocks.toClient(clientID, deadline),
+            "remaining":deadline - self.clock(),
+        }
+
+    def sendDeadline(self, clientID, qid, deadline:float):
+        "pings again to keep the clock offset fresh"
+        v = self.views.update([clientID], deadline=[qid, deadline])
+        self.sendTo(createPayload("setdeadline", self.deadlineFor(clientID, qid, deadline), v), clientID)
+        self.pingClock(clientID)
+
+    def sendState(self, clientID, epoch=None, version=None, view=None):
+        "`setstate`, what changed in the view of `clientID` since `version`"
+        reply = self.views.sync(clientID, epoch, version, view)
+        deadline = reply["state"].get("deadline")
+        if deadline: reply["state"]["deadline"] = self.deadlineFor(clientID, *deadline)
+        self.sendTo(createPayload("setstate", reply), clientID)
+
+    def pingClock(self, clientID):
+        self.sendTo(createPayload("clock-ping", {"t0":self.clock()}), clientID)
+
+    def askAll(self, question:ClientQuestion, deadline:float=None):
+        "every participant, and the ones joining later, see `question`"
+        v = self.views.update(screen="question", question=question.toDict(),
+            deadline=[question.qid, deadline] if deadline else None)
+        self.broadcast(createPayload("setquestion", question.jsons(), v))
 
     def checkQ(self, question)->bool:
         pass
@@ -141,17 +357,175 @@ class ADMIN():
     def updateScore(self):
         pass
 
-    def start(self):
+    def export_results(self):
+        pass
+
+    def publish_state(self, **state):
         pass
 
-    def setUserData(clientID, name):
+    def schedule(self, at:float, method, *args):
+        "calls `method(*args)` in a batch at `at` (`clock` time), from a timer thread"
+        def run():
+            with self.batch(): method(*args)
+        timer = threading.Timer(max(0.0, at - self.clock()), run)
+        timer.daemon = True
+        timer.start()
+
+    def record(self, name, *args):
+        "writes an operator action / engine decision to the session capture"
+        if self.capture: self.capture.control(name, *args)
+
+    def start(self):
         pass
 
+    def handlePayload(self, clientID, action, data, at=None):
+        "`at` admin clock time a relay received the payload, None for local participants"
+        with self.batch():
+            self.__handle(clientID, action, data, at)
+
+    def __handle(self, clientID, action, data, at):
+        messagesIn.inc()
+        # answers and buzzers spend the tokens, handshake, sync and clock traffic never waits
+        limited = action in ("checkanswer", "buzzer-pressed") and not self.limiter.allow(clientID)
+        if limited: rateLimited.inc()
+        if action == "setdata":
+            self.setUserData(clientID, data)
+            self.pingClock(clientID) # the handshake is done, the socket is ours
+
+        if action == "clock-pong":
+            self.clocks.pong(clientID, data, self.clock())
+
+        if action == "sync":
+            data = data if isinstance(data, dict) else dict()
+            previous = self.views.owner(data.get("epoch"), data.get("view"))
+            if previous is not None and previous != clientID:
+                self.rebind(previous, clientID)
+            self.sendState(clientID, data.get("epoch"), data.get("version"), data.get("view"))
+
+        if action == "checkanswer":
+            qid=data["qid"]
+            answer=data["answer"]
+            if limited:
+                self.sendTo(createPayload("answer-rejected", {"qid":qid, "reason":"rate"}), clientID)
+                return
+            if self.currentRound.isLate(at):
+                lateAnswers.inc()
+                self.sendTo(createPayload("answer-rejected", {"qid":qid, "reason":"late"}), clientID)
+                return
+            if not self.currentRound.answer(clientID, qid, answer, at):
+                self.sendTo(createPayload("answer-rejected", {"qid":qid, "reason":"closed"}), clientID)
+                return
+            self.sendTo(createPayload("answer-ack", {"qid":qid}), clientID)
+
+        if action == "buzzer-pressed" and self.curr_round_i == 3 and not limited:
+            qid = data.get("qid") if isinstance(data, dict) else None
+            # repeated presses are dropped without an ack
+            if self.currentRound.buzzer_pressed(clientID, qid, at):
+                self.sendTo(createPayload("buzzer-ack"), clientID)
+
+    def setUserData(self, clientID, name, id=None):
+        participant:Participant = self.participants.get(clientID)
+        participant.name = name
+
+    def addParticipant(self, clientID, client=None):
+        self.participants.add(Participant(client=client, clientID=clientID))
+
+    def disconnectParticipant(self, clientID):
+        "a participant of a started quiz keeps its place and score until it reconnects"
+        self.limiter.forget(clientID)
+        self.clocks.forget(clientID) # the port may come back as another participant
+        self.views.detach(clientID)
+        participant = self.participants.get(clientID)
+        if participant and not participant.isPlaying:
+            self.participants.remove(clientID)
+
+    def rebind(self, oldID, newID):
+        """the participant of `oldID` reconnected as `newID` (its `sync` carried
+        the old view), it takes over the place, scores and ledger rows of `oldID`"""
+        if self.participants.get(oldID) is None: return
+        self.record("rebind", oldID, newID)
+        log.info("participant %s reconnected as %s", oldID, newID)
+        self.views.detach(oldID) # a stale connection may still hold it
+        self.participants.rebind(oldID, newID)
+        if self.scores: self.scores.rename(oldID, newID)
+        if self.ledger: self.ledger.rename(oldID, newID)
+        if self.currentRound: self.currentRound.rebind(oldID, newID)
+        self.limiter.forget(oldID)
+        self.clocks.forget(oldID)
+
+    def start_quiz(self)->bool:
+        if self.participants.count() < self.min_participants:
+            return False
+        log.info("quiz started with %d participants", self.participants.count())
+        self.record("start_quiz")
+        self.quiz_started=True
+        for clientID in self.participants.getClientIDs():
+            self.participants.get(clientID).isPlaying = True
+        self.num_participants = self.participants.count()
+        self.scores = Scores(self.participants.getClientIDs())
+        self.ledger = Ledger()
+        self.start_curr_round()
+        return True
+
+    def start_curr_round(self):
+        self.currentRound.start()
+
+    def start_next_round(self):
+        self.record("start_next_round")
+        self.curr_round_i+=1
+        self.currentRound = self.rounds[self.curr_round_i]
+        self.start_curr_round()
+
 class USER():
     client:ClientSocket=None
     me=None
     ui=None
     name:str=None
+    serverAddr:tuple=None # picked from the discovered servers, None for the Wi-Fi gateway
+    beacons=None # BeaconListener
+    buzzerDebounce=0.3 # seconds between two buzzer presses sent to the admin
+    buzzedQid=None # question the buzzer was last pressed for
+    buzzedAt=0.0
+    stateEpoch=None # the participant view last received, see `ViewState`
+    stateVersion=None
+    stateView=None
+    view:dict=None
 
     def setName(self, name):
-        self.name = name
\ No newline at end of file
+        self.name = name
+
+    def setServer(self, addr:tuple):
+        self.serverAddr = addr
+
+    def syncPayload(self)->bytes:
+        "asks the admin for what changed since the last view received"
+        return createPayload("sync", {"epoch":self.stateEpoch, "version":self.stateVersion, "view":self.stateView})
+
+    def trackState(self, payload:dict)->dict:
+        "keeps `view` and `stateVersion` up to date with a received payload"
+        if self.view is None: self.view = dict()
+        action, data = payload["action"], payload["data"]
+        if action == "setstate":
+            if data["full"]: self.view.clear()
+            self.view.update(data["state"])
+            self.stateEpoch, self.stateVersion, self.stateView = data["epoch"], data["version"], data["view"]
+            return self.view
+        if action == "setround":
+            self.view.update(round=data, screen=None, question=None, deadline=None)
+        elif action == "setquestion":
+            self.view.update(screen="question", question=json.loads(data))
+        elif action == "setscreensaver":
+            self.view.update(screen="screensaver", question=None, deadline=None)
+        elif action == "setdeadline":
+            self.view["deadline"] = data
+        if "v" in payload: self.stateVersion = payload["v"]
+        return self.view
+
+    def shouldSendBuzzer(self, qid)->bool:
+        "one press per question, and not within `buzzerDebounce` of the last one"
+        now = time.monotonic()
+        if qid == self.buzzedQid or now - self.buzzedAt < self.buzzerDebounce:
+            return False
+        self.buzzedQid = qid
+        self.buzzedAt = now
+        return True
\ No newline at end of file
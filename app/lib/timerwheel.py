@@ -0,0 +1,52 @@
+"""
+Timer Wheel
+Hashed timing wheel for the deadlines of the socket loop (handshakes of
+half-open connections). Adding a deadline and letting it expire is O(1), a
+thousand pending handshakes cost nothing until their slot comes round.
+Entries are not cancelled, the caller checks on expiry whether it still cares.
+"""
+import math
+import time
+
+class TimerWheel():
+
+    def __init__(self, tick:float=0.25, slots:int=64, clock=time.monotonic) -> None:
+        self.tick = tick
+        self.slots = [list() for _ in range(slots)]
+        self.current = 0
+        self.clock = clock
+        self.time = clock() # start of the current slot
+        self.count = 0
+
+    def add(self, deadline:float, item):
+        ticks = max(1, math.ceil((deadline - self.time) / self.tick))
+        slot = (self.current + ticks) % len(self.slots)
+        rounds = (ticks - 1) // len(self.slots) # full turns before it is due
+        self.slots[slot].append([rounds, item])
+        self.count += 1
+
+    def advance(self, now:float=None)->list:
+        "moves the wheel to `now`, returns the items which are due"
+        now = self.clock() if now is None else now
+        expired = list()
+        while now - self.time >= self.tick:
+            self.time += self.tick
+            self.current = (self.current + 1) % len(self.slots)
+            slot = self.slots[self.current]
+            if not slot: continue
+            keep = list()
+            for entry in slot:
+                if entry[0] == 0:
+                    expired.append(entry[1])
+                else:
+                    entry[0] -= 1
+                    keep.append(entry)
+            self.slots[self.current] = keep
+        self.count -= len(expired)
+        return expired
+
+    def timeout(self, now:float=None):
+        "seconds until the next tick, None when nothing is pending (block)"
+        if not self.count: return None
+        now = self.clock() if now is None else now
+        return max(0.0, self.time + self.tick - now)
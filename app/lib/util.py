@@ -1,11 +1,16 @@
 import shutil
 from .sockets import ClientSocket
+import codecs
 import json
 import os
 import random
 import string
-import customtkinter as ctk
-from PIL import Image
+import time
+from .log import getLogger
+from .metrics import registry
+
+log = getLogger("ui")
+invalidPayloads = registry.counter("payload.invalid") # dropped by `PayloadReader`
 
 def rand_str(length=10):
   """Generates a random string of the specified length.
@@ -39,6 +44,9 @@ class Participant():
 class Participants():
     __participants = dict()
 
+    def __init__(self) -> None:
+        self.__participants = dict()
+
     def add(self, p:Participant):
         
         self.__participants[p.clientID] = p
@@ -46,6 +54,14 @@ class Participants():
     def remove(self, clientID:Participant.clientID):
         self.__participants.pop(clientID)
     
+    def rebind(self, oldID, newID):
+        "the participant of `oldID` reconnected as `newID`, it keeps its place in the order"
+        participant = self.__participants[oldID]
+        joined = self.__participants.get(newID)
+        if joined: participant.client = joined.client
+        participant.clientID = newID
+        self.__participants = {(newID if id == oldID else id):p for id,p in self.__participants.items() if id != newID}
+
     def find(self, clientID:Participant.clientID)->bool:
         return clientID in self.__participants
     
@@ -72,9 +88,91 @@ class Participants():
         names = [self.__participants[i].name for i in self.__participants]
         return names
 
-def createPayload(action:str, data:dict|str=None)->bytes:
-    return bytes(json.dumps({"action":action, "data":data}), encoding="utf-8")
-
+def createPayload(action:str, data:dict|str=None, version:int=None)->bytes:
+    "`version` of the participant view after this payload, see `ViewState`"
+    payload = {"action":action, "data":data}
+    if version is not None: payload["v"] = version
+    return bytes(json.dumps(payload), encoding="utf-8")
+
+class PayloadReader():
+    """
+    Collects the bytes received from one connection and returns the complete
+    payloads. The socket layer has no framing, so a `data` event can hold
+    several payloads or end in the middle of one; the incomplete end is kept
+    for the next `feed`. Invalid payloads are dropped and counted in `dropped`,
+    `check` raises for them once the good payloads were handled
+    """
+    maxPending = 1024*1024
+
+    def __init__(self) -> None:
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.jsonDecoder = json.JSONDecoder()
+        self.pending = ""
+        self.dropped = 0 # invalid payloads since the last `check`
+
+    @staticmethod
+    def incomplete(text:str, e:json.JSONDecodeError)->bool:
+        "more data may still complete the payload"
+        return e.pos >= len(text.rstrip()) or e.msg.startswith("Unterminated string")
+
+    def feed(self, data:bytes|str)->list:
+        if type(data) is bytes:
+            data = self.decoder.decode(data)
+        text = self.pending + data
+        payloads = list()
+        i = 0
+        while i < len(text):
+            if text[i].isspace():
+                i += 1
+                continue
+            try:
+                payload, i = self.jsonDecoder.raw_decode(text, i)
+            except json.JSONDecodeError as e:
+                if self.incomplete(text, e): break # wait for the rest
+                # skip to the next payload
+                self.dropped += 1
+                invalidPayloads.inc()
+                i = text.find("{", i+1)
+                if i == -1: i = len(text)
+                continue
+            payloads.append(payload)
+        self.pending = text[i:]
+        if len(self.pending) > self.maxPending:
+            self.pending = ""
+            raise ValueError("payload too large or not json")
+        return payloads
+
+    def check(self):
+        "raises for the payloads dropped since the last call, the socket loop counts it against the client"
+        dropped, self.dropped = self.dropped, 0
+        if dropped: raise ValueError(f"{dropped} invalid payloads dropped")
+
+class RateLimiter():
+    """
+    Token bucket per key (clientID) : `burst` payloads at once, then `rate`
+    per second. `clock` is replaced by a replay to use the captured times
+    """
+
+    def __init__(self, rate:float, burst:int, clock=time.monotonic) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.buckets = dict() # key -> [tokens, last refill]
+
+    def allow(self, key)->bool:
+        now = self.clock()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [self.burst, now]
+        bucket[0] = min(self.burst, bucket[0] + (now-bucket[1])*self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def forget(self, key):
+        self.buckets.pop(key, None)
 
 class Obj(dict):
     def set(self, **kwargs):
@@ -91,13 +189,16 @@ class UI:
     def show(self):
         pass
 
-def setImage(imgPath, target:ctk.CTkLabel):
+def setImage(imgPath, target):
+        # UI only, imported here so the lib stays usable without a display
+        import customtkinter as ctk
+        from PIL import Image
         image = Image.open(imgPath)
         width, height = image.size
         # l_width=int(target.winfo_width())
         l_width=int(target.cget("width"))
         height = height/width*l_width
-        print(f"{width}x{height}")
+        log.debug("image %sx%s", width, height)
         image = ctk.CTkImage(image, size=(l_width,height))
         target.configure(image=image, text="")
 
@@ -117,7 +218,7 @@ def copy_file(source_path, destination_path, new_name):
 
     # Use shutil.copy2 to preserve file metadata (e.g., creation time)
     shutil.copy2(source_path, full_destination_path)
-    print(f"File copied successfully: {source_path} -> {full_destination_path}")
+    log.info("file copied %s -> %s", source_path, full_destination_path)
 
   except Exception as e:
-    print(f"Error copying file: {e}")
\ No newline at end of file
+    log.error("error copying file : %s", e)
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""
+Participant View State
+What every participant's screen should show, kept by the admin so a late
+joiner or a participant reconnecting mid-round catches up at once :-
+
+    round    -> id of the current round
+    screen   -> "question" | "screensaver", None on the round screen before a question
+    question -> ClientQuestion dict of the question on screen, None
+    deadline -> [qid, deadline in admin clock] of that question, None
+
+Every change bumps `version` and stamps the changed fields. The payloads of a
+transition (`setround`, `setquestion`, `setscreensaver`, `setdeadline`) carry
+the version as "v", so a participant knows which version it has seen.
+After `setdata` it sends `sync` {"epoch", "version", "view"} and the admin
+replies `setstate` with the fields changed since that version, or with every
+field ("full") when the epoch (admin session) or view differs.
+"""
+from collections import OrderedDict
+from types import SimpleNamespace
+from threading import Lock
+import uuid
+
+fields = ("round", "screen", "question", "deadline")
+
+class ViewState():
+    maxDetached = 256 # views kept for participants who may reconnect
+
+    def __init__(self) -> None:
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+        self.shared = dict() # field -> (version, value), what a joining participant sees
+        self.views = dict() # clientID -> SimpleNamespace(clientID, token, fields)
+        self.detached = OrderedDict() # token -> view of a disconnected participant
+        self.tokens = 0
+        self.lock = Lock() # the Tk thread and the socket loop both update it
+
+    def __view(self, clientID):
+        view = self.views.get(clientID)
+        if view is None:
+            view = self.views[clientID] = SimpleNamespace(clientID=clientID, token=None, fields=dict(self.shared))
+        return view
+
+    def update(self, clientIDs=None, **values)->int:
+        """sets `values` in the views of `clientIDs`, of everyone (and of later
+        joiners) when None. Returns the version to send with the change"""
+        with self.lock:
+            self.version += 1
+            if clientIDs is None:
+                for field, value in values.items():
+                    self.shared[field] = (self.version, value)
+                views = list(self.views.values()) + list(self.detached.values())
+            else:
+                views = [self.__view(clientID) for clientID in clientIDs]
+            for view in views:
+                for field, value in values.items():
+                    if field not in view.fields or view.fields[field][1] != value:
+                        view.fields[field] = (self.version, value)
+            return self.version
+
+    def get(self, clientID)->dict:
+        with self.lock:
+            return {field:value for field,(_, value) in self.__view(clientID).fields.items()}
+
+    def sync(self, clientID, epoch=None, version=None, token=None)->dict:
+        """the `setstate` reply to a participant which has seen `version` of
+        the view `token` : the changed fields, every field when unknown"""
+        with self.lock:
+            if epoch == self.epoch and token in self.detached:
+                self.__rebind(clientID, token)
+            view = self.__view(clientID)
+            full = epoch != self.epoch or token is None or view.token != token \
+                or not isinstance(version, int) or version > self.version
+            if view.token is None:
+                self.tokens += 1
+                view.token = f"{self.epoch}-{self.tokens}"
+            return {
+                "epoch": self.epoch,
+                "version": self.version,
+                "view": view.token,
+                "full": full,
+                "state": {field:value for field,(v, value) in view.fields.items() if full or v > version},
+            }
+
+    def __rebind(self, clientID, token):
+        "the view of a reconnecting participant, changes made for its new clientID meanwhile win"
+        view = self.detached.pop(token)
+        current = self.views.get(clientID)
+        if current:
+            for field, (v, value) in current.fields.items():
+                if field not in view.fields or v > view.fields[field][0]:
+                    view.fields[field] = (v, value)
+        view.clientID = clientID
+        self.views[clientID] = view
+
+    def owner(self, epoch, token):
+        "clientID the view `token` was last bound to, None when unknown"
+        with self.lock:
+            if epoch != self.epoch or token is None: return None
+            view = self.detached.get(token)
+            if view is None:
+                view = next((view for view in self.views.values() if view.token == token), None)
+            return view and view.clientID
+
+    def detach(self, clientID):
+        "the participant disconnected, its view waits for a reconnect"
+        with self.lock:
+            view = self.views.pop(clientID, None)
+            if view is None or view.token is None: return
+            self.detached[view.token] = view
+            while len(self.detached) > self.maxDetached:
+                self.detached.popitem(last=False)
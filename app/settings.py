@@ -1,78 +1,34 @@
-# import netifaces
-import subprocess
-
-def cb (line:str):
-    if line == "\r":
-        return ""
-    while '\r' in line:
-        line = line.replace('\r','')
-    while '  ' in line:
-        line = line.replace('  ', ' ')
-    return line
-
-def extractInterfaces(line):
-    target = "Dedicated"
-    i = line.find(target)
-    return line[i+len(target):].strip()
-
-def getInterfaces():
-    out = subprocess.check_output("netsh interface show interface").decode()
-    out = out.split("\n")
-    out = list(map(cb, out)) # filtering \r and double spaces
-    out = list(filter(bool, out)) # filter empty strings
-
-    out = out[2:]
-
-    interfaces = list(map(extractInterfaces, out))
-
-    return interfaces
+import os
+from .lib import netinfo
 
 def getHOTSPOT():
-
-    interfaces = getInterfaces()
-    interfaces = list(filter(lambda i : i.startswith("Local Area Connection"), interfaces))
-    if len(interfaces) < 1:
-        raise OSError("TURN ON HOTSPOT FIRST")
-    hotspot_interface = interfaces[0]#"Local Area Connection* 2"
-
-    output = subprocess.check_output(f'netsh interface ipv4 show config name="{hotspot_interface}"', shell=True, universal_newlines=True)
-    output = output.split("\n")
-    output = list(filter(lambda _ : _.strip().startswith("IP Address"), output))
-    if len(output) == 0:
-        return None
-    output = output[0]
-    while " " in output:
-      output = output.replace(" ", "")
-    output = output[10:]
-    return (output)
+    """address of the hotspot interface the admin listens on,
+    `0.0.0.0` when `bind_all` is set"""
+    if bind_all:
+        return "0.0.0.0"
+    return netinfo.hotspotAddress()
 
 def getWIFI():
-    interfaces = getInterfaces()
-    interfaces = list(filter(lambda i : i.startswith("Wi-Fi"), interfaces))
-    if len(interfaces) < 1:
-        raise OSError("SYSTEM does not have Wi-Fi supports")
-    wifi_interface = interfaces[0]#"Local Area Connection* 2"
-
-    coutput = subprocess.check_output(f'netsh interface ipv4 show config name="{wifi_interface}"', shell=True, universal_newlines=True)
-    output = coutput.split("\n")
-    output = list(filter(lambda _ : _.strip().startswith("Default Gateway:"), output))
-    
-    if len(output) < 1:
-        for line in coutput.split("\n"):
-            print(line)
-        raise Exception("`DEFAULT GATEWAY` not found in WI-Fi")
-    output = output[0]
-    while " " in output:
-      output = output.replace(" ", "")
-    output = output[15:]
-    return (output)
+    "address of the admin, the default gateway of the Wi-Fi the participant joined"
+    return netinfo.gatewayAddress()
 
 PORT = 5002  # Port to listen on (non-privileged ports are > 1023)
 # HOST = "localhost"
 
-if __name__ == "__main__": print((getWIFI(), getHOTSPOT(), PORT))
-
 host = "localhost"
 port = 4040
-
-addr = (host, port)
\ No newline at end of file
+spectator_port = port + 1 # read-only projector / display clients
+beacon_port = port + 2 # UDP server discovery beacons
+relay_port = port + 3 # relay nodes of a cluster connect to the primary here
+# listen on every interface instead of the hotspot address only
+bind_all = os.environ.get("QUIZ_BIND_ALL", "") not in ("", "0")
+# capture the session to data/captures, same as `admin.py --record`
+record_session = os.environ.get("QUIZ_RECORD", "") not in ("", "0")
+# accept relay nodes (app/cli/relay.py), same as `admin.py --cluster`
+cluster = os.environ.get("QUIZ_CLUSTER", "") not in ("", "0")
+# round 2 asks every participant at once, same as `admin.py --all-play`
+all_play = os.environ.get("QUIZ_ALL_PLAY", "") not in ("", "0")
+
+addr = (host, port)
+
+if __name__ == "__main__": print((getWIFI(), getHOTSPOT(), port))
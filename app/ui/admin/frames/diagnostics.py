@@ -0,0 +1,39 @@
+import customtkinter as ctk
+from ....lib.metrics import registry
+
+class DiagnosticsFrame(ctk.CTkFrame):
+    """live view of the metrics registry, refreshed while visible"""
+    refreshInterval=1000
+    refreshJob=None
+
+    def __init__(self, master, **kw):
+        super().__init__(master=master, fg_color="#eee", **kw)
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+        self.l_title = ctk.CTkLabel(self, text="DIAGNOSTICS", anchor="w", font=("Roboto", 20), text_color="#333")
+        self.t_metrics = ctk.CTkTextbox(self, font=("Courier", 14), fg_color="#fff", text_color="#222")
+
+    def format(self)->str:
+        lines = list()
+        for name,value in registry.snapshot().items():
+            if isinstance(value, dict):
+                lines.append(f"{name:32} count {value['count']:>8}  mean {value['mean']*1000:9.2f} ms"
+                             f"  p50 <={value['p50']*1000:8.1f} ms  p99 <={value['p99']*1000:8.1f} ms")
+            else:
+                lines.append(f"{name:32} {value:>14}")
+        return "\n".join(lines)
+
+    def refresh(self):
+        self.refreshJob = None
+        if not self.winfo_manager(): return # hidden
+        self.t_metrics.configure(state="normal")
+        self.t_metrics.delete("1.0", "end")
+        self.t_metrics.insert("1.0", self.format())
+        self.t_metrics.configure(state="disabled")
+        self.refreshJob = self.after(self.refreshInterval, self.refresh)
+
+    def show(self):
+        self.l_title.grid(row=0, column=0, sticky="we", padx=20, pady=(15,5))
+        self.t_metrics.grid(row=1, column=0, sticky="nswe", padx=20, pady=(5,20))
+        self.grid(row=0, column=0, sticky="nswe")
+        if not self.refreshJob: self.refreshJob = self.after(0, self.refresh)
@@ -8,6 +8,9 @@ from ...rounds.round2 import Round2
 from ...rounds.round3 import Round3
 from ...rounds.round4 import Round4
 from ...._globals import _GLOBALs
+from .rank_table import Rank_Table, Rank
+from ....lib.metrics import registry
+from ....lib.analytics import summarize
 
 class StartFrame(ctk.CTkFrame):
 
@@ -123,7 +126,7 @@ class Participants(ctk.CTkFrame):
         self.b_manage = ctk.CTkButton(self, text="Manage >", width=100, command=self.manage_action)
         
     def refresh_action(self):
-        print("Settings button clicked")
+        pass
 
     def manage_action(self):
         app:_App = _App.app
@@ -152,60 +155,12 @@ class Participants(ctk.CTkFrame):
         self.f_users.grid(row=1, column=0, columnspan=2, sticky="ns", pady=(20,10))
         self.b_manage.grid(row=2, column=0, sticky="e", pady=10, columnspan=2, padx=10)
 
-class Rank_Table(ctk.CTkFrame):
-    teams=list()
-
-    def __init__(self, master, **kwargs):
-        super().__init__(master,fg_color='white', **kwargs)
-        self.rowconfigure(0,weight=1)
-        self.columnconfigure(0,weight=1)
-        self.teams.append(self.createTeam(self,'anshul','1'))
-        self.teams.append(self.createTeam(self,'anshul','1'))
-        self.teams.append(self.createTeam(self,'anshul','1'))
-
-    def createTeam(self,master, name, score)->ctk.CTkFrame:
-        f_team=ctk.CTkFrame(master=master,fg_color='transparent', width=500,height=40,border_width=2)
-        f_team.grid_propagate(False)
-        f_team.columnconfigure(0,weight=1)
-        l_team_nam=ctk.CTkLabel(f_team,text=name,font=('Roboto',20),text_color='#333',fg_color='transparent')
-        l_rank=ctk.CTkLabel(f_team,text=score,font=('Roboto',18),text_color='#333',fg_color='transparent')
-        l_team_nam.grid(row=0,column=0,sticky='w',padx=20,pady=8)
-        l_rank.grid(row=0,column=1,sticky='e',padx=50,pady=8)
-        
-        return f_team
-
-    def updateTeams(self, ranks: tuple):
-        print("updating teams")
-        for child in self.teams:
-            child.grid_forget()
-        self.teams = list([self.createTeam(self, rank.name, rank.score) for rank in ranks ])
-        for i,team in enumerate(self.teams):
-            team.grid(row=i,column=0,sticky='we',padx=40,pady=(5,0))
-
-    def show(self):
-        return
-        for i,team in enumerate(self.teams):
-            team.grid(row=i,column=0,sticky='we',padx=20,pady=8)
-        self.updateTeams([
-            Rank("ABC", 1),
-            Rank("ABD", 2),
-            Rank("ABF", 3),
-        ])
-
-class Rank():
-    name=""
-    score:int=0
-
-    def __init__(self, name, score) -> None:
-        self.name=name
-        self.score:int=score
-        pass
-    pass
-
 class Score(ctk.CTkFrame):
 
-    scores=list()
+    scores=None
     show_next = True
+    rankListener=None
+    refreshJob=None
 
     def __init__(self, master, **kwargs):
         super().__init__(master=master, fg_color='white',**kwargs)
@@ -216,15 +171,18 @@ class Score(ctk.CTkFrame):
         self.l_round_name = ctk.CTkLabel(self.main_frame, text="Round I",font=("Arival",40), text_color="#333", )
         self.finish = ctk.CTkLabel(self.main_frame, text="Finished",font=("Arival",25), text_color="#666", )
         self.score_text = ctk.CTkLabel(self.main_frame, text="Score: ",font=("Arival",25), text_color="#333", )
+        self.l_stats = ctk.CTkLabel(self.main_frame, text="",font=("Roboto",14), text_color="#555", )
         self.b_next = ctk.CTkButton(self.main_frame, text="      Next ROUND ⏩      ", fg_color="#4169E1", command=self.next_action, font=("Roboto", 16), height=40, )
         
-        self.ranktable=Rank_Table(self.main_frame)
+        self.ranktable=Rank_Table(self.main_frame, animate=True)
 
     def show(self):
         self.main_frame.grid(row=0,column=0,padx=0,pady=20)
         self.l_round_name.grid(row=1, column=0, columnspan=3, padx=20, pady=(10,0), sticky="we")
         self.finish.grid(row=2, column=0, padx=10, sticky="we", pady=0)
         self.score_text.grid(row=3, column=0, padx=30, sticky="w", pady=20)
+        if self.l_stats.cget("text"): self.l_stats.grid(row=6, column=0, padx=30, sticky="w", pady=(0,10))
+        else: self.l_stats.grid_forget()
         self.ranktable.show()
         self.ranktable.grid(row=4,column=0,sticky='nsew',padx=10,pady=10)
         if self.show_next: self.b_next.grid(row=5,column=0,padx=(0,50),pady=10, sticky="e")
@@ -234,29 +192,32 @@ class Score(ctk.CTkFrame):
     def hide(self):
         self.pack_forget()
 
-    def setData(self, roundName, scores:dict, showNext=True):
-        print(f"showNext:{showNext}")
+    def setData(self, roundName, scores, showNext=True, analysis=None):
+        """`scores` is the `Scores` manager, the table follows its rank changes afterwards.
+        `analysis` of the round, see `analyseRound`"""
         self.show_next=showNext
-        admin = _GLOBALs["admin"]
-        l_scores = list()
-
-        for id in scores.keys():
-            l_scores.append({"id":id, "score":scores[id]})
-        l_sorted_scores = sorted(l_scores, key=lambda x: x["score"], reverse=True)
-
-        for score in l_sorted_scores:
-            score["name"] = admin.participants.get(score["id"]).name
-
         self.l_round_name.configure(text=roundName)
-
-        ranks = [Rank(i["name"], i["score"]) for i in l_sorted_scores]
-        self.ranktable.updateTeams(ranks)
-
-        # if not showNext:
-        #     self.b_next.grid_forget()
-        #     self.b_next.destroy()
-        # self.b_next.configure(command=onNext)
-        pass
+        admin = _GLOBALs["admin"]
+        names = dict(zip(admin.participants.getClientIDs(), admin.participants.getNames()))
+        self.l_stats.configure(text=summarize(analysis, names))
+
+        if scores is not self.scores:
+            if self.scores: self.scores.off("rank-changed", self.rankListener)
+            self.scores = scores
+            self.rankListener = scores.on("rank-changed", self.onRankChanged)
+        self.refresh()
+
+    def onRankChanged(self, args):
+        # coalesce a burst of rank changes into a single table update
+        if self.refreshJob: return
+        self.refreshJob = self.after(0, self.refresh)
+
+    def refresh(self):
+        self.refreshJob = None
+        with registry.histogram("ui.scoreboard_refresh").time():
+            admin = _GLOBALs["admin"]
+            ranks = [Rank(admin.participants.get(id).name, score, id) for id,score in self.scores.ranking()]
+            self.ranktable.updateTeams(ranks)
 
     def next_action(self):
         # print("next")
@@ -267,6 +228,15 @@ class PlayFrame(ctk.CTkFrame):
     roundUIs=list()
     scoreboard=None
     me=None
+    # operator keys, Shift marks and asks the next question in one go
+    keys = {
+        "r":"right", "w":"wrong", "n":"next", "Right":"next",
+        "R":"right-next", "W":"wrong-next", "Return":"right-next",
+    }
+    commands=None # keys waiting for the next idle
+    keysJob=None
+    asked=None # last question-asked, drawn once per frame
+    askedJob=None
     
     def setActiveFrame(self, frame):
         self.setCurrRound(frame)
@@ -309,22 +279,102 @@ class PlayFrame(ctk.CTkFrame):
 
         self.curr_round=self.roundUIs[0]
         # self.curr_round=self.f_scores
+        # built on first activation of the live frame, the rounds exist by then
+        admin = _GLOBALs.get("admin")
+        if admin and admin.rounds: self.bindRounds(admin.rounds)
+        self.commands = list()
+        self.winfo_toplevel().bind("<KeyPress>", self.onKey, add="+")
+
+    def bindRounds(self, rounds):
+        """follow the round engines, `rounds[i]` is drawn by `roundUIs[i]`"""
+        for round,ui in zip(rounds, self.roundUIs):
+            round.on("round-started", lambda args, ui=ui : self.setCurrRound(ui))
+            round.on("question-asked", self.onQuestionAsked)
+            round.on("answer-checked", self.onAnswerChecked)
+            round.on("show-answer", self.onShowAnswer)
+            round.on("answers-graded", self.onAnswersGraded)
+            round.on("round-ended", self.onRoundEnded)
+        dice = self.roundUIs[2].dice
+        rounds[2].on("dice", lambda args : dice.show() if args[0] else dice.hide())
+        rounds[3].on("buzzer-cleared", lambda args : self.curr_round.clearusers())
+        rounds[3].on("buzzer-pressed", self.onBuzzerPressed)
+
+    def onQuestionAsked(self, args):
+        # a batch may ask several questions, only the last one is drawn
+        self.asked = args
+        if self.askedJob: return
+        self.askedJob = self.after(0, self.drawQuestion)
+
+    def drawQuestion(self):
+        if self.askedJob: self.after_cancel(self.askedJob)
+        self.askedJob = None
+        if self.asked is None: return
+        participantID, question, name, info, deadline = self.asked
+        self.asked = None
+        self.curr_round.setQ(question)
+        self.curr_round.start_timer(deadline) # the engine's deadline, same clock
+        self.setInfo(name, info)
+
+    def onAnswerChecked(self, args):
+        self.drawQuestion() # the answer is for the question drawn
+        self.curr_round.stop_timer()
+
+    def onShowAnswer(self, args):
+        qid, rightAns, answer = args
+        if self.curr_round.hasOptions: self.curr_round.show_answer(rightAns, answer)
+
+    def onAnswersGraded(self, args):
+        qid, rightAns, results = args
+        self.drawQuestion()
+        self.curr_round.stop_timer()
+        if self.curr_round.hasOptions: self.curr_round.f_question.setCorrect(int(rightAns))
+        right = sum(1 for result in results if result[2])
+        self.f_info.configure(text=f"     {right} / {len(results)} answered right")
+
+    def onBuzzerPressed(self, args):
+        clientID, name, position = args
+        self.curr_round.adduser(name)
+        self.curr_round.stop_timer()
+
+    def onRoundEnded(self, args):
+        round = args[0]
+        self.f_scores.setData(round.name, round.admin.scores, round.id < 4, round.analysis)
+        self.setActiveFrame(self.f_scores)
 
     def mark_right(self):
-        # admin:ADMIN = ADMIN.me
-        admin=_GLOBALs["admin"]
-        admin.currentRound.mark_right()
-        pass
+        self.run(["right"])
 
     def mark_wrong(self):
-        admin=_GLOBALs["admin"]
-        admin.currentRound.mark_wrong()
-        pass
+        self.run(["wrong"])
 
     def askNext(self):
+        self.run(["next"])
+
+    def onKey(self, event):
+        command = self.keys.get(event.keysym)
+        if command is None or not self.winfo_ismapped(): return
+        if isinstance(event.widget, (tkinter.Entry, tkinter.Text)): return # typing somewhere
+        self.commands.append(command)
+        if self.keysJob: return
+        self.keysJob = self.after_idle(self.runKeys)
+
+    def runKeys(self):
+        self.keysJob = None
+        commands, self.commands = self.commands, list()
+        self.run(commands)
+
+    def run(self, commands:list):
+        """applies the operator `commands` as one transition, the participants
+        get one write each and the screen is redrawn once"""
         admin=_GLOBALs["admin"]
-        # admin:ADMIN = ADMIN.me
-        admin.currentRound.askNextQ()
+        with admin.batch():
+            for command in commands:
+                round = admin.currentRound # the round may end halfway
+                if command == "right": round.mark_right()
+                elif command == "wrong": round.mark_wrong()
+                elif command == "next": round.askNextQ()
+                elif command == "right-next": round.markAndAdvance(True)
+                elif command == "wrong-next": round.markAndAdvance(False)
 
     def show(self):
         self.f_body.grid(row=0, column=0, sticky="nswe", columnspan=5)
@@ -0,0 +1,150 @@
+"""
+Retained-mode rank table used by the scoreboards.
+Row widgets are pooled and keyed by team, `updateTeams` only reconfigures the
+rows whose name, score or position changed.
+"""
+import customtkinter as ctk
+
+class Rank():
+    name=""
+    score:int=0
+    id=None
+
+    def __init__(self, name, score, id=None) -> None:
+        self.name=name
+        self.score:int=score
+        self.id=id
+        pass
+
+    def key(self):
+        "identity of the team, clientID when known else name"
+        return self.name if self.id is None else self.id
+
+def diffRanks(old:dict, ranks:tuple):
+    """
+    old : key -> (position, name, score) of the previous update
+    returns (added, removed, changed, moved) lists of keys
+    """
+    added, changed, moved = list(), list(), list()
+    seen = set()
+    for pos,rank in enumerate(ranks):
+        key = rank.key()
+        seen.add(key)
+        prev = old.get(key)
+        if prev is None:
+            added.append(key)
+            continue
+        if prev[1] != rank.name or prev[2] != rank.score:
+            changed.append(key)
+        if prev[0] != pos:
+            moved.append(key)
+    removed = [key for key in old if key not in seen]
+    return added, removed, changed, moved
+
+class RankRow(ctk.CTkFrame):
+    name=None
+    score=None
+
+    def __init__(self, master, width, height, font, text_color, **kwargs):
+        super().__init__(master=master,fg_color='transparent', width=width,height=height,border_width=2, **kwargs)
+        self.grid_propagate(False)
+        self.columnconfigure(0,weight=1)
+        self.l_team_nam=ctk.CTkLabel(self,text="",font=('Roboto',font[0]),text_color=text_color,fg_color='transparent')
+        self.l_rank=ctk.CTkLabel(self,text="",font=('Roboto',font[1]),text_color=text_color,fg_color='transparent')
+        self.l_team_nam.grid(row=0,column=0,sticky='w',padx=20,pady=8)
+        self.l_rank.grid(row=0,column=1,sticky='e',padx=50,pady=8)
+        self.y = None
+
+    def setData(self, name, score):
+        if name != self.name:
+            self.name = name
+            self.l_team_nam.configure(text=name)
+        if score != self.score:
+            self.score = score
+            self.l_rank.configure(text=score)
+
+class Rank_Table(ctk.CTkFrame):
+    rowWidth=500
+    rowHeight=40
+    rowGap=5
+    padx=40
+    font=(20, 18) # name, score
+    text_color='#333'
+    animate=False
+    animSteps=8
+    animInterval=25 # ms
+
+    def __init__(self, master, animate=None, **kwargs):
+        super().__init__(master,fg_color='white', **kwargs)
+        if animate is not None: self.animate = animate
+        self.rows = dict() # key -> RankRow
+        self.spare = list() # hidden rows ready to be reused
+        self.last = dict() # key -> (position, name, score)
+        self.animJob = None
+        self.resize(0)
+
+    def createTeam(self)->RankRow:
+        if self.spare:
+            return self.spare.pop()
+        return RankRow(self, self.rowWidth, self.rowHeight, self.font, self.text_color)
+
+    def rowY(self, pos):
+        return self.rowGap + pos*(self.rowHeight+self.rowGap)
+
+    def resize(self, count):
+        self.configure(width=self.rowWidth+2*self.padx, height=self.rowY(count)+self.rowGap)
+
+    def updateTeams(self, ranks: tuple):
+        ranks = tuple(ranks)
+        added, removed, changed, moved = diffRanks(self.last, ranks)
+        if not (added or removed or changed or moved):
+            return
+
+        for key in removed:
+            row = self.rows.pop(key)
+            row.place_forget()
+            row.y = None
+            self.spare.append(row)
+
+        for pos,rank in enumerate(ranks):
+            key = rank.key()
+            if key in added:
+                row = self.createTeam()
+                self.rows[key] = row
+                row.setData(rank.name, rank.score)
+            elif key in changed:
+                self.rows[key].setData(rank.name, rank.score)
+        self.last = {rank.key():(pos, rank.name, rank.score) for pos,rank in enumerate(ranks)}
+
+        self.resize(len(ranks))
+        if self.animate and moved:
+            self.startAnimation()
+        else:
+            for key,(pos,_,_) in self.last.items():
+                self.moveRow(self.rows[key], self.rowY(pos))
+
+    def moveRow(self, row:RankRow, y):
+        if row.y == y: return
+        row.y = y
+        row.place(x=self.padx, y=y)
+
+    def startAnimation(self):
+        if self.animJob: self.after_cancel(self.animJob)
+        # new rows appear in place, existing rows slide to their new position
+        for key,(pos,_,_) in self.last.items():
+            row = self.rows[key]
+            if row.y is None: self.moveRow(row, self.rowY(pos))
+        self.animStep(self.animSteps)
+
+    def animStep(self, left):
+        self.animJob = None
+        for key,(pos,_,_) in self.last.items():
+            row = self.rows[key]
+            target = self.rowY(pos)
+            y = target if left <= 1 else row.y + (target-row.y)//left
+            self.moveRow(row, y)
+        if left > 1:
+            self.animJob = self.after(self.animInterval, lambda : self.animStep(left-1))
+
+    def show(self):
+        pass
@@ -1,54 +1,7 @@
 
 import customtkinter as ctk
 import tkinter
-class Rank_Table(ctk.CTkFrame):
-    teams=list()
-
-    def __init__(self, master, **kwargs):
-        super().__init__(master,fg_color='white', **kwargs)
-        self.rowconfigure(0,weight=1)
-        self.columnconfigure(0,weight=1)
-        self.teams.append(self.createTeam(self,'anshul','1'))
-        self.teams.append(self.createTeam(self,'anshul','1'))
-        self.teams.append(self.createTeam(self,'anshul','1'))
-
-    def createTeam(self,master, name, score)->ctk.CTkFrame:
-        f_team=ctk.CTkFrame(master=master,fg_color='transparent', width=500,height=40,border_width=2)
-        f_team.grid_propagate(False)
-        f_team.columnconfigure(0,weight=1)
-        l_team_nam=ctk.CTkLabel(f_team,text=name,font=('Roboto',20),text_color='#333',fg_color='transparent')
-        l_rank=ctk.CTkLabel(f_team,text=score,font=('Roboto',18),text_color='#333',fg_color='transparent')
-        l_team_nam.grid(row=0,column=0,sticky='w',padx=20,pady=8)
-        l_rank.grid(row=0,column=1,sticky='e',padx=50,pady=8)
-        
-        return f_team
-
-    def updateTeams(self, ranks: tuple):
-        print("updating teams")
-        for child in self.teams:
-            child.grid_forget()
-        self.teams = list([self.createTeam(self, rank.name, rank.score) for rank in ranks ])
-        for i,team in enumerate(self.teams):
-            team.grid(row=i,column=0,sticky='we',padx=40,pady=(5,0))
-
-    def show(self):
-        for i,team in enumerate(self.teams):
-            team.grid(row=i,column=0,sticky='we',padx=20,pady=8)
-        self.updateTeams([
-            Rank("ABC", 1),
-            Rank("ABD", 2),
-            Rank("ABF", 3),
-        ])
-
-class Rank():
-    name=""
-    score:int=0
-
-    def __init__(self, name, score) -> None:
-        self.name=name
-        self.score:int=score
-        pass
-    pass
+from .rank_table import Rank_Table, Rank
 
 class Score(ctk.CTkFrame):
 
@@ -88,6 +41,11 @@ class App(ctk.CTk):
 
     def show(self):
         self.scoring.show()
+        self.scoring.ranktable.updateTeams([
+            Rank("ABC", 1),
+            Rank("ABD", 2),
+            Rank("ABF", 3),
+        ])
         self.mainloop()
 
 if __name__ == "__main__":
@@ -1,15 +1,14 @@
 import customtkinter as ctk
+from functools import cached_property
 from .frames.home import HomeFrame
-from .frames.live import LiveFrame
-from .frames.qb import QBFrame
-from .frames.participants import ParticipantsFrame
-from .frames.settings import SettingsFrame
-from PIL import Image
 import os
-from tktooltip import ToolTip
-from CTkToolTip import *
 from ...lib.util import Obj
+from ...lib.startup import profiler
+from ...lib.metrics import watchTk
 from .structs import _App, _SideFrame, _MainFrame
+from ...lib.log import getLogger
+
+log = getLogger("ui")
 
 ctk.set_appearance_mode("light")
 
@@ -28,26 +27,34 @@ class SidePanel(_SideFrame):
         self.b_qb = self.button("QUESTIONS",self.click_questions, ("database_dark.png", "database_light.png"))
         self.b_participants = self.button("PARTICIPANTS",self.click_participants, ("users_dark.png", "users_light.png"))
         self.b_settings = self.button("SETTINGS",self.click_settings, ("settings_dark.png", "settings_light.png"))
-        self.setLogo(os.path.join(os.getcwd(), "data", "icons", "admin_logo.jpg"))
+        self.b_diagnostics = self.button("DIAGNOSTICS",self.click_diagnostics, ("live.png", "live.png"))
 
         # self.setActiveItem(self.b_home)
 
     def button(self, text, cmd,icons:tuple):
-        light, dark = icons
-        img = ctk.CTkImage(
-            light_image=Image.open(os.path.join(os.path.dirname(__file__), "icons", light)),
-            dark_image=Image.open(os.path.join(os.path.dirname(__file__),"icons", dark)),
-            size=self.iconSize
-        )
         btn =  ctk.CTkButton(
             self,
             text=f"  {text}     ", 
-            image=img,
             command=cmd,
             **self.commons
         )
-        CTkToolTip(btn, message=text, delay=0.1, corner_radius=5)    
+        btn.icons = icons
         return btn
+
+    def loadIcons(self):
+        """icons, logo and tooltips (PIL, CTkToolTip) are loaded after the first paint"""
+        from PIL import Image
+        from CTkToolTip import CTkToolTip
+        for btn in (self.b_home, self.b_live, self.b_qb, self.b_participants, self.b_settings, self.b_diagnostics):
+            light, dark = btn.icons
+            img = ctk.CTkImage(
+                light_image=Image.open(os.path.join(os.path.dirname(__file__), "icons", light)),
+                dark_image=Image.open(os.path.join(os.path.dirname(__file__),"icons", dark)),
+                size=self.iconSize
+            )
+            btn.configure(image=img)
+            CTkToolTip(btn, message=btn.cget("text").strip(), delay=0.1, corner_radius=5)
+        self.setLogo(os.path.join(os.getcwd(), "data", "icons", "admin_logo.jpg"))
     
     def click_home(self):
         app = App.me
@@ -74,6 +81,11 @@ class SidePanel(_SideFrame):
         app.f_main.setActiveFrame(app.f_main.f_settings)
         self.setActiveItem(self.b_settings)
 
+    def click_diagnostics(self):
+        app = App.me
+        app.f_main.setActiveFrame(app.f_main.f_diagnostics)
+        self.setActiveItem(self.b_diagnostics)
+
     def setActiveItem(self, item):
         if self.activeB:
             self.activeB.configure(**self.commons)
@@ -90,15 +102,17 @@ class SidePanel(_SideFrame):
         self.b_live.pack(fill=ctk.X, **commons)
         self.b_participants.pack(fill=ctk.X, **commons)
         self.b_settings.pack(fill=ctk.X, side=ctk.BOTTOM, **commons)
+        self.b_diagnostics.pack(fill=ctk.X, side=ctk.BOTTOM, **commons)
         self.b_qb.pack(side=ctk.BOTTOM,fill=ctk.X, **commons)
         self.grid(row=0, column=0, stick="nsw")
 
     def setLogo(self, imgPath):
+        from PIL import Image
         image = Image.open(imgPath)
         width, height = image.size
         l_width=int(self.b_logo.cget("width"))
         height = height/width*l_width
-        print(f"{width}x{height}")
+        log.debug("image %sx%s", width, height)
         image = ctk.CTkImage(image, size=(l_width,height))
         self.b_logo.configure(image=image, text="")
 
@@ -120,10 +134,32 @@ class MainPanel(_MainFrame):
 
         self.l_bg = ctk.CTkLabel(self, text="", fg_color="#627AFF")
         self.f_home = HomeFrame(self,app=master)
-        self.f_live = LiveFrame(self,app=master)
-        self.f_qb = QBFrame(self,)
-        self.f_participants = ParticipantsFrame(self,)
-        self.f_settings = SettingsFrame(self,)
+        # the other frames are built when they are first activated
+
+    @cached_property
+    def f_live(self):
+        from .frames.live import LiveFrame
+        return LiveFrame(self,app=self.parent)
+
+    @cached_property
+    def f_qb(self):
+        from .frames.qb import QBFrame
+        return QBFrame(self,)
+
+    @cached_property
+    def f_participants(self):
+        from .frames.participants import ParticipantsFrame
+        return ParticipantsFrame(self,)
+
+    @cached_property
+    def f_settings(self):
+        from .frames.settings import SettingsFrame
+        return SettingsFrame(self,)
+
+    @cached_property
+    def f_diagnostics(self):
+        from .frames.diagnostics import DiagnosticsFrame
+        return DiagnosticsFrame(self,)
 
     def show(self):
         self.activeFrame.show()
@@ -162,6 +198,9 @@ class App(ctk.CTk):
         # self.topBar.show()
         self.f_side.show()
         self.f_main.show()
+        profiler.firstPaint(self)
+        self.after_idle(self.f_side.loadIcons)
+        watchTk(self)
         self.mainloop()
 
 app = None
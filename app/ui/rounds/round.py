@@ -1,10 +1,14 @@
 from .util import set_option_correct, set_option_normal, set_option_selected
 from ...lib.qb import ClientQuestion
 from PIL import Image
+import math
 import os
 import customtkinter as ctk
 from ..._globals import _GLOBALs
 import time
+from ...lib.log import getLogger
+
+log = getLogger("ui")
 
 class QuestionFrame(ctk.CTkFrame):
 
@@ -71,6 +75,8 @@ class ROUND(ctk.CTkFrame):
     hasOptions=True
     running=False
     time_limit = 30
+    deadline:float=None # time.monotonic() the timer runs out, set by the admin
+    timerJob=None
     l_timer:ctk.CTkLabel=None
     hasSubmit=None
     rid=None
@@ -140,7 +146,7 @@ class ROUND(ctk.CTkFrame):
             if os.path.exists(img_path) and os.path.isfile(img_path):
                 self.setImage(img_path)
         else:
-            print(f"IMAGE NOT FOUND : '{q.imgPath}' , '{q.get_img_path()}'")
+            log.debug("no image for question %s", q.qid)
 
         if self.selectedOption:
             set_option_normal(self.f_question.options[self.selectedOption-1])#.configure(border_color="#888")
@@ -151,7 +157,7 @@ class ROUND(ctk.CTkFrame):
         width, height = image.size
         l_width=int(self.image.cget("width"))
         height = height/width*l_width
-        print(f"{width}x{height}")
+        log.debug("image %sx%s", width, height)
         image = ctk.CTkImage(image, size=(l_width,height))
         self.image.configure(image=image, text="")
 
@@ -168,32 +174,43 @@ class ROUND(ctk.CTkFrame):
 
     def reset_timer(self):
         self.running = False
+        self.cancel_timer()
         self.l_timer.configure(text=f"{self.time_limit}s")
-        print("Timer reset")
-
-    def start_timer(self):
-        print("START TIMEr")
-        if not self.running:
-            self.start_time = time.time()
-            self.running = True
-            # self.start_button.configure(state="disabled")
-            # self.stop_button.configure(state="normal")
-            self.update_timer()
+        log.debug("timer reset")
+
+    def start_timer(self, deadline=None):
+        """counts down to `deadline`, until the admin sends it the local `time_limit`"""
+        log.debug("timer started")
+        self.deadline = deadline or time.monotonic() + self.time_limit
+        self.running = True
+        self.update_timer()
+
+    def setDeadline(self, qid, deadline):
+        "deadline of question `qid` from the admin, in this machine's monotonic clock"
+        if str(qid) != str(self.qid) or not self.running: return
+        self.deadline = deadline
+        self.update_timer()
+
+    def cancel_timer(self):
+        if self.timerJob:
+            self.l_timer.after_cancel(self.timerJob)
+            self.timerJob = None
 
     def update_timer(self):
-            if self.running:
-                present_time = time.time()
-                elapsed_time = present_time - self.start_time
-                remaining_time = self.time_limit - int(elapsed_time)
-    
-                if remaining_time > 0:
-                    self.l_timer.configure(text=f"{remaining_time}s")
-                    self.l_timer.after(1000, self.update_timer)  # Update every 1 second
-                else:
-                    self.stop_timer()
-                    self.l_timer.configure(text="TIME UP")
+        # rendered from the deadline, not by counting ticks, the next tick is
+        # scheduled for the moment the shown second changes
+        self.cancel_timer()
+        if not self.running: return
+        remaining = self.deadline - time.monotonic()
+        if remaining > 0:
+            self.l_timer.configure(text=f"{math.ceil(remaining)}s")
+            self.timerJob = self.l_timer.after(int((remaining - math.ceil(remaining) + 1)*1000) + 1, self.update_timer)
+        else:
+            self.stop_timer()
+            self.l_timer.configure(text="TIME UP")
     
     def stop_timer(self):
+        self.cancel_timer()
         if self.running:
             self.running = False
             # self.start_button.configure(state="normal")
@@ -204,7 +221,7 @@ class ROUND(ctk.CTkFrame):
         width, height = image.size
         l_width=int(self.l_logo.cget("width"))
         height = height/width*l_width
-        print(f"{width}x{height}")
+        log.debug("image %sx%s", width, height)
         image = ctk.CTkImage(image, size=(l_width,height))
         self.l_logo.configure(image=image, text="")
 
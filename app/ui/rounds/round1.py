@@ -5,6 +5,9 @@ from .round import ROUND,QuestionFrame
 import os
 from ...lib.util import setImage
 from ..._globals import _GLOBALs
+from ...lib.log import getLogger
+
+log = getLogger("ui")
 class Question_Frame(QuestionFrame):
     def __init__(self, master, **kwargs):
         super().__init__(master, options=None, border_width=2,border_color='white',width=700,height=400, **kwargs)
@@ -68,7 +71,7 @@ class Round1(ROUND):
             # l_height = _GLOBALs["app:user"].winfo_width()
             # l_width = width/height*l_height
             # l_width = _GLOBALs["app:user"].winfo_height()
-            print(f"bg : {width}x{height}")
+            log.debug("background %sx%s", width, height)
             image = ctk.CTkImage(image, size=(1400,1000))
             target.configure(image=image, text="")
 
@@ -79,4 +82,5 @@ class Round1(ROUND):
 
     def stop_timer(self):
         # return super().stop_timer()()
+        self.cancel_timer()
         self.running=False
\ No newline at end of file
@@ -6,6 +6,9 @@ from ..._globals import _GLOBALs
 from .util import set_option_selected, set_option_normal, set_option_correct
 from .round import ROUND, QuestionFrame
 import os
+from ...lib.log import getLogger
+
+log = getLogger("ui")
 #  this is the round 4 this wrapper conatin rank frmane into round 4
 class Wrapper(ctk.CTkFrame):
     def __init__(self, master, **kwargs):
@@ -130,7 +133,7 @@ class Round4(ROUND):
     def show(self):
 
         if not self.binded and not self.isAdmin: 
-            print("ADDED KEY BINDINGs")
+            log.debug("buzzer key binding added")
             _GLOBALs.get("user") and _GLOBALs["user"].ui.bind("<Key>", self.on_key_pressed)
         self.binded=True
         self.page_title.grid(row=0, column=0, sticky='nsew', padx=20, pady=20)
@@ -174,7 +177,7 @@ class Round4(ROUND):
         # print(event)
         # return
         if event.keysym=="Return" and self.running:
-            print("BUZZER PRESSED")
+            log.debug("buzzer pressed")
             _GLOBALs["user"].on_buzzer_pressed(self.qid)
             self.stop_timer()
 
@@ -1,6 +1,9 @@
 import os
 from PIL import Image
 import customtkinter as ctk
+from ...lib.log import getLogger
+
+log = getLogger("ui")
 
 def set_option_selected(l_option):
     # l_option.configure(border_color="#4169E1", )
@@ -20,6 +23,6 @@ def createLogo(self, imgPath, size=None):
     width, height = image.size
     l_width=int(self.icon.cget("width"))
     height = height/width*l_width
-    print(f"{width}x{height}")
+    log.debug("image %sx%s", width, height)
     image = ctk.CTkImage(image, size=(l_width,height))
     self.icon.configure(image=image, text="")
\ No newline at end of file
@@ -0,0 +1,95 @@
+import customtkinter as ctk
+import math
+import sys
+import time
+from ...lib.spectator import SpectatorClient
+from ...settings import getWIFI, spectator_port
+
+ctk.set_appearance_mode('light')
+
+class Board(ctk.CTkFrame):
+    """scoreboard column, labels are reused between updates"""
+    def __init__(self, master, **kwargs):
+        super().__init__(master=master, fg_color="#fff", border_width=2, **kwargs)
+        self.grid_columnconfigure(0, weight=1)
+        self.l_title = ctk.CTkLabel(self, text="SCOREBOARD", font=("Roboto", 20), text_color="#333")
+        self.l_rows = list()
+
+    def setData(self, scoreboard:list):
+        while len(self.l_rows) < len(scoreboard):
+            self.l_rows.append(ctk.CTkLabel(self, text="", font=("Roboto", 18), text_color="#333", anchor="w"))
+        for i,l_row in enumerate(self.l_rows):
+            if i < len(scoreboard):
+                name, score = scoreboard[i]
+                l_row.configure(text=f"{i+1}.  {name}    {score}")
+                l_row.grid(row=i+1, column=0, sticky="we", padx=20, pady=2)
+            else:
+                l_row.grid_forget()
+
+    def show(self):
+        self.l_title.grid(row=0, column=0, sticky="w", padx=20, pady=10)
+        self.grid(row=1, column=1, sticky="ns", padx=20, pady=20)
+
+class App(ctk.CTk):
+    """read-only projector display of the admin's live state"""
+    liveState=None
+    latest=None
+    timer=None
+    deadline:float=None # end of the timer, local monotonic clock
+
+    def __init__(self, addr):
+        super().__init__()
+        self.title("PRASHAN BAAN")
+        self.geometry("1000x700")
+        self.after(10, lambda:self.state("zoomed"))
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        self.l_round = ctk.CTkLabel(self, text="PRASHAN BAAN", font=("Garamond", 50), text_color="blue")
+        self.l_timer = ctk.CTkLabel(self, text="", font=("Roboto", 30), text_color="#333")
+        self.l_question = ctk.CTkLabel(self, text="waiting for admin", font=("Garamond", 40), text_color="#000", wraplength=800)
+        self.l_participant = ctk.CTkLabel(self, text="", font=("Roboto", 20), text_color="#555")
+        self.f_board = Board(self)
+
+        self.client = SpectatorClient(addr)
+        self.client.on("state", self.onState)
+
+    def onState(self, args):
+        # called from the socket thread, the UI thread picks it up in `render`
+        self.latest = (args[0], time.monotonic())
+
+    def render(self):
+        latest, self.latest = self.latest, None
+        if latest:
+            state, receivedAt = latest
+            self.liveState = state
+            round = state.get("round")
+            if round: self.l_round.configure(text=f"ROUND {round['id']} - {round['name']}")
+            question = state.get("question")
+            if question: self.l_question.configure(text=question["text"])
+            self.l_participant.configure(text=state.get("participant") or "")
+            self.timer = state.get("timer")
+            if self.timer: self.deadline = receivedAt + self.timer["remaining"]
+            self.f_board.setData(state.get("scoreboard") or list())
+        if self.timer:
+            remaining = math.ceil(self.deadline - time.monotonic())
+            self.l_timer.configure(text=f"{remaining}s" if remaining > 0 else "TIME UP")
+        self.after(100, self.render)
+
+    def show(self):
+        self.l_round.grid(row=0, column=0, columnspan=2, pady=20)
+        self.l_timer.grid(row=0, column=1, sticky="ne", padx=20, pady=20)
+        self.l_question.grid(row=1, column=0, sticky="nswe", padx=20, pady=20)
+        self.l_participant.grid(row=2, column=0, pady=(0,20))
+        self.f_board.show()
+        self.client.connect()
+        self.render()
+        self.mainloop()
+
+def main():
+    host = sys.argv[1] if len(sys.argv) > 1 else getWIFI()
+    app = App((host, spectator_port))
+    app.show()
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,15 @@
 import customtkinter as ctk
 from ....lib.struct import USER
-from PIL import Image
 import os
+from ....lib.log import getLogger
+
+log = getLogger("ui")
 
 # Entry and Login Panel (Enhanced)
 class Form(ctk.CTkFrame):
+    searching="Searching servers..."
+    refreshInterval=500 # ms between updates of the discovered servers
+
     def __init__(self, master, **kwargs):
         super().__init__(master=master, fg_color='transparent',border_color="white",border_width=2, **kwargs)
 
@@ -12,6 +17,8 @@ class Form(ctk.CTkFrame):
         self.icon=ctk.CTkLabel(self, fg_color="transparent",width=500,height=300,text="icon goes here")
         self.userid = ctk.CTkLabel(self, text="UserID:",font=('Helvetica', 18, 'bold'),text_color='#DAA520')
         self.e_userid = ctk.CTkEntry(self,placeholder_text="Enter the ID...",font=('Helvetica', 14),width=200)
+        self.o_server = ctk.CTkOptionMenu(self, values=[self.searching], font=('Helvetica', 13), width=300)
+        self.servers = dict() # option label -> (host, port)
         self.submit_b = ctk.CTkButton(self, text='Login',fg_color="blue",hover_color="lightblue",command=self.click_submit)
         self.l_info=ctk.CTkLabel(self, text="", anchor="w", fg_color="transparent", font=("Roboto", 13))
 
@@ -19,9 +26,11 @@ class Form(ctk.CTkFrame):
 
         name = str(self.e_userid.get()).strip()
         if len(name) < 3:
-            return print("ERROR : USERNAME SHOULD BE GREATER THAN 3 LETTERS")
+            return log.warning("username should be at least 3 letters")
         user:USER = USER.me
         user.setName(name)
+        # nothing discovered yet, login falls back to the Wi-Fi gateway
+        user.setServer(self.servers.get(self.o_server.get()))
         user.login()
         # user.ui.mainpanel.setActiveFrame(user.ui.mainpanel.f_screensaver)
     
@@ -30,22 +39,42 @@ class Form(ctk.CTkFrame):
         self.icon.grid(row=0, column=0, padx=20, pady=10, sticky='we')
         self.userid.grid(row=1, column=0, padx=20, pady=10, )#sticky='we')
         self.e_userid.grid(row=2, column=0, padx=20, pady=10, )#sticky='we')
-        self.submit_b.grid(row=3, column=0, padx=20, pady=(15,0), )#sticky='we')
-        self.l_info.grid(row=4, column=0, padx=50, pady=(10,15), sticky="we")
+        self.o_server.grid(row=3, column=0, padx=20, pady=(5,0), )
+        self.submit_b.grid(row=4, column=0, padx=20, pady=(15,0), )#sticky='we')
+        self.l_info.grid(row=5, column=0, padx=50, pady=(10,15), sticky="we")
         self.after(400, lambda : self.e_userid.focus())
+        self.after(self.refreshInterval, self.refreshServers)
 
         # img=None
         logo_path = os.path.join(os.getcwd(), "data", "icons", "login_logo.jpg")
-        self.setImage(logo_path)
+        self.after_idle(lambda : self.setImage(logo_path)) # after the first paint
         # if os.path.exists(logo_path) and os.path.isfile(logo_path):
         #     img = ctk.CTkImage(Image.open(logo_path))
 
+    def refreshServers(self):
+        "list the servers heard by the beacon listener, polled on the Tk thread"
+        user:USER = USER.me
+        if not self.winfo_exists() or not user.beacons: return
+        picked = self.servers.get(self.o_server.get())
+        self.servers = {
+            f"{s['name']}  ({s['host']}:{s['port']})  {s['participants']} joined": (s["host"], s["port"])
+            for s in user.beacons.list() if s["compatible"]
+        }
+        labels = list(self.servers) or [self.searching]
+        if labels != list(self.o_server.cget("values")):
+            self.o_server.configure(values=labels)
+            # keep the server picked before, unless it disappeared
+            same = [l for l in labels if picked and self.servers.get(l) == picked]
+            self.o_server.set(same[0] if same else labels[0])
+        self.after(self.refreshInterval, self.refreshServers)
+
     def setImage(self, imgPath):
+        from PIL import Image
         image = Image.open(imgPath)
         width, height = image.size
         l_width=int(self.icon.cget("width"))
         height = height/width*l_width
-        print(f"{width}x{height}")
+        log.debug("image %sx%s", width, height)
         image = ctk.CTkImage(image, size=(l_width,height))
         self.icon.configure(image=image, text="")
 
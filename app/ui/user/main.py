@@ -1,11 +1,8 @@
 import customtkinter as ctk
-from .frames.screen_saver import ScreenSaver
+from functools import cached_property
 from .frames.login import LoginFrame
-from ..rounds.round1 import Round1
-from ..rounds.round2 import Round2
-from ..rounds.round3 import Round3
-from ..rounds.round4 import Round4
 from ..._globals import _GLOBALs
+from ...lib.startup import profiler
 
 ctk.set_appearance_mode('light')
 
@@ -23,15 +20,42 @@ class MainPanel(ctk.CTkFrame):
         self.grid_columnconfigure(0,weight=1)
         self.grid_rowconfigure(0,weight=1)
         self.f_login=LoginFrame(self)
-        self.f_round1=Round1(self)
-        self.f_round2=Round2(self)
-        self.f_round3=Round3(self)
-        self.f_round4=Round4(self)
-        self.f_screensaver=ScreenSaver(self)
+        # the other frames are built on first use, see `warmUp`
 
         # self.activeframe=self.f_round1
         self.activeframe=self.f_login
-        
+
+    @cached_property
+    def f_round1(self):
+        from ..rounds.round1 import Round1
+        return Round1(self)
+
+    @cached_property
+    def f_round2(self):
+        from ..rounds.round2 import Round2
+        return Round2(self)
+
+    @cached_property
+    def f_round3(self):
+        from ..rounds.round3 import Round3
+        return Round3(self)
+
+    @cached_property
+    def f_round4(self):
+        from ..rounds.round4 import Round4
+        return Round4(self)
+
+    @cached_property
+    def f_screensaver(self):
+        from .frames.screen_saver import ScreenSaver
+        return ScreenSaver(self)
+
+    def warmUp(self, names=("f_screensaver", "f_round1", "f_round2", "f_round3", "f_round4")):
+        """build the remaining frames one per idle slot after the first paint,
+        the network thread switches frames and should not have to build them"""
+        if not names: return
+        getattr(self, names[0])
+        self.after(50, lambda : self.warmUp(names[1:]))
         
     def show(self):
         self.activeframe.show()
@@ -56,6 +80,8 @@ class App(ctk.CTk):
 
     def show(self):
         self.mainpanel.show()
+        profiler.firstPaint(self)
+        self.after(1000, self.mainpanel.warmUp)
         self.mainloop()
 
 def main():
@@ -2,11 +2,16 @@ from .ui.user.main import App
 from .lib.sockets import ClientSocket
 from .settings import addr
 from .lib.struct import USER
-from .lib.util import createPayload, rand_str
+from .lib.util import PayloadReader, createPayload, rand_str
 import json
+import time
 from .lib.qb import ClientQuestion
 from ._globals import _GLOBALs
-from .settings import addr, getWIFI, port
+from .settings import addr, getWIFI, port, beacon_port
+from .lib.beacon import BeaconListener
+from .lib.log import getLogger, setup as setupLogging
+
+log = getLogger("user")
 
 
 class User(USER):
@@ -18,11 +23,12 @@ class User(USER):
     def __init__(self) -> None:
         USER.me=self
         _GLOBALs['user']=self
+        self.beacons = BeaconListener(beacon_port)
         self.ui = App()
         USER.me = self
 
     def setRound(self, data):
-        print("SETTING CURRENT ROUND TO ", data)
+        log.info("round set to %s", data)
         self.currRound=int(data)
 
         if int(data) == 1:
@@ -37,14 +43,15 @@ class User(USER):
     def login(self):
         if self.connecting: return
         self.connecting = True
-        print("doing Login")
+        log.info("logging in")
 
         if self.client:
             self.client.off_all()
             self.client = None
 
         # self.client = ClientSocket(addr)
-        self.client = ClientSocket(addr=(getWIFI(), port))
+        self.client = ClientSocket(addr=self.serverAddr or (getWIFI(), port))
+        self.reader = PayloadReader()
 
         self.client.on("handshake-done", self.onHandshakeDone)
         # self.client.on("handshake-error", self.reconnect)
@@ -58,7 +65,7 @@ class User(USER):
         # self
 
     def onLoginFailed(self,*a):
-        print("LOGIN FAILED")
+        log.warning("login failed")
         self.failed_count += 1
         self.connecting=False
         self.ui.mainpanel.f_login.f_form.l_info.configure(text=f"Login Failed - attempt {self.failed_count}", text_color="red")
@@ -70,51 +77,82 @@ class User(USER):
         pass
 
     def handleDataEvent(self, args):
+        for payload in self.reader.feed(args[0]):
+            self.handlePayload(payload)
+        self.reader.check()
 
-        payload = args[0]
-        payload = json.loads(payload)
-
-        print(f"PAYLOAD : {payload}")
+    def handlePayload(self, payload):
+        log.debug("payload %s", payload)
         action = payload["action"]
         data = payload["data"]
+        self.trackState(payload)
 
         if action == "setround":
             self.setRound(data)
             pass
         if action == "setquestion":
-            self.setRound(self.currRound)
-            d = json.loads(data)
-            q=ClientQuestion(qid=d["qid"], text=d["text"], options=d["options"], imgPath=d["imgPath"])
-            self.ui.mainpanel.activeframe.setQ(q)
+            self.showQuestion(json.loads(data))
             pass
+        if action == "setstate":
+            self.showView(self.view)
+        if action == "clock-ping":
+            # answered at once, the admin measures the round trip
+            self.client.send(createPayload("clock-pong", {"t0":data["t0"], "t1":time.monotonic()}))
+        if action == "setdeadline":
+            self.showDeadline(data)
+        if action == "answer-rejected":
+            log.info("answer for question %s rejected : %s", data["qid"], data["reason"])
         if action=="setscreensaver":
-            print("SETTING ScreenSaver")
+            log.debug("screensaver")
             self.ui.mainpanel.setActiveFrame(self.ui.mainpanel.f_screensaver)
         
+    def showQuestion(self, d:dict):
+        self.setRound(self.currRound)
+        q=ClientQuestion(qid=d["qid"], text=d["text"], options=d["options"], imgPath=d["imgPath"])
+        self.ui.mainpanel.activeframe.setQ(q)
+
+    def showDeadline(self, data:dict):
+        deadline = data["deadline"] or time.monotonic()+data["remaining"]
+        self.ui.after(0, self.ui.mainpanel.activeframe.setDeadline, data["qid"], deadline)
+
+    def showView(self, view:dict):
+        "the whole screen from the view state, after a (re)connect"
+        if view.get("round"): self.setRound(view["round"])
+        if view.get("screen") == "question" and view.get("question"):
+            self.showQuestion(view["question"])
+            if view.get("deadline"): self.showDeadline(view["deadline"])
+        elif view.get("screen") == "screensaver" or not view.get("round"):
+            self.ui.mainpanel.setActiveFrame(self.ui.mainpanel.f_screensaver)
+
     def reconnect(self, *args):
-        print("reconnecting after 3 secs")
+        log.info("reconnecting after 3 secs")
         self.connecting=False
         self.client.off_all()
         self.client.disconnect()
         self.ui.after(3000, self.login)
 
     def start(self):
+        try:
+            self.beacons.start()
+        except OSError as e:
+            log.warning("server discovery unavailable : %s", e)
         self.ui.show()
 
     def onHandshakeDone(self, args):
         self.connecting = False
-        print("setting active Frame")
         self.ui.mainpanel.setActiveFrame(self.ui.mainpanel.f_screensaver)
-        print("sending name")
         payload = createPayload("setdata", self.name)
         self.client.send(payload)
+        self.client.send(self.syncPayload()) # catch up with the round in progress
         self.ui.title("Participant - "+self.name)
 
     def on_buzzer_pressed(self, qid):
-        self.client.send(createPayload("buzzer-pressed", ))
+        if not self.shouldSendBuzzer(qid): return
+        self.client.send(createPayload("buzzer-pressed", {"qid":qid}))
 
 
 def main():
+    setupLogging("participant")
     user = User()
     user.start()
     pass
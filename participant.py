@@ -1,4 +1,11 @@
+import sys
+
+if "--profile-startup" in sys.argv:
+    # must run before the app modules are imported
+    from app.lib.startup import profiler
+    profiler.start()
+
 from app.user import main
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
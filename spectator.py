@@ -0,0 +1,4 @@
+from app.ui.spectator.main import main
+
+if __name__ == "__main__":
+    main()
@@ -22,5 +22,17 @@ elif arg1 == "ui:user":
 elif arg1 == "app:user":
     from app.user import main
     main()
+elif arg1 == "cli:loadgen":
+    from app.cli.loadgen import main
+    main([])
+elif arg1 == "cli:bench":
+    from app.cli.bench import main
+    main([])
+elif arg1 == "cli:reconnect":
+    from app.cli.reconnect import main
+    main([])
+elif arg1 == "app:spectator":
+    from app.ui.spectator.main import main
+    main()
 else:
     print(f"'{arg1}' is not a test task")